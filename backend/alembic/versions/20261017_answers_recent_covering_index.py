@@ -0,0 +1,39 @@
+"""answers の (user_id, answered_at) インデックスを集計列を含むカバリングインデックスに置き換え
+
+Revision ID: 20261017_answers_recent_idx
+Revises: 20261017_irt_calibration
+Create Date: 2026-10-17
+
+予想スコアは 1 ユーザーの回答を新しい順に番号付けし（row_number）、全体と最近 N 問を 1 文で集計する。
+question_id / is_correct / answer_time_sec を INCLUDE してヒープを読まずに済ませ、
+問題集で絞る場合も questions との結合に question_id を索引から渡す。
+B-tree は逆方向に走査できるため answered_at DESC の別インデックスは作らない。
+PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_answers_recent_idx"
+down_revision: Union[str, Sequence[str], None] = "20261017_irt_calibration"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_answers_user_answered_at_covering "
+            "ON answers (user_id, answered_at) INCLUDE (question_id, is_correct, answer_time_sec)"
+        )
+    )
+    # 先頭キーが同じため置き換え
+    op.execute(text("DROP INDEX IF EXISTS ix_answers_user_answered_at"))
+
+
+def downgrade() -> None:
+    op.execute(text("CREATE INDEX IF NOT EXISTS ix_answers_user_answered_at ON answers (user_id, answered_at)"))
+    op.execute(text("DROP INDEX IF EXISTS ix_answers_user_answered_at_covering"))
@@ -0,0 +1,52 @@
+"""Elo レーティング（学習者・カテゴリ別・問題）を追加
+
+Revision ID: 20261017_elo_ratings
+Revises: 20261017_user_srs_state
+Create Date: 2026-10-17
+
+回答ごとに StatsUpdater がバッチ開始時点のレーティングから更新し、増分として加算する。
+シャード有効時は問題の増分を question_stat_shards.rating_delta に積み、ロールアップで畳み込む。
+PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_elo_ratings"
+down_revision: Union[str, Sequence[str], None] = "20261017_user_srs_state"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(text("ALTER TABLE questions ADD COLUMN IF NOT EXISTS rating DOUBLE PRECISION DEFAULT 1500"))
+    op.execute(text("ALTER TABLE user_category_stats ADD COLUMN IF NOT EXISTS rating DOUBLE PRECISION DEFAULT 1500"))
+    op.execute(
+        text(
+            "ALTER TABLE question_stat_shards "
+            "ADD COLUMN IF NOT EXISTS rating_delta DOUBLE PRECISION NOT NULL DEFAULT 0"
+        )
+    )
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS user_ratings (
+                user_id VARCHAR PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                rating DOUBLE PRECISION NOT NULL DEFAULT 1500,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP WITHOUT TIME ZONE
+            )
+            """
+        )
+    )
+    op.execute(text("ALTER TABLE public.user_ratings ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS user_ratings"))
+    op.execute(text("ALTER TABLE question_stat_shards DROP COLUMN IF EXISTS rating_delta"))
+    op.execute(text("ALTER TABLE user_category_stats DROP COLUMN IF EXISTS rating"))
+    op.execute(text("ALTER TABLE questions DROP COLUMN IF EXISTS rating"))
@@ -0,0 +1,52 @@
+"""IRT（2PL）の較正値を追加（questions の識別力・困難度、user_irt_abilities）
+
+Revision ID: 20261017_irt_calibration
+Revises: 20261017_elo_ratings
+Create Date: 2026-10-17
+
+オフラインバッチ（calibrate_irt.py / POST /admin/irt/{id}/calibrate）が問題集ごとに書き込む。
+PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_irt_calibration"
+down_revision: Union[str, Sequence[str], None] = "20261017_elo_ratings"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(text("ALTER TABLE questions ADD COLUMN IF NOT EXISTS irt_discrimination DOUBLE PRECISION"))
+    op.execute(text("ALTER TABLE questions ADD COLUMN IF NOT EXISTS irt_difficulty DOUBLE PRECISION"))
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS user_irt_abilities (
+                user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                question_set_id VARCHAR NOT NULL REFERENCES question_sets(id) ON DELETE CASCADE,
+                ability DOUBLE PRECISION NOT NULL,
+                answer_count INTEGER NOT NULL DEFAULT 0,
+                calibrated_at TIMESTAMP WITHOUT TIME ZONE,
+                PRIMARY KEY (user_id, question_set_id)
+            )
+            """
+        )
+    )
+    op.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_user_irt_abilities_question_set "
+            "ON user_irt_abilities (question_set_id)"
+        )
+    )
+    op.execute(text("ALTER TABLE public.user_irt_abilities ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS user_irt_abilities"))
+    op.execute(text("ALTER TABLE questions DROP COLUMN IF EXISTS irt_difficulty"))
+    op.execute(text("ALTER TABLE questions DROP COLUMN IF EXISTS irt_discrimination"))
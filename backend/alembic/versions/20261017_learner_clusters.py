@@ -0,0 +1,56 @@
+"""コールドスタート推薦用の learner_cluster_models / cluster_question_misses を追加
+
+Revision ID: 20261017_learner_clusters
+Revises: 20261017_question_stat_shards
+Create Date: 2026-10-17
+
+学習者クラスタ（k-means 重心）と (問題集, クラスタ, 問題) ごとの誤答数。
+定期再集計（COLD_START_REFRESH_INTERVAL_SEC）で作り直す。PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_learner_clusters"
+down_revision: Union[str, Sequence[str], None] = "20261017_question_stat_shards"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS learner_cluster_models (
+                question_set_id VARCHAR PRIMARY KEY REFERENCES question_sets(id) ON DELETE CASCADE,
+                categories JSON NOT NULL,
+                centroids JSON NOT NULL,
+                learner_count INTEGER DEFAULT 0,
+                refreshed_at TIMESTAMP WITHOUT TIME ZONE
+            )
+            """
+        )
+    )
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS cluster_question_misses (
+                question_set_id VARCHAR NOT NULL REFERENCES question_sets(id) ON DELETE CASCADE,
+                cluster INTEGER NOT NULL,
+                question_id VARCHAR NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                wrong_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (question_set_id, cluster, question_id)
+            )
+            """
+        )
+    )
+    op.execute(text("ALTER TABLE public.learner_cluster_models ENABLE ROW LEVEL SECURITY"))
+    op.execute(text("ALTER TABLE public.cluster_question_misses ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS cluster_question_misses"))
+    op.execute(text("DROP TABLE IF EXISTS learner_cluster_models"))
@@ -0,0 +1,78 @@
+"""question_rubric_items / question_misconceptions（問題ごとの採点ルーブリック・誤概念）を追加
+
+Revision ID: 20261017_question_rubrics
+Revises: 20261017_user_daily_rollups
+Create Date: 2026-10-17
+
+ルーブリック文・誤概念フレーズと、保存時に計算した採点用の特徴量（正規化済みテキスト・文字 bigram）を持つ。
+/answers/evaluate-text-with-stored-rubric は question_id だけで採点する。PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_question_rubrics"
+down_revision: Union[str, Sequence[str], None] = "20261017_user_daily_rollups"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS question_rubric_items (
+                id VARCHAR PRIMARY KEY,
+                question_id VARCHAR NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL DEFAULT 0,
+                text TEXT NOT NULL,
+                weight DOUBLE PRECISION NOT NULL DEFAULT 1.0,
+                normalized_text TEXT NOT NULL DEFAULT '',
+                fingerprint JSON NOT NULL DEFAULT '[]',
+                features_version INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                updated_at TIMESTAMP WITHOUT TIME ZONE
+            )
+            """
+        )
+    )
+    op.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_question_rubric_items_question_id "
+            "ON question_rubric_items (question_id)"
+        )
+    )
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS question_misconceptions (
+                id VARCHAR PRIMARY KEY,
+                question_id VARCHAR NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL DEFAULT 0,
+                label VARCHAR NOT NULL,
+                example_phrases JSON NOT NULL DEFAULT '[]',
+                normalized_phrases JSON NOT NULL DEFAULT '[]',
+                phrase_fingerprints JSON NOT NULL DEFAULT '[]',
+                features_version INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                updated_at TIMESTAMP WITHOUT TIME ZONE
+            )
+            """
+        )
+    )
+    op.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_question_misconceptions_question_id "
+            "ON question_misconceptions (question_id)"
+        )
+    )
+    op.execute(text("ALTER TABLE public.question_rubric_items ENABLE ROW LEVEL SECURITY"))
+    op.execute(text("ALTER TABLE public.question_misconceptions ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS question_misconceptions"))
+    op.execute(text("DROP TABLE IF EXISTS question_rubric_items"))
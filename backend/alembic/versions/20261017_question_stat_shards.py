@@ -0,0 +1,43 @@
+"""question_stat_shards（問題の全体統計のシャードカウンタ）を追加
+
+Revision ID: 20261017_question_stat_shards
+Revises: 20260416_alembic_version_rls
+Create Date: 2026-10-17
+
+QUESTION_STAT_SHARDS > 0 のとき、回答ごとの増分は (question_id, shard) の行に加算され、
+定期ロールアップで questions に畳み込まれる。PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_question_stat_shards"
+down_revision: Union[str, Sequence[str], None] = "20260416_alembic_version_rls"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS question_stat_shards (
+                question_id VARCHAR NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                shard INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct_count INTEGER NOT NULL DEFAULT 0,
+                time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP WITHOUT TIME ZONE,
+                PRIMARY KEY (question_id, shard)
+            )
+            """
+        )
+    )
+    op.execute(text("ALTER TABLE public.question_stat_shards ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS question_stat_shards"))
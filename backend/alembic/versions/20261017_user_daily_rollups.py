@@ -0,0 +1,70 @@
+"""user_daily_rollups（ユーザー×日×問題集×カテゴリの回答集計）を追加
+
+Revision ID: 20261017_user_daily_rollups
+Revises: 20261017_answers_recent_idx
+Create Date: 2026-10-17
+
+回答ごとに StatsUpdater が加算し、/answers/stats・予想スコア・改善提案はこの表を合計する。
+既存の回答は upgrade 内で answers × questions を INSERT ... SELECT してバックフィルする
+（表が空のときだけ。集計の作り直しは `python rebuild_stats.py`）。PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_user_daily_rollups"
+down_revision: Union[str, Sequence[str], None] = "20261017_answers_recent_idx"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS user_daily_rollups (
+                user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                day DATE NOT NULL,
+                question_set_id VARCHAR NOT NULL REFERENCES question_sets(id) ON DELETE CASCADE,
+                category VARCHAR NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct_count INTEGER NOT NULL DEFAULT 0,
+                time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP WITHOUT TIME ZONE,
+                PRIMARY KEY (user_id, day, question_set_id, category)
+            )
+            """
+        )
+    )
+    op.execute(text("ALTER TABLE public.user_daily_rollups ENABLE ROW LEVEL SECURITY"))
+    # 既存の回答をバックフィル（app.ai.daily_rollups.rebuild_daily_rollups と同じ集計。
+    # 適用後に加算された行と二重に数えないよう、表が空のときだけ入れる）
+    op.execute(
+        text(
+            """
+            INSERT INTO user_daily_rollups
+                (user_id, day, question_set_id, category, attempts, correct_count, time_sum, updated_at)
+            SELECT
+                a.user_id,
+                CAST(a.answered_at AS DATE),
+                q.question_set_id,
+                COALESCE(q.category, ''),
+                COUNT(a.id),
+                COALESCE(SUM(CAST(a.is_correct AS INTEGER)), 0),
+                COALESCE(SUM(a.answer_time_sec), 0),
+                NOW() AT TIME ZONE 'UTC'
+            FROM answers a
+            JOIN questions q ON q.id = a.question_id
+            WHERE a.answered_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM user_daily_rollups)
+            GROUP BY a.user_id, CAST(a.answered_at AS DATE), q.question_set_id, COALESCE(q.category, '')
+            """
+        )
+    )
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS user_daily_rollups"))
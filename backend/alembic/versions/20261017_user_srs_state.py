@@ -0,0 +1,64 @@
+"""user_srs_state（サーバー側の間隔反復スケジュール）を追加
+
+Revision ID: 20261017_user_srs_state
+Revises: 20261017_learner_clusters
+Create Date: 2026-10-17
+
+回答ごとに StatsUpdater が SM-2 で更新する。GET /srs/due は
+(user_id, next_review_at) / (user_id, question_set_id, next_review_at) の範囲スキャンで読む。
+PostgreSQL 専用・冪等。
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+revision: str = "20261017_user_srs_state"
+down_revision: Union[str, Sequence[str], None] = "20261017_learner_clusters"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS user_srs_state (
+                user_id VARCHAR NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                question_id VARCHAR NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+                question_set_id VARCHAR NOT NULL REFERENCES question_sets(id) ON DELETE CASCADE,
+                ease_factor DOUBLE PRECISION NOT NULL DEFAULT 2.5,
+                interval_days INTEGER NOT NULL DEFAULT 0,
+                repetitions INTEGER NOT NULL DEFAULT 0,
+                stability DOUBLE PRECISION NOT NULL DEFAULT 1,
+                next_review_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                last_review_at TIMESTAMP WITHOUT TIME ZONE,
+                updated_at TIMESTAMP WITHOUT TIME ZONE,
+                PRIMARY KEY (user_id, question_id)
+            )
+            """
+        )
+    )
+    op.execute(
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_user_srs_state_user_next_review
+            ON user_srs_state (user_id, next_review_at)
+            """
+        )
+    )
+    op.execute(
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_user_srs_state_user_set_next_review
+            ON user_srs_state (user_id, question_set_id, next_review_at)
+            """
+        )
+    )
+    op.execute(text("ALTER TABLE public.user_srs_state ENABLE ROW LEVEL SECURITY"))
+
+
+def downgrade() -> None:
+    op.execute(text("DROP TABLE IF EXISTS user_srs_state"))
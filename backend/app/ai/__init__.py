@@ -1,5 +1,5 @@
 from .recommender import QuestionRecommender
 from .predictor import ScorePredictor
-from .stats_updater import StatsUpdater
+from .stats_updater import AnswerEvent, StatsUpdater
 
-__all__ = ["QuestionRecommender", "ScorePredictor", "StatsUpdater"]
+__all__ = ["QuestionRecommender", "ScorePredictor", "StatsUpdater", "AnswerEvent"]
@@ -0,0 +1,174 @@
+"""
+問題集ごとのユーザー×カテゴリ正答率行列（類似ユーザー検索用）
+
+問題集を解いたユーザーの UserCategoryStats を 1 クエリで読み、float32 の密行列と
+ユーザー・カテゴリの添字マップにまとめてキャッシュする（TTL 経過で作り直す）。
+類似度は共通カテゴリだけを使うマスク付きコサイン類似度で、全ユーザー分を行列×ベクトル積で求める。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import Answer, Question, UserCategoryStats
+
+logger = logging.getLogger(__name__)
+
+# キャッシュする問題集数の上限（古いものから捨てる）
+_MAX_CACHED_SETS = 64
+
+
+@dataclass
+class UserCategoryMatrix:
+    """ユーザー×カテゴリの正答率（未回答カテゴリは 0、mask で区別）"""
+    user_ids: List[str]
+    categories: List[str]
+    rates: np.ndarray  # (ユーザー数, カテゴリ数) float32
+    mask: np.ndarray  # rates と同じ形。値があれば 1.0
+    built_at: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        self.user_index: Dict[str, int] = {uid: i for i, uid in enumerate(self.user_ids)}
+        self.category_index: Dict[str, int] = {c: j for j, c in enumerate(self.categories)}
+        self._rates_sq = self.rates * self.rates
+
+    def similarities(
+        self,
+        user_rates: Dict[str, float],
+        exclude_user_id: Optional[str] = None,
+        min_common: int = 2,
+    ) -> np.ndarray:
+        """
+        全ユーザーとのコサイン類似度（共通カテゴリのみで計算）
+
+        共通カテゴリが min_common 未満のユーザーや除外ユーザーは NaN。
+
+        Args:
+            user_rates: 対象ユーザーの {カテゴリ: 正答率}
+            exclude_user_id: 結果から除くユーザー（対象ユーザー自身）
+            min_common: 比較に必要な共通カテゴリ数
+        """
+        u = np.zeros(len(self.categories), dtype=np.float32)
+        u_mask = np.zeros(len(self.categories), dtype=np.float32)
+        for category, rate in user_rates.items():
+            j = self.category_index.get(category)
+            if j is not None:
+                u[j] = rate
+                u_mask[j] = 1.0
+
+        # rates は未回答カテゴリが 0 なので、rates @ u は共通カテゴリだけの内積になる
+        dot = self.rates @ u
+        other_norm_sq = self._rates_sq @ u_mask
+        user_norm_sq = self.mask @ (u * u)
+        common = self.mask @ u_mask
+
+        denom = np.sqrt(other_norm_sq) * np.sqrt(user_norm_sq)
+        sims = np.zeros(len(self.user_ids), dtype=np.float32)
+        np.divide(dot, denom, out=sims, where=denom > 0)
+        sims[common < min_common] = np.nan
+        if exclude_user_id is not None and exclude_user_id in self.user_index:
+            sims[self.user_index[exclude_user_id]] = np.nan
+        return sims
+
+
+def build_user_category_matrix(db: Session, question_set_id: str) -> UserCategoryMatrix:
+    """問題集を解いたユーザーのカテゴリ別正答率を 1 クエリで読み、行列にする"""
+    learners = (
+        db.query(Answer.user_id)
+        .join(Question)
+        .filter(Question.question_set_id == question_set_id)
+        .distinct()
+    )
+    rows = (
+        db.query(UserCategoryStats.user_id, UserCategoryStats.category, UserCategoryStats.correct_rate)
+        .filter(UserCategoryStats.user_id.in_(learners.scalar_subquery()))
+        .order_by(UserCategoryStats.user_id, UserCategoryStats.category)
+        .all()
+    )
+
+    user_index: Dict[str, int] = {}
+    category_index: Dict[str, int] = {}
+    cells: List[Tuple[int, int, float]] = []
+    for user_id, category, rate in rows:
+        i = user_index.setdefault(user_id, len(user_index))
+        j = category_index.setdefault(category, len(category_index))
+        cells.append((i, j, rate or 0.0))
+
+    rates = np.zeros((len(user_index), len(category_index)), dtype=np.float32)
+    mask = np.zeros_like(rates)
+    if cells:
+        ii, jj, vv = zip(*cells)
+        rates[ii, jj] = vv
+        mask[ii, jj] = 1.0
+
+    return UserCategoryMatrix(
+        user_ids=list(user_index),
+        categories=list(category_index),
+        rates=rates,
+        mask=mask,
+    )
+
+
+class UserCategoryMatrixCache:
+    """問題集ごとの UserCategoryMatrix を TTL 付きで保持する（LRU で上限を設ける）"""
+
+    def __init__(self, ttl_sec: float = 300.0, max_sets: int = _MAX_CACHED_SETS):
+        self._ttl_sec = ttl_sec
+        self._max_sets = max_sets
+        self._entries: "OrderedDict[str, UserCategoryMatrix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, db: Session, question_set_id: str) -> UserCategoryMatrix:
+        now = time.time()
+        with self._lock:
+            matrix = self._entries.get(question_set_id)
+            if matrix is not None and now - matrix.built_at < self._ttl_sec:
+                self._entries.move_to_end(question_set_id)
+                return matrix
+
+        started = time.perf_counter()
+        matrix = build_user_category_matrix(db, question_set_id)
+        logger.info(
+            f"Built user-category matrix for set {question_set_id}: "
+            f"{len(matrix.user_ids)}x{len(matrix.categories)} in {time.perf_counter() - started:.3f}s"
+        )
+        with self._lock:
+            self.builds += 1
+            self._entries[question_set_id] = matrix
+            self._entries.move_to_end(question_set_id)
+            while len(self._entries) > self._max_sets:
+                self._entries.popitem(last=False)
+        return matrix
+
+    def invalidate(self, question_set_id: Optional[str] = None) -> None:
+        with self._lock:
+            if question_set_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(question_set_id, None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "cached_sets": len(self._entries),
+                "builds": self.builds,
+                "ttl_sec": self._ttl_sec,
+            }
+
+
+_matrix_cache: Optional[UserCategoryMatrixCache] = None
+
+
+def get_user_category_matrix_cache() -> UserCategoryMatrixCache:
+    global _matrix_cache
+    if _matrix_cache is None:
+        from ..core.config import settings
+
+        _matrix_cache = UserCategoryMatrixCache(ttl_sec=settings.RECOMMENDER_MATRIX_TTL_SEC)
+    return _matrix_cache
@@ -0,0 +1,276 @@
+"""
+コールドスタート推薦用の「似た学習者がよく間違える問題」テーブル
+
+問題集ごとに学習者のカテゴリ別正答率ベクトルを k-means でクラスタに分け、
+(問題集, クラスタ, 問題) ごとの誤答数を集計して保存する（定期再集計）。
+推薦時は対象ユーザーを最寄りの重心に割り当て、そのクラスタの誤答数を読むだけなので
+問題集の学習者数に関係なく定数回のクエリで済む。
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import Session
+
+from ..models import Answer, ClusterQuestionMiss, LearnerClusterModel, Question
+from .category_matrix import build_user_category_matrix
+
+logger = logging.getLogger(__name__)
+
+# 未回答カテゴリの正答率（従来の類似ユーザー検索と同じ既定値）
+_MISSING_RATE = 0.5
+
+
+def kmeans(
+    X: np.ndarray,
+    k: int,
+    n_iter: int = 50,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-means（k-means++ 初期化、NumPy のみ）
+
+    Returns:
+        (重心 (k', d), 各行のクラスタ番号 (n,))。異なる点が k 個未満なら k' < k
+    """
+    n = len(X)
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, n))
+
+    centers = [X[rng.integers(n)]]
+    d2 = ((X - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = d2.sum()
+        if total <= 0:
+            break
+        idx = rng.choice(n, p=d2 / total)
+        centers.append(X[idx])
+        d2 = np.minimum(d2, ((X - X[idx]) ** 2).sum(axis=1))
+    C = np.array(centers, dtype=np.float64)
+
+    labels = np.zeros(n, dtype=np.int64)
+    for _ in range(n_iter):
+        labels = _nearest(X, C)
+        new_C = C.copy()
+        for j in range(len(C)):
+            members = X[labels == j]
+            if len(members):
+                new_C[j] = members.mean(axis=0)
+        if np.allclose(new_C, C):
+            break
+        C = new_C
+    return C, labels
+
+
+def _nearest(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    return ((X[:, None, :] - C[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+
+
+def assign_cluster(model: LearnerClusterModel, user_rates: Dict[str, float]) -> int:
+    """ユーザーのカテゴリ別正答率を最寄りの重心に割り当てる"""
+    x = np.array([[user_rates.get(c, _MISSING_RATE) for c in model.categories]], dtype=np.float64)
+    C = np.asarray(model.centroids, dtype=np.float64).reshape(-1, len(model.categories))
+    return int(_nearest(x, C)[0])
+
+
+def refresh_learner_clusters(db: Session, question_set_id: str, n_clusters: int = 8) -> int:
+    """
+    1 問題集の学習者クラスタと誤答数テーブルを作り直す（コミットは呼び出し側）
+
+    Returns:
+        クラスタ数（学習者がいなければ 0）
+    """
+    matrix = build_user_category_matrix(db, question_set_id)
+    db.execute(delete(ClusterQuestionMiss).where(ClusterQuestionMiss.question_set_id == question_set_id))
+    db.execute(delete(LearnerClusterModel).where(LearnerClusterModel.question_set_id == question_set_id))
+    if not matrix.user_ids or not matrix.categories:
+        return 0
+
+    X = np.where(matrix.mask > 0, matrix.rates, _MISSING_RATE).astype(np.float64)
+    centroids, labels = kmeans(X, n_clusters)
+    cluster_of = {uid: int(labels[i]) for i, uid in enumerate(matrix.user_ids)}
+
+    wrong = (
+        db.query(Answer.user_id, Answer.question_id, func.count(Answer.id))
+        .join(Question)
+        .filter(Question.question_set_id == question_set_id, Answer.is_correct == False)  # noqa: E712
+        .group_by(Answer.user_id, Answer.question_id)
+        .all()
+    )
+    misses: Dict[Tuple[int, str], int] = {}
+    for user_id, question_id, count in wrong:
+        cluster = cluster_of.get(user_id)
+        if cluster is not None:
+            misses[(cluster, question_id)] = misses.get((cluster, question_id), 0) + count
+
+    db.add(
+        LearnerClusterModel(
+            question_set_id=question_set_id,
+            categories=list(matrix.categories),
+            centroids=np.round(centroids, 6).tolist(),
+            learner_count=len(matrix.user_ids),
+            refreshed_at=datetime.utcnow(),
+        )
+    )
+    if misses:
+        db.execute(
+            insert(ClusterQuestionMiss.__table__),
+            [
+                {"question_set_id": question_set_id, "cluster": c, "question_id": qid, "wrong_count": n}
+                for (c, qid), n in sorted(misses.items())
+            ],
+        )
+    return len(centroids)
+
+
+def refresh_all_learner_clusters(session_factory: Callable, n_clusters: int = 8) -> int:
+    """回答のある全問題集のクラスタを作り直す（問題集ごとに 1 トランザクション）。対象問題集数を返す"""
+    db = session_factory()
+    try:
+        set_ids = [
+            sid for (sid,) in db.query(Question.question_set_id).join(Answer).distinct().all()
+        ]
+    finally:
+        db.close()
+
+    refreshed = 0
+    for set_id in set_ids:
+        db = session_factory()
+        try:
+            refresh_learner_clusters(db, set_id, n_clusters)
+            db.commit()
+            refreshed += 1
+        except Exception:
+            db.rollback()
+            logger.exception(f"Failed to refresh learner clusters for set {set_id}")
+        finally:
+            db.close()
+    return refreshed
+
+
+def lookup_cold_start_misses(
+    db: Session,
+    question_set_id: str,
+    user_rates: Dict[str, float],
+) -> Optional[List[str]]:
+    """
+    対象ユーザーと同じクラスタの学習者がよく間違える問題（誤答数の多い順）
+
+    クラスタが未集計の問題集では None を返す。
+    """
+    model = db.get(LearnerClusterModel, question_set_id)
+    if model is None or not model.categories:
+        return None
+
+    cluster = assign_cluster(model, user_rates)
+    rows = (
+        db.query(ClusterQuestionMiss.question_id)
+        .filter(
+            ClusterQuestionMiss.question_set_id == question_set_id,
+            ClusterQuestionMiss.cluster == cluster,
+        )
+        .order_by(ClusterQuestionMiss.wrong_count.desc(), ClusterQuestionMiss.question_id)
+        .all()
+    )
+    return [qid for (qid,) in rows]
+
+
+class LearnerClusterRefresher:
+    """学習者クラスタを定期的に作り直すバックグラウンドワーカー"""
+
+    def __init__(self, session_factory: Callable, interval_sec: float = 3600.0, n_clusters: int = 8):
+        self._session_factory = session_factory
+        self._interval_sec = interval_sec
+        self._n_clusters = n_clusters
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._refreshes_total = 0
+        self._last_refresh_at: Optional[float] = None
+        self._last_refresh_sets = 0
+        self._last_refresh_duration_sec = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="learner-cluster-refresh", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Learner cluster refresh started interval=%.0fs clusters=%d",
+            self._interval_sec,
+            self._n_clusters,
+        )
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> int:
+        started = time.perf_counter()
+        refreshed = refresh_all_learner_clusters(self._session_factory, self._n_clusters)
+        self._refreshes_total += 1
+        self._last_refresh_at = time.time()
+        self._last_refresh_sets = refreshed
+        self._last_refresh_duration_sec = time.perf_counter() - started
+        return refreshed
+
+    def _run(self) -> None:
+        # 起動直後に 1 回作り、その後は一定間隔で作り直す
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Learner cluster refresh failed")
+            if self._stopping.wait(self._interval_sec):
+                break
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "interval_sec": self._interval_sec,
+            "clusters": self._n_clusters,
+            "refreshes_total": self._refreshes_total,
+            "last_refresh_at": self._last_refresh_at,
+            "last_refresh_sets": self._last_refresh_sets,
+            "last_refresh_duration_sec": round(self._last_refresh_duration_sec, 4),
+        }
+
+
+_refresher: Optional[LearnerClusterRefresher] = None
+
+
+def get_learner_cluster_refresher() -> Optional[LearnerClusterRefresher]:
+    return _refresher
+
+
+def start_learner_cluster_refresher(session_factory: Callable) -> Optional[LearnerClusterRefresher]:
+    """設定で有効な場合に定期再集計を起動する（lifespan から呼ぶ）"""
+    global _refresher
+    from ..core.config import settings
+
+    if settings.COLD_START_REFRESH_INTERVAL_SEC <= 0 or _refresher is not None:
+        return _refresher
+    _refresher = LearnerClusterRefresher(
+        session_factory,
+        interval_sec=settings.COLD_START_REFRESH_INTERVAL_SEC,
+        n_clusters=settings.COLD_START_CLUSTERS,
+    )
+    _refresher.start()
+    return _refresher
+
+
+def stop_learner_cluster_refresher() -> None:
+    global _refresher
+    if _refresher is None:
+        return
+    try:
+        _refresher.stop()
+    finally:
+        _refresher = None
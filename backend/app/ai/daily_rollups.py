@@ -0,0 +1,155 @@
+"""
+ユーザー×日×問題集×カテゴリの回答集計（user_daily_rollups）
+
+回答ごとに StatsUpdater が増分を加算し、rebuild_stats.py（recalculate_all_users_stats）で
+answers から作り直せる。回答数・正答率・平均回答時間を返す読み取り API は answers を毎回
+集計する代わりにこのテーブルを合計する（1 ユーザーあたり 1 日 × 問題集 × カテゴリで 1 行）。
+日付は answered_at（UTC）の日付。
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, delete, func, insert, literal
+from sqlalchemy.orm import Session
+
+from ..models import Answer, Question, UserDailyRollup
+
+# カテゴリ未設定の問題（主キーに NULL は使えないため空文字）
+UNCATEGORIZED = ""
+
+_RollupKey = Tuple[str, date, str, str]
+
+
+def add_daily_rollups(
+    db: Session,
+    insert_fn,
+    answers: Iterable[Tuple[str, str, Optional[str], bool, float, datetime]],
+) -> int:
+    """
+    回答を日次集計に加算する
+
+    Args:
+        insert_fn: INSERT ... ON CONFLICT 用の insert 関数（None なら ORM で read-modify-write）
+        answers: (user_id, question_set_id, category, is_correct, answer_time_sec, answered_at)
+
+    Returns:
+        更新した集計行の数
+    """
+    deltas: Dict[_RollupKey, List[float]] = {}
+    for user_id, question_set_id, category, is_correct, answer_time_sec, answered_at in answers:
+        key = (user_id, answered_at.date(), question_set_id, category or UNCATEGORIZED)
+        d = deltas.setdefault(key, [0, 0, 0.0])
+        d[0] += 1
+        d[1] += 1 if is_correct else 0
+        d[2] += answer_time_sec
+    if not deltas:
+        return 0
+
+    now = datetime.utcnow()
+    # 行ロックの取得順を揃えてデッドロックを避ける
+    rows = [
+        {
+            "user_id": user_id,
+            "day": day,
+            "question_set_id": question_set_id,
+            "category": category,
+            "attempts": attempts,
+            "correct_count": correct,
+            "time_sum": time_sum,
+            "updated_at": now,
+        }
+        for (user_id, day, question_set_id, category), (attempts, correct, time_sum) in sorted(deltas.items())
+    ]
+
+    if insert_fn is not None:
+        t = UserDailyRollup.__table__.c
+        stmt = insert_fn(UserDailyRollup.__table__)
+        ex = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[t.user_id, t.day, t.question_set_id, t.category],
+            set_={
+                "attempts": t.attempts + ex.attempts,
+                "correct_count": t.correct_count + ex.correct_count,
+                "time_sum": t.time_sum + ex.time_sum,
+                "updated_at": ex.updated_at,
+            },
+        )
+        db.execute(stmt, rows)
+        return len(rows)
+
+    for row in rows:
+        rollup = db.get(
+            UserDailyRollup, (row["user_id"], row["day"], row["question_set_id"], row["category"])
+        )
+        if rollup is None:
+            db.add(UserDailyRollup(**row))
+            continue
+        rollup.attempts += row["attempts"]
+        rollup.correct_count += row["correct_count"]
+        rollup.time_sum += row["time_sum"]
+        rollup.updated_at = now
+    return len(rows)
+
+
+def rebuild_daily_rollups(db: Session, user_ids: List[str]) -> None:
+    """指定ユーザーの日次集計を answers から作り直す（INSERT ... SELECT の 1 文。コミットしない）"""
+    db.execute(delete(UserDailyRollup).where(UserDailyRollup.user_id.in_(user_ids)))
+
+    day = func.date(Answer.answered_at)
+    category = func.coalesce(Question.category, UNCATEGORIZED)
+    aggregated = (
+        db.query(
+            Answer.user_id,
+            day,
+            Question.question_set_id,
+            category,
+            func.count(Answer.id),
+            func.sum(cast(Answer.is_correct, Integer)),
+            func.sum(Answer.answer_time_sec),
+            literal(datetime.utcnow()),
+        )
+        .join(Question, Question.id == Answer.question_id)
+        .filter(Answer.user_id.in_(user_ids))
+        .group_by(Answer.user_id, day, Question.question_set_id, category)
+    )
+    t = UserDailyRollup.__table__.c
+    db.execute(
+        insert(UserDailyRollup.__table__).from_select(
+            [t.user_id, t.day, t.question_set_id, t.category, t.attempts, t.correct_count, t.time_sum, t.updated_at],
+            aggregated.statement,
+        )
+    )
+
+
+def rollup_totals(db: Session, user_id: str, question_set_id: Optional[str] = None):
+    """
+    日次集計を合計するクエリ（total / correct / time_sum の 1 行。回答がなければ total = 0）
+
+    呼び出し側で .one() するか .subquery() にして他の集計と 1 文にまとめる。
+    """
+    query = db.query(
+        func.coalesce(func.sum(UserDailyRollup.attempts), 0).label("total"),
+        func.coalesce(func.sum(UserDailyRollup.correct_count), 0).label("correct"),
+        func.coalesce(func.sum(UserDailyRollup.time_sum), 0.0).label("time_sum"),
+    ).filter(UserDailyRollup.user_id == user_id)
+    if question_set_id:
+        query = query.filter(UserDailyRollup.question_set_id == question_set_id)
+    return query
+
+
+def summarize_totals(total: int, correct: int, time_sum: float) -> Dict[str, float]:
+    """合計値を全体統計（GET /answers/stats と同じ形）にする"""
+    if not total:
+        return {
+            "total_attempts": 0,
+            "correct_count": 0,
+            "correct_rate": 0.0,
+            "avg_time_sec": 0.0
+        }
+
+    return {
+        "total_attempts": total,
+        "correct_count": correct,
+        "correct_rate": correct / total,
+        "avg_time_sec": time_sum / total
+    }
@@ -4,14 +4,21 @@ AI予想スコア算出システム
 """
 from typing import Dict, Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, Integer
+from sqlalchemy import func, and_, cast, true, Integer
 from datetime import datetime, timedelta
 import numpy as np
-from ..models import Answer, UserCategoryStats, Question
+from ..core.config import settings
+from ..models import Answer, UserCategoryStats, Question, UserRating, UserDailyRollup
+from .daily_rollups import rollup_totals, summarize_totals
+from .irt import expected_correct
+from .ratings import INITIAL_RATING, expected_scores
 import logging
 
 logger = logging.getLogger(__name__)
 
+# トレンド補正で「最近」とみなす回答数
+RECENT_ANSWER_COUNT = 10
+
 
 class ScorePredictor:
     """スコア予測エンジン"""
@@ -38,7 +45,16 @@ class ScorePredictor:
         """
         # 1. ユーザーの基本統計を取得
         user_stats = self._get_user_stats(user_id, question_set_id)
+        return self._predict_from_stats(user_id, question_set_id, max_score, user_stats)
 
+    def _predict_from_stats(
+        self,
+        user_id: str,
+        question_set_id: Optional[str],
+        max_score: int,
+        user_stats: Dict[str, any]
+    ) -> Dict[str, any]:
+        """取得済みの統計（_get_user_stats と同じ形）から予想スコアを算出"""
         if user_stats["total_attempts"] == 0:
             # データがない場合
             return {
@@ -50,14 +66,31 @@ class ScorePredictor:
                 }
             }
 
-        # 2. 基本スコアを計算（正答率ベース）
-        base_score = user_stats["correct_rate"] * max_score
+        # 2. 基本スコアを計算
+        #    IRT 較正済みの問題集: 項目反応曲線の和による期待スコア
+        #    Elo モード: 各問題の正解確率の平均 / それ以外: 正答率ベース
+        irt_score = self._calculate_irt_expected_score(user_id, question_set_id, max_score)
+        elo_base_score = None
+        if irt_score is None and settings.USE_ELO_RATINGS:
+            elo_base_score = self._calculate_elo_base_score(user_id, question_set_id, max_score)
+        if irt_score is not None:
+            base_score = irt_score
+        elif elo_base_score is not None:
+            base_score = elo_base_score
+        else:
+            base_score = user_stats["correct_rate"] * max_score
 
-        # 3. 回答速度による補正
-        speed_adjustment = self._calculate_speed_adjustment(user_stats)
+        # 3. 回答速度による補正（IRT は能力を直接推定しているため経験則の補正は使わない）
+        if irt_score is not None:
+            speed_adjustment = 0.0
+        else:
+            speed_adjustment = self._calculate_speed_adjustment(user_stats)
 
-        # 4. 最近のトレンドによる補正
-        trend_adjustment = self._calculate_trend_adjustment(user_id, question_set_id)
+        # 4. 最近のトレンドによる補正（IRT / Elo では不要。Elo は回答順に更新され最近の結果を反映済み）
+        if irt_score is not None or elo_base_score is not None:
+            trend_adjustment = 0.0
+        else:
+            trend_adjustment = self._calculate_trend_adjustment(user_stats)
 
         # 5. 難易度による補正
         difficulty_adjustment = self._calculate_difficulty_adjustment(user_stats)
@@ -85,39 +118,232 @@ class ScorePredictor:
             }
         }
 
+    def get_dashboard(
+        self,
+        user_id: str,
+        question_set_ids: Optional[List[str]] = None,
+        max_score: int = 100
+    ) -> Dict[str, any]:
+        """
+        AIダッシュボード用の一括データ
+
+        問題集別の日次集計の合計・最近の回答（全体／問題集別）・カテゴリ別統計を 1 回ずつ読み、
+        全体統計・予想スコア（全体と指定した問題集ごと）・カテゴリ別予想・改善提案をそこから作る。
+        個別の API（/answers/stats, /ai/predict-score, /ai/category-predictions,
+        /ai/improvement-suggestions）と同じ値を返す。
+
+        Args:
+            user_id: ユーザーID
+            question_set_ids: 問題集別に予想スコアを出す問題集ID
+            max_score: 満点スコア
+        """
+        question_set_ids = list(dict.fromkeys(question_set_ids or []))
+
+        set_totals = {
+            row.question_set_id: row
+            for row in self.db.query(
+                UserDailyRollup.question_set_id,
+                func.sum(UserDailyRollup.attempts).label("total"),
+                func.sum(UserDailyRollup.correct_count).label("correct"),
+                func.sum(UserDailyRollup.time_sum).label("time_sum"),
+            ).filter(
+                UserDailyRollup.user_id == user_id
+            ).group_by(UserDailyRollup.question_set_id).all()
+        }
+        total = sum(row.total for row in set_totals.values())
+        correct = sum(row.correct for row in set_totals.values())
+        time_sum = sum(row.time_sum for row in set_totals.values())
+
+        recent = self._recent_window(user_id).one()
+        set_recent = self._recent_windows_by_set(user_id, question_set_ids)
+        category_stats = self.db.query(UserCategoryStats).filter(
+            UserCategoryStats.user_id == user_id
+        ).all()
+
+        question_set_predictions = []
+        for question_set_id in question_set_ids:
+            row = set_totals.get(question_set_id)
+            recent_total, recent_correct = set_recent.get(question_set_id, (0, 0))
+            stats = self._stats_dict(
+                row.total if row else 0,
+                row.correct if row else 0,
+                row.time_sum if row else 0.0,
+                recent_total,
+                recent_correct,
+            )
+            question_set_predictions.append({
+                "question_set_id": question_set_id,
+                **self._predict_from_stats(user_id, question_set_id, max_score, stats),
+            })
+
+        return {
+            "user_id": user_id,
+            "stats": summarize_totals(total, correct, time_sum),
+            "prediction": self._predict_from_stats(
+                user_id,
+                None,
+                max_score,
+                self._stats_dict(total, correct, time_sum, recent.total, recent.correct),
+            ),
+            "question_set_predictions": question_set_predictions,
+            "category_predictions": self._category_predictions(category_stats, max_score),
+            "suggestions": self._improvement_suggestions(category_stats, total, time_sum),
+        }
+
     def _get_user_stats(
         self,
         user_id: str,
         question_set_id: Optional[str] = None
     ) -> Dict[str, any]:
-        """ユーザーの統計情報を取得"""
-        query = self.db.query(
-            func.count(Answer.id).label("total"),
-            func.sum(func.cast(Answer.is_correct, Integer)).label("correct"),
-            func.avg(Answer.answer_time_sec).label("avg_time")
+        """
+        ユーザーの統計情報を取得
+
+        全体の回答数・正答率・平均回答時間は日次集計（user_daily_rollups）の合計から、
+        最近 RECENT_ANSWER_COUNT 問の回答数・正答率は answers を新しい順に LIMIT して取り、
+        1 文にまとめる（どちらも回答履歴の長さに依存しない）。
+        """
+        totals = rollup_totals(self.db, user_id, question_set_id).subquery()
+        recent = self._recent_window(user_id, question_set_id).subquery()
+
+        result = self.db.query(
+            totals.c.total,
+            totals.c.correct,
+            totals.c.time_sum,
+            recent.c.total.label("recent_total"),
+            recent.c.correct.label("recent_correct"),
+        ).select_from(totals).join(recent, true()).one()
+
+        return self._stats_dict(
+            result.total, result.correct, result.time_sum, result.recent_total, result.recent_correct
+        )
+
+    def _recent_window(self, user_id: str, question_set_id: Optional[str] = None):
+        """最近 RECENT_ANSWER_COUNT 問の回答数・正解数を返すクエリ（total / correct の 1 行）"""
+        recent_answers = self.db.query(
+            cast(Answer.is_correct, Integer).label("correct")
         ).filter(Answer.user_id == user_id)
 
         # 特定の問題集に絞る場合
         if question_set_id:
-            query = query.join(Question).filter(
+            recent_answers = recent_answers.join(Question).filter(
                 Question.question_set_id == question_set_id
             )
 
-        result = query.first()
+        recent_answers = recent_answers.order_by(
+            Answer.answered_at.desc(), Answer.id.desc()
+        ).limit(RECENT_ANSWER_COUNT).subquery()
+        return self.db.query(
+            func.count().label("total"),
+            func.coalesce(func.sum(recent_answers.c.correct), 0).label("correct"),
+        )
 
-        if result.total == 0 or result.correct is None:
+    def _recent_windows_by_set(
+        self,
+        user_id: str,
+        question_set_ids: List[str]
+    ) -> Dict[str, tuple]:
+        """問題集ごとの最近 RECENT_ANSWER_COUNT 問の (回答数, 正解数)（ROW_NUMBER で 1 文）"""
+        if not question_set_ids:
+            return {}
+
+        rank = func.row_number().over(
+            partition_by=Question.question_set_id,
+            order_by=(Answer.answered_at.desc(), Answer.id.desc())
+        ).label("rank")
+        ranked = self.db.query(
+            Question.question_set_id.label("question_set_id"),
+            cast(Answer.is_correct, Integer).label("correct"),
+            rank,
+        ).join(
+            Question, Question.id == Answer.question_id
+        ).filter(
+            Answer.user_id == user_id,
+            Question.question_set_id.in_(question_set_ids)
+        ).subquery()
+
+        rows = self.db.query(
+            ranked.c.question_set_id,
+            func.count(),
+            func.coalesce(func.sum(ranked.c.correct), 0),
+        ).filter(
+            ranked.c.rank <= RECENT_ANSWER_COUNT
+        ).group_by(ranked.c.question_set_id).all()
+        return {question_set_id: (n, n_correct) for question_set_id, n, n_correct in rows}
+
+    @staticmethod
+    def _stats_dict(
+        total: int,
+        correct: int,
+        time_sum: float,
+        recent_total: int,
+        recent_correct: int
+    ) -> Dict[str, any]:
+        """集計値を予測用の統計 dict にする"""
+        if not total:
             return {
                 "total_attempts": 0,
                 "correct_rate": 0.0,
-                "avg_time": 0.0
+                "avg_time": 0.0,
+                "recent_attempts": 0,
+                "recent_correct_rate": 0.0
             }
 
         return {
-            "total_attempts": result.total,
-            "correct_rate": result.correct / result.total,
-            "avg_time": result.avg_time or 0.0
+            "total_attempts": total,
+            "correct_rate": correct / total,
+            "avg_time": time_sum / total,
+            "recent_attempts": recent_total,
+            "recent_correct_rate": recent_correct / recent_total if recent_total else 0.0
         }
 
+    def _calculate_irt_expected_score(
+        self,
+        user_id: str,
+        question_set_id: Optional[str],
+        max_score: int
+    ) -> Optional[float]:
+        """
+        IRT（2PL）による期待スコア = 問題集の各問題の正解確率の和 / 問題数 × 満点
+
+        問題集を指定していない場合や、学習者がまだ較正されていない場合は None。
+        """
+        if not question_set_id:
+            return None
+        probabilities = expected_correct(self.db, user_id, question_set_id)
+        if probabilities is None:
+            return None
+        return float(probabilities.sum() / len(probabilities)) * max_score
+
+    def _calculate_elo_base_score(
+        self,
+        user_id: str,
+        question_set_id: Optional[str],
+        max_score: int
+    ) -> Optional[float]:
+        """
+        Elo レーティングによる基本スコア
+
+        問題集の全問題（問題集指定なしの場合は回答したことのある問題）について
+        学習者が正解する確率を平均する。レーティングがまだない場合は None。
+        """
+        user_rating = self.db.query(UserRating.rating).filter(UserRating.user_id == user_id).scalar()
+        if user_rating is None:
+            return None
+
+        query = self.db.query(Question.rating)
+        if question_set_id:
+            query = query.filter(Question.question_set_id == question_set_id)
+        else:
+            answered = self.db.query(Answer.question_id).filter(Answer.user_id == user_id).distinct()
+            query = query.filter(Question.id.in_(answered))
+
+        ratings = np.array(
+            [r if r is not None else INITIAL_RATING for (r,) in query.all()], dtype=np.float64
+        )
+        if len(ratings) == 0:
+            return None
+        return float(expected_scores(user_rating, ratings).mean()) * max_score
+
     def _calculate_speed_adjustment(self, stats: Dict[str, any]) -> float:
         """
         回答速度による補正
@@ -143,43 +369,18 @@ class ScorePredictor:
             penalty = min(5.0, (avg_time - ideal_max) / 10)
             return -penalty
 
-    def _calculate_trend_adjustment(
-        self,
-        user_id: str,
-        question_set_id: Optional[str] = None
-    ) -> float:
+    def _calculate_trend_adjustment(self, stats: Dict[str, any]) -> float:
         """
         最近のトレンドによる補正
 
         最近10問の正答率と全体の正答率を比較
         """
-        # 最近10問の正答率を取得
-        recent_query = self.db.query(
-            func.count(Answer.id).label("total"),
-            func.sum(func.cast(Answer.is_correct, func.Integer())).label("correct")
-        ).filter(Answer.user_id == user_id)
-
-        if question_set_id:
-            recent_query = recent_query.join(Question).filter(
-                Question.question_set_id == question_set_id
-            )
-
-        recent_answers = recent_query.order_by(
-            Answer.answered_at.desc()
-        ).limit(10).first()
-
-        if not recent_answers or recent_answers.total < 5:
+        if stats["recent_attempts"] < 5:
             # データ不足
             return 0.0
 
-        recent_rate = recent_answers.correct / recent_answers.total
-
-        # 全体の正答率
-        overall_stats = self._get_user_stats(user_id, question_set_id)
-        overall_rate = overall_stats["correct_rate"]
-
         # トレンド補正
-        trend_diff = recent_rate - overall_rate
+        trend_diff = stats["recent_correct_rate"] - stats["correct_rate"]
 
         # 上昇トレンド → プラス補正
         # 下降トレンド → マイナス補正
@@ -228,7 +429,14 @@ class ScorePredictor:
         category_stats = self.db.query(UserCategoryStats).filter(
             UserCategoryStats.user_id == user_id
         ).all()
+        return self._category_predictions(category_stats, max_score)
 
+    def _category_predictions(
+        self,
+        category_stats: List[UserCategoryStats],
+        max_score: int
+    ) -> List[Dict[str, any]]:
+        """取得済みのカテゴリ別統計から予想スコアの配列を作る"""
         results: List[Dict[str, any]] = []
         for stat in category_stats:
             if stat.total_questions == 0:
@@ -257,15 +465,31 @@ class ScorePredictor:
         Returns:
             [{ category, suggestion, priority, type? }, ...]  priority は数値（大きいほど重要）
         """
-        suggestions: List[Dict[str, any]] = []
-
         category_stats = self.db.query(UserCategoryStats).filter(
             UserCategoryStats.user_id == user_id
         ).filter(
             UserCategoryStats.weakness_score.is_not(None)
         ).order_by(UserCategoryStats.weakness_score.desc()).all()
 
-        for stat in category_stats[:3]:
+        # 全体の平均回答時間（日次集計の合計から）
+        totals = rollup_totals(self.db, user_id).one()
+        return self._improvement_suggestions(category_stats, totals.total, totals.time_sum)
+
+    def _improvement_suggestions(
+        self,
+        category_stats: List[UserCategoryStats],
+        total_attempts: int,
+        time_sum: float
+    ) -> List[Dict[str, any]]:
+        """取得済みのカテゴリ別統計と全体の回答時間から改善提案を作る"""
+        suggestions: List[Dict[str, any]] = []
+
+        weak = sorted(
+            (s for s in category_stats if s.weakness_score is not None),
+            key=lambda s: s.weakness_score,
+            reverse=True,
+        )
+        for stat in weak[:3]:
             if stat.weakness_score is not None and stat.weakness_score > 0.3:
                 pct = float(stat.correct_rate) * 100
                 suggestion_text = (
@@ -279,8 +503,7 @@ class ScorePredictor:
                     "priority": priority,
                 })
 
-        overall_stats = self._get_user_stats(user_id)
-        if overall_stats["total_attempts"] > 0 and overall_stats["avg_time"] > 20:
+        if total_attempts > 0 and time_sum / total_attempts > 20:
             suggestions.append({
                 "type": "speed",
                 "category": "",
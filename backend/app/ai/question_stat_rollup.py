@@ -0,0 +1,115 @@
+"""
+問題の全体統計シャード（question_stat_shards）の定期ロールアップ
+
+QUESTION_STAT_SHARDS > 0 のとき、回答ごとの増分はシャード行に積まれるため、
+一定間隔で questions の非正規化カラムへ畳み込む。読み手は従来どおり questions を参照する。
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from .stats_updater import StatsUpdater
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionStatRollup:
+    """シャード行を questions に畳み込むバックグラウンドワーカー"""
+
+    def __init__(self, session_factory: Callable, interval_sec: float = 30.0):
+        self._session_factory = session_factory
+        self._interval_sec = interval_sec
+
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self._rollups_total = 0
+        self._failures = 0
+        self._last_rollup_at: Optional[float] = None
+        self._last_rollup_questions = 0
+        self._last_rollup_duration_sec = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="question-stat-rollup", daemon=True)
+        self._thread.start()
+        logger.info("Question stat rollup started interval=%.1fs", self._interval_sec)
+
+    def stop(self) -> None:
+        """ワーカーを止め、残っているシャードを畳み込む（シャットダウン時）"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.run_once()
+        logger.info("Question stat rollup stopped (rollups_total=%d)", self._rollups_total)
+
+    def run_once(self) -> int:
+        """1 回ロールアップする。更新した問題数を返す"""
+        with self._lock:
+            started = time.perf_counter()
+            db = self._session_factory()
+            try:
+                updated = StatsUpdater(db).rollup_question_stat_shards()
+            except Exception:
+                db.rollback()
+                self._failures += 1
+                logger.exception("Question stat rollup failed")
+                return 0
+            finally:
+                db.close()
+
+            self._rollups_total += 1
+            self._last_rollup_at = time.time()
+            self._last_rollup_questions = updated
+            self._last_rollup_duration_sec = time.perf_counter() - started
+            return updated
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self._interval_sec):
+            self.run_once()
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": True,
+            "interval_sec": self._interval_sec,
+            "rollups_total": self._rollups_total,
+            "failures": self._failures,
+            "last_rollup_at": self._last_rollup_at,
+            "last_rollup_questions": self._last_rollup_questions,
+            "last_rollup_duration_sec": round(self._last_rollup_duration_sec, 4),
+        }
+
+
+_rollup: Optional[QuestionStatRollup] = None
+
+
+def get_question_stat_rollup() -> Optional[QuestionStatRollup]:
+    return _rollup
+
+
+def start_question_stat_rollup(session_factory: Callable) -> Optional[QuestionStatRollup]:
+    """シャードが有効な場合にロールアップを起動する（lifespan から呼ぶ）"""
+    global _rollup
+    from ..core.config import settings
+
+    if settings.QUESTION_STAT_SHARDS <= 0 or _rollup is not None:
+        return _rollup
+    _rollup = QuestionStatRollup(session_factory, interval_sec=settings.QUESTION_STAT_ROLLUP_INTERVAL_SEC)
+    _rollup.start()
+    return _rollup
+
+
+def stop_question_stat_rollup() -> None:
+    """残りのシャードを畳み込んで停止する（lifespan のシャットダウン時に呼ぶ）"""
+    global _rollup
+    if _rollup is None:
+        return
+    try:
+        _rollup.stop()
+    finally:
+        _rollup = None
@@ -0,0 +1,98 @@
+"""
+Elo 方式のオンラインレーティング（学習者と問題）
+
+回答ごとに「学習者が問題に勝つ（正解する）」対戦とみなして両者のレーティングを更新する。
+- 学習者: 全体（user_ratings）とカテゴリ別（user_category_stats.rating）
+- 問題: questions.rating
+K 係数は対戦数が増えるほど小さくし、回答が貯まるほど値を安定させる。
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+INITIAL_RATING = 1500.0
+_SCALE = 400.0
+_K_MAX = 64.0
+_K_MIN = 16.0
+_K_HALF_LIFE = 20.0  # この対戦数で K が半分になる
+
+
+def expected_score(user_rating: float, question_rating: float) -> float:
+    """学習者が問題に正解する確率（Elo の期待勝率）"""
+    return 1.0 / (1.0 + math.pow(10.0, (question_rating - user_rating) / _SCALE))
+
+
+def expected_scores(user_rating: float, question_ratings: np.ndarray) -> np.ndarray:
+    """expected_score のベクトル版"""
+    return 1.0 / (1.0 + np.power(10.0, (question_ratings - user_rating) / _SCALE))
+
+
+def k_factor(games: int) -> float:
+    return max(_K_MIN, _K_MAX / (1.0 + games / _K_HALF_LIFE))
+
+
+@dataclass
+class _Rating:
+    rating: float
+    games: int
+    initial: float = field(init=False)
+    initial_games: int = field(init=False)
+
+    def __post_init__(self):
+        self.initial = self.rating
+        self.initial_games = self.games
+
+    @property
+    def delta(self) -> float:
+        return self.rating - self.initial
+
+    @property
+    def games_delta(self) -> int:
+        return self.games - self.initial_games
+
+
+class EloBatch:
+    """
+    1 バッチ分のレーティング更新
+
+    バッチ開始時点のレーティング（スナップショット）から回答順に更新し、
+    書き込みは「最終値 - 初期値」の増分として行う（同時に走る別バッチの増分と足し合わせられる）。
+    """
+
+    def __init__(self):
+        self.users: Dict[str, _Rating] = {}
+        self.categories: Dict[Tuple[str, str], _Rating] = {}
+        self.questions: Dict[str, _Rating] = {}
+
+    def load_user(self, user_id: str, rating: Optional[float], games: Optional[int]) -> None:
+        self.users[user_id] = _Rating(_or_initial(rating), games or 0)
+
+    def load_category(self, user_id: str, category: str, rating: Optional[float], games: Optional[int]) -> None:
+        self.categories[(user_id, category)] = _Rating(_or_initial(rating), games or 0)
+
+    def load_question(self, question_id: str, rating: Optional[float], games: Optional[int]) -> None:
+        self.questions[question_id] = _Rating(_or_initial(rating), games or 0)
+
+    def record(self, user_id: str, question_id: str, category: Optional[str], is_correct: bool) -> None:
+        """1 回答分の更新（O(1)）"""
+        user = self.users.setdefault(user_id, _Rating(INITIAL_RATING, 0))
+        question = self.questions.setdefault(question_id, _Rating(INITIAL_RATING, 0))
+        outcome = 1.0 if is_correct else 0.0
+        question_rating = question.rating
+
+        surprise = outcome - expected_score(user.rating, question_rating)
+        user.rating += k_factor(user.games) * surprise
+        question.rating -= k_factor(question.games) * surprise
+        user.games += 1
+        question.games += 1
+
+        if category:
+            cat = self.categories.setdefault((user_id, category), _Rating(INITIAL_RATING, 0))
+            cat.rating += k_factor(cat.games) * (outcome - expected_score(cat.rating, question_rating))
+            cat.games += 1
+
+
+def _or_initial(rating: Optional[float]) -> float:
+    return INITIAL_RATING if rating is None else rating
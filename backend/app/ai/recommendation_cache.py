@@ -0,0 +1,219 @@
+"""
+問題推薦結果のキャッシュ
+
+(user, question_set, count, target_difficulty) ごとの推薦結果を、プロセス内の LRU と
+（REDIS_URL 設定時は）Redis の 2 段で保持する。キーにユーザーごとの統計バージョンを含め、
+StatsUpdater が統計を更新するたびに（そのトランザクションのコミット後に）バージョンを上げることで
+古い結果を無効化する。
+問題の追加・削除や他ユーザーの統計変化は TTL で反映する。
+
+REDIS_URL 未設定時はバージョンもプロセス内にしかないため、あるワーカーでの回答による無効化は
+他のワーカーに届かない（TTL までは古い推薦を返す）。そのため Redis なしで複数ワーカー
+（WEB_CONCURRENCY > 1）のときはキャッシュを無効にする。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = "rec:ver:{user_id}"
+# Session.info に溜める、コミット後にバージョンを上げるユーザー ID の集合
+_PENDING_BUMPS_KEY = "recommendation_cache_pending_bumps"
+
+
+class RecommendationCache:
+    """推薦結果の LRU（+ 任意の Redis）キャッシュ"""
+
+    def __init__(self, max_entries: int = 2048, ttl_sec: float = 300.0, redis_url: Optional[str] = None):
+        self._max_entries = max_entries
+        self._ttl_sec = ttl_sec
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, question_ids)
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+
+            self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def _user_version(self, user_id: str) -> int:
+        if self._redis is not None:
+            try:
+                return int(self._redis.get(_VERSION_KEY.format(user_id=user_id)) or 0)
+            except Exception:
+                logger.warning("Redis recommendation version read failed; using local version", exc_info=True)
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump_user_versions(self, user_ids: Iterable[str]) -> None:
+        """ユーザーの統計が変わったことを記録し、そのユーザーのキャッシュを無効化する"""
+        user_ids = set(user_ids)
+        if not user_ids or not self.enabled:
+            return
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for user_id in user_ids:
+                    pipe.incr(_VERSION_KEY.format(user_id=user_id))
+                pipe.execute()
+            except Exception:
+                logger.warning("Redis recommendation version bump failed", exc_info=True)
+
+    def get_or_compute(
+        self,
+        user_id: str,
+        question_set_id: str,
+        count: int,
+        target_difficulty: Optional[float],
+        compute: Callable[[], List[str]],
+    ) -> List[str]:
+        if not self.enabled:
+            return compute()
+
+        key = (
+            f"rec:{user_id}:{question_set_id}:{count}:{target_difficulty!r}"
+            f":v{self._user_version(user_id)}"
+        )
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return list(entry[1])
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(key)
+            except Exception:
+                logger.warning("Redis recommendation cache read failed", exc_info=True)
+                raw = None
+            if raw is not None:
+                question_ids = json.loads(raw)
+                self._store_local(key, question_ids, now)
+                with self._lock:
+                    self.redis_hits += 1
+                return list(question_ids)
+
+        question_ids = compute()
+        with self._lock:
+            self.misses += 1
+        self._store_local(key, question_ids, now)
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, max(1, int(self._ttl_sec)), json.dumps(question_ids))
+            except Exception:
+                logger.warning("Redis recommendation cache write failed", exc_info=True)
+        return list(question_ids)
+
+    def _store_local(self, key: str, question_ids: List[str], now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self._ttl_sec, list(question_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.redis_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "memory+redis" if self._redis is not None else "memory",
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache: Optional[RecommendationCache] = None
+_cache_lock = threading.Lock()
+
+
+def _web_workers() -> int:
+    """uvicorn / gunicorn のワーカー数（WEB_CONCURRENCY。未設定・不正なら 1）"""
+    try:
+        return int(os.environ.get("WEB_CONCURRENCY") or 1)
+    except ValueError:
+        return 1
+
+
+def get_recommendation_cache() -> RecommendationCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from ..core.config import settings
+
+                max_entries = settings.RECOMMENDATION_CACHE_SIZE
+                if max_entries > 0 and not settings.REDIS_URL and _web_workers() > 1:
+                    logger.warning(
+                        "Recommendation cache disabled: REDIS_URL is not set and WEB_CONCURRENCY > 1 "
+                        "(per-process versions cannot invalidate other workers)"
+                    )
+                    max_entries = 0
+                _cache = RecommendationCache(
+                    max_entries=max_entries,
+                    ttl_sec=settings.RECOMMENDATION_CACHE_TTL_SEC,
+                    redis_url=settings.REDIS_URL,
+                )
+    return _cache
+
+
+def bump_user_versions_after_commit(db: Session, user_ids: Iterable[str]) -> None:
+    """
+    db のトランザクションがコミットされたらユーザーのバージョンを上げる
+
+    コミット前に上げると、並行する推薦リクエストが古い統計で計算した結果を新しいバージョンで
+    キャッシュしてしまう。ロールバックされた場合は上げない。
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    pending = db.info.get(_PENDING_BUMPS_KEY)
+    if pending is None:
+        pending = db.info[_PENDING_BUMPS_KEY] = set()
+        event.listen(db, "after_commit", _flush_pending_bumps)
+        event.listen(db, "after_rollback", _discard_pending_bumps)
+    pending.update(user_ids)
+
+
+def _flush_pending_bumps(session: Session) -> None:
+    pending = session.info.get(_PENDING_BUMPS_KEY)
+    if pending:
+        user_ids = set(pending)
+        pending.clear()
+        get_recommendation_cache().bump_user_versions(user_ids)
+
+
+def _discard_pending_bumps(session: Session) -> None:
+    pending = session.info.get(_PENDING_BUMPS_KEY)
+    if pending:
+        pending.clear()
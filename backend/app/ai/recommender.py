@@ -6,11 +6,19 @@ from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, Integer
 import numpy as np
-from ..models import Answer, Question, UserCategoryStats, UserQuestionStats
+from ..core.config import settings
+from ..models import Answer, Question, UserCategoryStats, UserQuestionStats, UserRating
+from .category_matrix import get_user_category_matrix_cache
+from .cold_start import lookup_cold_start_misses
+from .ratings import INITIAL_RATING, expected_scores
+from .recommendation_cache import get_recommendation_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Elo モードで狙う誤答確率（正答率 65% 前後の問題を出す）
+_ELO_TARGET_DIFFICULTY = 0.35
+
 
 class QuestionRecommender:
     """問題推薦エンジン"""
@@ -35,8 +43,23 @@ class QuestionRecommender:
             target_difficulty: 目標難易度（None = 自動調整）
 
         Returns:
-            推薦問題のIDリスト
+            推薦問題のIDリスト（統計が変わるまではキャッシュから返す）
         """
+        return get_recommendation_cache().get_or_compute(
+            user_id,
+            question_set_id,
+            count,
+            target_difficulty,
+            lambda: self._recommend_questions_uncached(user_id, question_set_id, count, target_difficulty),
+        )
+
+    def _recommend_questions_uncached(
+        self,
+        user_id: str,
+        question_set_id: str,
+        count: int,
+        target_difficulty: Optional[float]
+    ) -> List[str]:
         # コールドスタート判定（回答数30問以下）
         if self._is_cold_start(user_id, question_set_id):
             logger.info(f"Cold start mode for user {user_id}")
@@ -50,28 +73,50 @@ class QuestionRecommender:
         # 1. ユーザーの苦手カテゴリを取得
         weak_categories = self._get_weak_categories(user_id)
 
-        # 2. 問題集内の全問題を取得
-        questions = self.db.query(Question).filter(
+        # 2. 問題集内の全問題とユーザーの問題別統計を 1 クエリで取得
+        rows = self.db.query(
+            Question.id,
+            Question.category,
+            Question.difficulty,
+            UserQuestionStats.id.label("stat_id"),
+            UserQuestionStats.total_attempts,
+            UserQuestionStats.correct_count,
+            UserQuestionStats.mastery_score,
+            Question.rating,
+        ).outerjoin(
+            UserQuestionStats,
+            and_(
+                UserQuestionStats.question_id == Question.id,
+                UserQuestionStats.user_id == user_id
+            )
+        ).filter(
             Question.question_set_id == question_set_id
         ).all()
 
-        if not questions:
+        if not rows:
             return []
 
-        # 3. 各問題にスコアを付与
-        scored_questions = []
-        for question in questions:
-            score = self._calculate_recommendation_score(
-                user_id,
-                question,
-                weak_categories,
-                target_difficulty
+        difficulty = None
+        if settings.USE_ELO_RATINGS:
+            # このユーザーにとっての難易度 = 誤答確率（学習者と問題のレーティング差から）
+            difficulty = 1 - expected_scores(
+                self._get_user_rating(user_id),
+                np.array([r.rating if r.rating is not None else INITIAL_RATING for r in rows], dtype=np.float64),
             )
-            scored_questions.append((question.id, score))
+            if target_difficulty is None:
+                target_difficulty = _ELO_TARGET_DIFFICULTY
+
+        # 目標難易度が指定されていない場合、ユーザーの正答率から推定（全問題で共通）
+        if target_difficulty is None:
+            user_stats = self._get_user_overall_stats(user_id)
+            # 正答率50-70%を狙う難易度
+            target_difficulty = 1 - user_stats.get("correct_rate", 0.5) + 0.1
 
-        # 4. スコアでソートして上位を返す
-        scored_questions.sort(key=lambda x: x[1], reverse=True)
-        recommended_ids = [q[0] for q in scored_questions[:count]]
+        # 3. 全問題のスコアをベクトル演算で計算
+        scores = self._score_questions(rows, weak_categories, target_difficulty, difficulty)
+
+        # 4. スコア上位を返す（同点は問題の取得順）
+        recommended_ids = [rows[i].id for i in _top_k_indices(scores, count)]
 
         logger.info(f"Recommended {len(recommended_ids)} questions for user {user_id}")
         return recommended_ids
@@ -96,6 +141,68 @@ class QuestionRecommender:
 
         return [stat.category for stat in stats]
 
+    def _get_user_rating(self, user_id: str) -> float:
+        """ユーザー全体の Elo レーティング（未回答なら初期値）"""
+        rating = self.db.query(UserRating.rating).filter(UserRating.user_id == user_id).scalar()
+        return rating if rating is not None else INITIAL_RATING
+
+    def _score_questions(
+        self,
+        rows: list,
+        weak_categories: List[str],
+        target_difficulty: float,
+        difficulty: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        問題ごとの推薦スコアをまとめて計算（_calculate_recommendation_score のベクトル版）
+
+        各項を同じ順序で加算するため、問題ごとに計算した場合と同じ値になる。
+
+        Args:
+            rows: (id, category, difficulty, stat_id, total_attempts, correct_count, mastery_score) の行
+            weak_categories: 苦手カテゴリ（苦手な順）
+            target_difficulty: 目標難易度
+            difficulty: 問題ごとの難易度（None = questions.difficulty。Elo モードではユーザー別の誤答確率）
+
+        Returns:
+            rows と同じ順のスコア配列
+        """
+        # list.index と同じく最初の出現位置を順位とする
+        weak_rank_by_category: Dict[str, int] = {}
+        for rank, category in enumerate(weak_categories):
+            weak_rank_by_category.setdefault(category, rank)
+
+        weak_rank = np.array([weak_rank_by_category.get(r.category, -1) for r in rows], dtype=np.int64)
+        if difficulty is None:
+            difficulty = np.array(
+                [r.difficulty if r.difficulty is not None else 0.5 for r in rows], dtype=np.float64
+            )
+        answered = np.array([r.stat_id is not None for r in rows], dtype=bool)
+        total = np.array([r.total_attempts or 0 for r in rows], dtype=np.int64)
+        correct = np.array([r.correct_count or 0 for r in rows], dtype=np.int64)
+        mastery = np.array([r.mastery_score or 0.0 for r in rows], dtype=np.float64)
+
+        scores = np.zeros(len(rows), dtype=np.float64)
+
+        # 1. 苦手カテゴリの問題を優先（0-0.3）
+        weak = weak_rank >= 0
+        scores[weak] += 0.3 * (1 - weak_rank[weak] / max(len(weak_categories), 1))
+
+        # 2. 難易度スコア（0-0.4）: 難易度が近いほど高スコア
+        scores += 0.4 * (1 - np.abs(difficulty - target_difficulty))
+
+        # 3. 未回答の問題を優先（0-0.2）、習熟度が低い問題も優先
+        unanswered = ~answered
+        scores[unanswered] += 0.2
+        low_mastery = answered & (mastery < 0.5)
+        scores[low_mastery] += 0.2 * (1 - mastery[low_mastery])
+
+        # 4. 復習が必要な問題（0-0.1）: 間違えた経験がある
+        missed = answered & (correct < total)
+        scores[missed] += 0.1 * (1 - correct[missed] / total[missed])
+
+        return scores
+
     def _calculate_recommendation_score(
         self,
         user_id: str,
@@ -113,6 +220,8 @@ class QuestionRecommender:
         - 難易度が適切か（重み: 0.4）
         - まだ解いていないか（重み: 0.2）
         - 最近間違えた問題か（重み: 0.1）
+
+        1 問ずつ DB に問い合わせる参照実装。推薦では _score_questions で全問題をまとめて計算する。
         """
         score = 0.0
 
@@ -252,60 +361,35 @@ class QuestionRecommender:
         Returns:
             [(user_id, similarity_score), ...] のリスト（類似度の高い順）
         """
-        # 1. 現在のユーザーのカテゴリ別スコアを取得
-        user_category_stats = self.db.query(UserCategoryStats).filter(
+        # 1. 現在のユーザーのカテゴリ別スコアを取得（最新値を使う）
+        user_category_stats = self.db.query(
+            UserCategoryStats.category, UserCategoryStats.correct_rate
+        ).filter(
             UserCategoryStats.user_id == user_id
         ).all()
 
         if not user_category_stats:
             return []
 
-        # ユーザーのカテゴリ別正答率ベクトルを作成
-        user_categories = {stat.category: stat.correct_rate for stat in user_category_stats}
-        user_vector = np.array([user_categories.get(cat, 0.5) for cat in sorted(user_categories.keys())])
-
-        # 2. 同じ問題セットを解いた他のユーザーを取得
-        other_users = self.db.query(Answer.user_id).join(Question).filter(
-            and_(
-                Answer.user_id != user_id,
-                Question.question_set_id == question_set_id
-            )
-        ).distinct().all()
+        user_categories = {category: correct_rate for category, correct_rate in user_category_stats}
 
-        if not other_users:
+        # 2. 同じ問題セットを解いた他のユーザーのカテゴリ別正答率行列（キャッシュ）
+        matrix = get_user_category_matrix_cache().get(self.db, question_set_id)
+        if not matrix.user_ids:
             return []
 
-        # 3. 各ユーザーとの類似度を計算
-        similar_users = []
-        for (other_user_id,) in other_users:
-            # 他のユーザーのカテゴリ別スコアを取得
-            other_category_stats = self.db.query(UserCategoryStats).filter(
-                UserCategoryStats.user_id == other_user_id
-            ).all()
-
-            if not other_category_stats:
-                continue
-
-            # 同じカテゴリで比較
-            other_categories = {stat.category: stat.correct_rate for stat in other_category_stats}
-            
-            # 共通カテゴリのみで比較
-            common_categories = set(user_categories.keys()) & set(other_categories.keys())
-            if len(common_categories) < 2:  # 最低2カテゴリ以上で比較
-                continue
-
-            # ベクトルを作成（共通カテゴリのみ）
-            common_cats_sorted = sorted(common_categories)
-            user_vec = np.array([user_categories[cat] for cat in common_cats_sorted])
-            other_vec = np.array([other_categories[cat] for cat in common_cats_sorted])
-
-            # コサイン類似度を計算（無料のnumpyのみ使用）
-            similarity = self._cosine_similarity(user_vec, other_vec)
-            similar_users.append((other_user_id, similarity))
+        # 3. 全ユーザーとの類似度を行列×ベクトル積で計算（共通カテゴリ 2 つ以上のユーザーのみ）
+        similarities = matrix.similarities(user_categories, exclude_user_id=user_id, min_common=2)
+        candidates = np.flatnonzero(~np.isnan(similarities))
+        if candidates.size == 0:
+            return []
 
         # 4. 類似度でソートして上位k人を返す
-        similar_users.sort(key=lambda x: x[1], reverse=True)
-        return similar_users[:top_k]
+        order = np.argsort(-similarities[candidates], kind="stable")[:top_k]
+        return [
+            (matrix.user_ids[i], float(similarities[i]))
+            for i in candidates[order]
+        ]
 
     def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """
@@ -336,7 +420,8 @@ class QuestionRecommender:
         """
         コールドスタート（新規ユーザー）向けの問題推薦
 
-        類似ユーザーが間違えた問題を優先的に推薦
+        似た学習者（同じクラスタ）が間違えた問題を優先的に推薦。
+        学習者数に関係なく定数回のクエリで済む。
 
         Args:
             user_id: ユーザーID
@@ -346,57 +431,36 @@ class QuestionRecommender:
         Returns:
             推薦問題のIDリスト
         """
-        # 1. 類似ユーザーを検索
-        similar_users = self._find_similar_users(user_id, question_set_id, top_k=10)
-
-        # 2. 問題集内の全問題を取得
-        questions = self.db.query(Question).filter(
+        has_questions = self.db.query(Question.id).filter(
             Question.question_set_id == question_set_id
-        ).all()
-
-        if not questions:
+        ).first()
+        if has_questions is None:
             return []
 
-        # 3. 類似ユーザーが間違えた問題を集計
-        question_scores = {}  # {question_id: score}
+        user_rates = dict(
+            self.db.query(UserCategoryStats.category, UserCategoryStats.correct_rate).filter(
+                UserCategoryStats.user_id == user_id
+            ).all()
+        )
 
-        if similar_users:
-            # 類似ユーザーが間違えた問題にスコアを付与
-            for similar_user_id, similarity in similar_users:
-                # このユーザーが間違えた問題を取得
-                wrong_answers = self.db.query(Answer).join(Question).filter(
-                    and_(
-                        Answer.user_id == similar_user_id,
-                        Answer.is_correct == False,
-                        Question.question_set_id == question_set_id
-                    )
-                ).all()
-
-                for answer in wrong_answers:
-                    question_id = answer.question_id
-                    if question_id not in question_scores:
-                        question_scores[question_id] = 0.0
-                    # 類似度に応じてスコアを加算
-                    question_scores[question_id] += similarity
-
-            # 現在のユーザーが既に解いた問題は除外
-            answered_question_ids = set(
-                self.db.query(Answer.question_id).join(Question).filter(
+        if user_rates:
+            # 1. 似た学習者が間違えた問題を取得（定期集計したクラスタ別誤答数。未集計なら類似ユーザーから集計）
+            missed_question_ids = lookup_cold_start_misses(self.db, question_set_id, user_rates)
+            if missed_question_ids is None:
+                missed_question_ids = self._similar_users_missed_questions(user_id, question_set_id)
+
+            # 2. 現在のユーザーが既に解いた問題は除外
+            answered_question_ids = {
+                qid for (qid,) in self.db.query(Answer.question_id).join(Question).filter(
                     and_(
                         Answer.user_id == user_id,
                         Question.question_set_id == question_set_id
                     )
                 ).distinct().all()
-            )
-            answered_question_ids = {qid for (qid,) in answered_question_ids}
-
-            # スコアでソート
-            scored_questions = [
-                (qid, score) for qid, score in question_scores.items()
-                if qid not in answered_question_ids
-            ]
-            scored_questions.sort(key=lambda x: x[1], reverse=True)
-            recommended_ids = [qid for qid, _ in scored_questions[:count]]
+            }
+            recommended_ids = [
+                qid for qid in missed_question_ids if qid not in answered_question_ids
+            ][:count]
 
             if len(recommended_ids) >= count:
                 logger.info(f"Recommended {len(recommended_ids)} questions from similar users for cold start user {user_id}")
@@ -412,6 +476,35 @@ class QuestionRecommender:
             max_difficulty=0.6
         )
 
+    def _similar_users_missed_questions(self, user_id: str, question_set_id: str) -> List[str]:
+        """
+        類似ユーザーが間違えた問題（類似度 × 誤答数の高い順）
+
+        学習者クラスタが未集計の問題集向け。類似ユーザー全員分の誤答を 1 クエリで集計する。
+        """
+        similar_users = dict(self._find_similar_users(user_id, question_set_id, top_k=10))
+        if not similar_users:
+            return []
+
+        wrong_counts = self.db.query(
+            Answer.user_id, Answer.question_id, func.count(Answer.id)
+        ).join(Question).filter(
+            and_(
+                Answer.user_id.in_(similar_users.keys()),
+                Answer.is_correct == False,
+                Question.question_set_id == question_set_id
+            )
+        ).group_by(Answer.user_id, Answer.question_id).all()
+
+        question_scores: Dict[str, float] = {}
+        for similar_user_id, question_id, wrong_count in wrong_counts:
+            # 類似度に応じてスコアを加算
+            question_scores[question_id] = (
+                question_scores.get(question_id, 0.0) + similar_users[similar_user_id] * wrong_count
+            )
+
+        return [qid for qid, _ in sorted(question_scores.items(), key=lambda x: (-x[1], x[0]))]
+
     def _recommend_by_difficulty_fallback(
         self,
         question_set_id: str,
@@ -474,3 +567,22 @@ class QuestionRecommender:
                 recommended.append(q.id)
 
         return recommended[:count]
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> List[int]:
+    """
+    スコア上位 k 件の添字をスコアの高い順に返す
+
+    同点は添字の小さい順（安定ソートで全体を並べた場合と同じ結果）。
+    argpartition で k 番目のスコアを求め、それ以上の候補だけを安定ソートする。
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return []
+    if k >= n:
+        return np.argsort(-scores, kind="stable").tolist()
+
+    kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    candidates = np.flatnonzero(scores >= kth_score)
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order[:k]].tolist()
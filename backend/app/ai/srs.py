@@ -0,0 +1,141 @@
+"""
+間隔反復（SM-2 + stability）のサーバー側スケジューラ
+frontend/src/services/srsService.ts と同じ計算で user_srs_state を更新する
+"""
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from ..models import UserSrsState
+
+# SM-2 の ease factor の下限
+MIN_EASE_FACTOR = 1.3
+
+
+@dataclass
+class SrsState:
+    ease_factor: float = 2.5
+    interval_days: int = 0
+    repetitions: int = 0
+    stability: float = 1.0
+    next_review_at: Optional[datetime] = None
+    last_review_at: Optional[datetime] = None
+
+
+def quality_from_answer(is_correct: bool, answer_time_sec: float) -> int:
+    """回答結果を SM-2 の quality（0-5）に変換（不正解 1 / 遅い正解 3 / 普通 4 / 速い 5）"""
+    if not is_correct:
+        return 1
+    if answer_time_sec > 30:
+        return 3
+    if answer_time_sec > 10:
+        return 4
+    return 5
+
+
+def apply_sm2(prev: SrsState, quality: int, reviewed_at: datetime) -> SrsState:
+    """SM-2 で次の状態を計算（srsService.ts の applySmTwo と同じ）"""
+    ease_factor, interval, repetitions = prev.ease_factor, prev.interval_days, prev.repetitions
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            # JavaScript の Math.round と同じく 0.5 は切り上げ
+            interval = math.floor(interval * ease_factor + 0.5)
+        ease_factor = max(
+            MIN_EASE_FACTOR,
+            ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02),
+        )
+        repetitions += 1
+
+    return SrsState(
+        ease_factor=ease_factor,
+        interval_days=interval,
+        repetitions=repetitions,
+        stability=max(1.0, interval * ease_factor),
+        next_review_at=reviewed_at + timedelta(days=interval),
+        last_review_at=reviewed_at,
+    )
+
+
+def retention(state: SrsState, now: Optional[datetime] = None) -> float:
+    """忘却曲線 exp(-経過日数 / stability) による保持率の推定"""
+    if state.last_review_at is None:
+        return 1.0
+    elapsed_days = ((now or datetime.utcnow()) - state.last_review_at).total_seconds() / 86400
+    if elapsed_days <= 0:
+        return 1.0
+    return math.exp(-elapsed_days / max(1.0, state.stability))
+
+
+def update_srs_states(
+    db: Session,
+    reviews: Iterable[Tuple[str, str, str, bool, float, datetime]],
+) -> int:
+    """
+    回答を user_srs_state に反映する（同じ問題への複数回答は回答順に適用）
+
+    Args:
+        reviews: (user_id, question_id, question_set_id, is_correct, answer_time_sec, answered_at)
+
+    Returns:
+        更新した (user, question) の数
+    """
+    by_key: Dict[Tuple[str, str], List[tuple]] = {}
+    for user_id, question_id, question_set_id, is_correct, answer_time_sec, answered_at in reviews:
+        by_key.setdefault((user_id, question_id), []).append(
+            (answered_at, question_set_id, quality_from_answer(is_correct, answer_time_sec))
+        )
+    if not by_key:
+        return 0
+
+    existing = {
+        (row.user_id, row.question_id): row
+        for row in db.query(UserSrsState).filter(
+            tuple_(UserSrsState.user_id, UserSrsState.question_id).in_(list(by_key))
+        )
+    }
+
+    for key in sorted(by_key):
+        row = existing.get(key)
+        state = _state_of(row) if row is not None else SrsState()
+        question_set_id = None
+        for answered_at, question_set_id, quality in sorted(by_key[key], key=lambda r: r[0]):
+            state = apply_sm2(state, quality, answered_at)
+
+        if row is None:
+            row = UserSrsState(user_id=key[0], question_id=key[1], question_set_id=question_set_id)
+            db.add(row)
+        _assign(row, state)
+    return len(by_key)
+
+
+def _state_of(row: UserSrsState) -> SrsState:
+    return SrsState(
+        ease_factor=row.ease_factor,
+        interval_days=row.interval_days,
+        repetitions=row.repetitions,
+        stability=row.stability,
+        next_review_at=row.next_review_at,
+        last_review_at=row.last_review_at,
+    )
+
+
+def _assign(row: UserSrsState, state: SrsState) -> None:
+    row.ease_factor = state.ease_factor
+    row.interval_days = state.interval_days
+    row.repetitions = state.repetitions
+    row.stability = state.stability
+    row.next_review_at = state.next_review_at
+    row.last_review_at = state.last_review_at
+    row.updated_at = datetime.utcnow()
@@ -3,20 +3,74 @@
 回答が記録されるたびに統計情報を更新
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from ..models import Answer, UserQuestionStats, UserCategoryStats, Question, QuestionSet, Purchase, Review
+from sqlalchemy import Float, Integer, bindparam, case, cast, delete, func, insert, update
+from sqlalchemy.dialects import postgresql
+from ..core.config import settings
+from .recommendation_cache import bump_user_versions_after_commit
+from .ratings import INITIAL_RATING, EloBatch
+from .srs import update_srs_states
+from .daily_rollups import add_daily_rollups, rebuild_daily_rollups
+from ..models import (
+    Answer,
+    UserQuestionStats,
+    UserCategoryStats,
+    Question,
+    QuestionSet,
+    QuestionStatShard,
+    Purchase,
+    Review,
+    UserRating,
+)
 import logging
-from typing import Optional
+import random
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# 1 文の INSERT ... ON CONFLICT に載せる最大行数
+_UPSERT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class AnswerEvent:
+    """統計更新の入力となる1回答分のイベント"""
+    user_id: str
+    question_id: str
+    is_correct: bool
+    answer_time_sec: float
+    answered_at: Optional[datetime] = None
+
+
+@dataclass
+class _StatsDelta:
+    """1行分にまとめた統計の増分"""
+    attempts: int = 0
+    correct: int = 0
+    time_sum: float = 0.0
+    difficulty_sum: float = 0.0
+    last_attempt_at: Optional[datetime] = None
+    rating_delta: float = 0.0
+
+    def add(self, is_correct: bool, answer_time_sec: float, difficulty: float, answered_at: datetime):
+        self.attempts += 1
+        if is_correct:
+            self.correct += 1
+        self.time_sum += answer_time_sec
+        self.difficulty_sum += difficulty
+        if self.last_attempt_at is None or answered_at > self.last_attempt_at:
+            self.last_attempt_at = answered_at
+
 
 class StatsUpdater:
     """統計データ更新エンジン"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, stat_shards: Optional[int] = None):
         self.db = db
+        # 問題の全体統計のシャード数（0 は questions 行を直接加算）
+        self.stat_shards = settings.QUESTION_STAT_SHARDS if stat_shards is None else stat_shards
 
     def update_on_answer(
         self,
@@ -34,189 +88,628 @@ class StatsUpdater:
             is_correct: 正解かどうか
             answer_time_sec: 回答時間
         """
-        # 問題情報を取得
-        question = self.db.query(Question).filter(
-            Question.id == question_id
-        ).first()
-
-        if not question:
-            logger.error(f"Question {question_id} not found")
-            return
-
-        # 1. 問題別統計を更新
-        self._update_question_stats(user_id, question_id, is_correct, answer_time_sec)
-
-        # 2. カテゴリ別統計を更新
-        if question.category:
-            self._update_category_stats(
-                user_id,
-                question.category,
-                is_correct,
-                answer_time_sec,
-                question.difficulty
+        self.update_on_answers([
+            AnswerEvent(
+                user_id=user_id,
+                question_id=question_id,
+                is_correct=is_correct,
+                answer_time_sec=answer_time_sec,
             )
+        ])
 
-        # 3. 問題の全体統計を更新（難易度調整用）
-        self._update_global_question_stats(question_id, is_correct, answer_time_sec)
+    def update_on_answers(self, events: Iterable[AnswerEvent], commit: bool = True) -> int:
+        """
+        複数回答の統計をまとめて更新
 
-        self.db.commit()
-        logger.info(f"Updated stats for user {user_id}, question {question_id}")
+        (user, question) / (user, category) / question ごとに増分を集約し、
+        各テーブルへ1回ずつ反映する。commit=False の場合は呼び出し側のトランザクションに載せる。
 
-    def _update_question_stats(
-        self,
-        user_id: str,
-        question_id: str,
-        is_correct: bool,
-        answer_time_sec: float
-    ):
-        """問題別統計を更新"""
-        stat = self.db.query(UserQuestionStats).filter(
-            and_(
-                UserQuestionStats.user_id == user_id,
-                UserQuestionStats.question_id == question_id
-            )
-        ).first()
+        Args:
+            events: 回答イベント（回答順）
+            commit: 反映後にコミットするか
 
-        if stat is None:
-            # 新規作成
-            stat = UserQuestionStats(
-                id=f"{user_id}_{question_id}",
-                user_id=user_id,
-                question_id=question_id,
-                total_attempts=0,
-                correct_count=0,
-                average_time_sec=0.0,
-                mastery_score=0.0
+        Returns:
+            統計に反映した回答数
+        """
+        events = list(events)
+        if not events:
+            return 0
+
+        question_ids = {e.question_id for e in events}
+        questions = {
+            q.id: q
+            for q in self.db.query(
+                Question.id,
+                Question.question_set_id,
+                Question.category,
+                Question.difficulty,
+                *self._question_rating_columns(),
+            ).filter(Question.id.in_(question_ids)).all()
+        }
+        elo = self._load_ratings(events, questions)
+
+        question_deltas: Dict[Tuple[str, str], _StatsDelta] = {}
+        category_deltas: Dict[Tuple[str, str], _StatsDelta] = {}
+        global_deltas: Dict[str, _StatsDelta] = {}
+        srs_reviews = []
+        rollup_answers = []
+        now = datetime.utcnow()
+        applied = 0
+
+        for e in events:
+            question = questions.get(e.question_id)
+            if question is None:
+                logger.error(f"Question {e.question_id} not found")
+                continue
+
+            difficulty = question.difficulty if question.difficulty is not None else 0.5
+            answered_at = e.answered_at or now
+            args = (e.is_correct, e.answer_time_sec, difficulty, answered_at)
+
+            # 1. 問題別統計
+            question_deltas.setdefault((e.user_id, e.question_id), _StatsDelta()).add(*args)
+            # 2. カテゴリ別統計
+            if question.category:
+                category_deltas.setdefault((e.user_id, question.category), _StatsDelta()).add(*args)
+            # 3. 問題の全体統計（難易度調整用）
+            global_deltas.setdefault(e.question_id, _StatsDelta()).add(*args)
+            # 4. レーティング（学習者・カテゴリ・問題）
+            elo.record(e.user_id, e.question_id, question.category, e.is_correct)
+            # 5. 間隔反復スケジュール
+            srs_reviews.append(
+                (e.user_id, e.question_id, question.question_set_id, e.is_correct, e.answer_time_sec, answered_at)
+            )
+            # 6. 日次集計（ダッシュボード・予想スコア用）
+            rollup_answers.append(
+                (e.user_id, question.question_set_id, question.category, e.is_correct, e.answer_time_sec, answered_at)
             )
-            self.db.add(stat)
+            applied += 1
 
-        # 統計を更新（NULL値を0として扱う）
-        old_total = stat.total_attempts or 0
-        old_correct = stat.correct_count or 0
-        old_avg_time = stat.average_time_sec or 0.0
+        for key, d in category_deltas.items():
+            d.rating_delta = elo.categories[key].delta
+        for question_id, d in global_deltas.items():
+            d.rating_delta = elo.questions[question_id].delta
 
-        stat.total_attempts = old_total + 1
-        if is_correct:
-            stat.correct_count = old_correct + 1
+        insert_fn = self._upsert_insert()
+        if insert_fn is not None:
+            self._upsert_question_stats(insert_fn, question_deltas)
+            self._upsert_category_stats(insert_fn, category_deltas)
+        else:
+            self._apply_question_stats(question_deltas)
+            self._apply_category_stats(category_deltas)
+        self._apply_user_ratings(insert_fn, elo)
 
-        # 平均時間を更新（移動平均）
-        stat.average_time_sec = (
-            (old_avg_time * old_total + answer_time_sec) / stat.total_attempts
+        if self.stat_shards > 0:
+            # questions 行はロールアップ時にまとめて更新する
+            self._increment_question_stat_shards(insert_fn, global_deltas)
+        else:
+            self._apply_global_deltas(insert_fn, global_deltas)
+
+        update_srs_states(self.db, srs_reviews)
+        add_daily_rollups(self.db, insert_fn, rollup_answers)
+
+        # 統計が変わったユーザーの推薦キャッシュを、コミットされたら無効化
+        bump_user_versions_after_commit(self.db, (user_id for user_id, _ in question_deltas))
+        if commit:
+            self.db.commit()
+        logger.info(
+            f"Updated stats for {applied} answers "
+            f"({len(question_deltas)} question stats, {len(category_deltas)} category stats)"
         )
+        return applied
 
-        # 最終回答日時を更新
-        stat.last_attempt_at = datetime.utcnow()
+    def _question_rating_columns(self) -> list:
+        """
+        レーティング計算に使う問題の列（レーティングと対戦数）
 
-        # 習熟度スコアを計算
-        stat.mastery_score = self._calculate_mastery_score(
-            stat.correct_count,
-            stat.total_attempts,
-            stat.average_time_sec
+        シャード有効時は questions に未反映のシャード分も足して、直接更新と同じ値を読む。
+        """
+        if self.stat_shards <= 0:
+            return [Question.rating.label("rating"), Question.total_attempts.label("games")]
+
+        shards = QuestionStatShard.__table__.c
+        pending_rating = (
+            self.db.query(func.coalesce(func.sum(shards.rating_delta), 0.0))
+            .filter(shards.question_id == Question.id)
+            .correlate(Question)
+            .scalar_subquery()
         )
+        pending_games = (
+            self.db.query(func.coalesce(func.sum(shards.attempts), 0))
+            .filter(shards.question_id == Question.id)
+            .correlate(Question)
+            .scalar_subquery()
+        )
+        return [
+            (func.coalesce(Question.rating, INITIAL_RATING) + pending_rating).label("rating"),
+            (func.coalesce(Question.total_attempts, 0) + pending_games).label("games"),
+        ]
+
+    def _load_ratings(self, events: List[AnswerEvent], questions: dict) -> EloBatch:
+        """バッチ開始時点のレーティングを読み込む（ユーザー全体・カテゴリ別・問題）"""
+        elo = EloBatch()
+        for q in questions.values():
+            elo.load_question(q.id, q.rating, q.games)
+
+        user_ids = {e.user_id for e in events}
+        for r in self.db.query(UserRating).filter(UserRating.user_id.in_(user_ids)).all():
+            elo.load_user(r.user_id, r.rating, r.rating_count)
+
+        categories = {q.category for q in questions.values() if q.category}
+        if categories:
+            for s in self.db.query(
+                UserCategoryStats.user_id,
+                UserCategoryStats.category,
+                UserCategoryStats.rating,
+                UserCategoryStats.total_questions,
+            ).filter(
+                UserCategoryStats.user_id.in_(user_ids),
+                UserCategoryStats.category.in_(categories),
+            ).all():
+                elo.load_category(s.user_id, s.category, s.rating, s.total_questions)
+        return elo
+
+    def _apply_user_ratings(self, insert_fn, elo: EloBatch):
+        """ユーザー全体のレーティングに増分を反映"""
+        if not elo.users:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id,
+                "rating": INITIAL_RATING + r.delta,
+                "rating_count": r.games_delta,
+                "updated_at": now,
+            }
+            for user_id, r in sorted(elo.users.items())
+            if r.games_delta > 0
+        ]
+        if not rows:
+            return
 
-        stat.updated_at = datetime.utcnow()
+        if insert_fn is not None:
+            # 増分で加算する（excluded.rating - 初期値 = 今回の増分）
+            t = UserRating.__table__.c
+            stmt = insert_fn(UserRating.__table__)
+            ex = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[t.user_id],
+                set_={
+                    "rating": func.coalesce(t.rating, INITIAL_RATING) + (ex.rating - INITIAL_RATING),
+                    "rating_count": func.coalesce(t.rating_count, 0) + ex.rating_count,
+                    "updated_at": ex.updated_at,
+                },
+            )
+            for chunk in _chunks(rows, _UPSERT_CHUNK_SIZE):
+                self.db.execute(stmt, chunk)
+            return
 
-    def _update_category_stats(
-        self,
-        user_id: str,
-        category: str,
-        is_correct: bool,
-        answer_time_sec: float,
-        difficulty: float
-    ):
-        """カテゴリ別統計を更新"""
-        stat = self.db.query(UserCategoryStats).filter(
-            and_(
-                UserCategoryStats.user_id == user_id,
-                UserCategoryStats.category == category
+        existing = {
+            r.user_id: r
+            for r in self.db.query(UserRating).filter(UserRating.user_id.in_([row["user_id"] for row in rows]))
+        }
+        for row in rows:
+            rating = existing.get(row["user_id"])
+            if rating is None:
+                self.db.add(UserRating(**row))
+                continue
+            rating.rating = (rating.rating if rating.rating is not None else INITIAL_RATING) + (
+                row["rating"] - INITIAL_RATING
             )
-        ).first()
+            rating.rating_count = (rating.rating_count or 0) + row["rating_count"]
+            rating.updated_at = now
 
-        if stat is None:
-            # 新規作成
-            stat = UserCategoryStats(
-                id=f"{user_id}_{category}",
-                user_id=user_id,
-                category=category,
-                total_questions=0,
-                correct_count=0,
-                average_time_sec=0.0,
-                difficulty_mean=0.0,
-                correct_rate=0.0,
-                speed_score=0.0,
-                weakness_score=0.0
+    def _upsert_insert(self):
+        """
+        INSERT ... ON CONFLICT を組み立てる insert 関数を返す
+
+        PostgreSQL では SQL の原子的な加算で統計を更新する（同時回答でも増分が失われない）。
+        それ以外（テストの SQLite 等）は None を返し、ORM の read-modify-write で更新する。
+        """
+        if self.db.get_bind().dialect.name == "postgresql":
+            return postgresql.insert
+        return None
+
+    def _question_stats_row(self, user_id: str, question_id: str, d: _StatsDelta, now: datetime) -> dict:
+        """増分（または集計値）1件分から user_question_stats の行を作る"""
+        avg_time = d.time_sum / d.attempts
+        return {
+            "id": f"{user_id}_{question_id}",
+            "user_id": user_id,
+            "question_id": question_id,
+            "total_attempts": d.attempts,
+            "correct_count": d.correct,
+            "average_time_sec": avg_time,
+            "last_attempt_at": d.last_attempt_at,
+            "mastery_score": self._calculate_mastery_score(d.correct, d.attempts, avg_time),
+            "updated_at": now,
+        }
+
+    def _category_stats_row(self, user_id: str, category: str, d: _StatsDelta, now: datetime) -> dict:
+        """増分（または集計値）1件分から user_category_stats の行を作る"""
+        avg_time = d.time_sum / d.attempts
+        correct_rate = d.correct / d.attempts
+        speed_score = self._calculate_speed_score(avg_time)
+        return {
+            "id": f"{user_id}_{category}",
+            "user_id": user_id,
+            "category": category,
+            "total_questions": d.attempts,
+            "correct_count": d.correct,
+            "average_time_sec": avg_time,
+            "difficulty_mean": d.difficulty_sum / d.attempts,
+            "correct_rate": correct_rate,
+            "speed_score": speed_score,
+            "weakness_score": self._calculate_weakness_score(correct_rate, speed_score),
+            "rating": INITIAL_RATING + d.rating_delta,
+            "updated_at": now,
+        }
+
+    def _upsert_question_stats(self, insert_fn, deltas: Dict[Tuple[str, str], _StatsDelta]):
+        """問題別統計を INSERT ... ON CONFLICT DO UPDATE で加算"""
+        now = datetime.utcnow()
+        rows = [
+            self._question_stats_row(user_id, question_id, d, now)
+            for (user_id, question_id), d in sorted(deltas.items())
+        ]
+
+        t = UserQuestionStats.__table__.c
+        for chunk in _chunks(rows, _UPSERT_CHUNK_SIZE):
+            stmt = insert_fn(UserQuestionStats.__table__).values(chunk)
+            ex = stmt.excluded
+            old_total = func.coalesce(t.total_attempts, 0)
+            new_total = old_total + ex.total_attempts
+            new_correct = func.coalesce(t.correct_count, 0) + ex.correct_count
+            new_avg_time = (
+                func.coalesce(t.average_time_sec, 0.0) * old_total
+                + ex.average_time_sec * ex.total_attempts
+            ) / new_total
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[t.user_id, t.question_id],
+                set_={
+                    "total_attempts": new_total,
+                    "correct_count": new_correct,
+                    "average_time_sec": new_avg_time,
+                    "last_attempt_at": ex.last_attempt_at,
+                    "mastery_score": _mastery_score_sql(new_correct, new_total, new_avg_time),
+                    "updated_at": ex.updated_at,
+                },
+            )
+            self.db.execute(stmt)
+
+    def _upsert_category_stats(self, insert_fn, deltas: Dict[Tuple[str, str], _StatsDelta]):
+        """カテゴリ別統計を INSERT ... ON CONFLICT DO UPDATE で加算"""
+        now = datetime.utcnow()
+        rows = [
+            self._category_stats_row(user_id, category, d, now)
+            for (user_id, category), d in sorted(deltas.items())
+        ]
+
+        t = UserCategoryStats.__table__.c
+        for chunk in _chunks(rows, _UPSERT_CHUNK_SIZE):
+            stmt = insert_fn(UserCategoryStats.__table__).values(chunk)
+            ex = stmt.excluded
+            old_total = func.coalesce(t.total_questions, 0)
+            new_total = old_total + ex.total_questions
+            new_correct = func.coalesce(t.correct_count, 0) + ex.correct_count
+            new_avg_time = (
+                func.coalesce(t.average_time_sec, 0.0) * old_total
+                + ex.average_time_sec * ex.total_questions
+            ) / new_total
+            new_difficulty = (
+                func.coalesce(t.difficulty_mean, 0.0) * old_total
+                + ex.difficulty_mean * ex.total_questions
+            ) / new_total
+            new_correct_rate = cast(new_correct, Float) / new_total
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[t.user_id, t.category],
+                set_={
+                    "total_questions": new_total,
+                    "correct_count": new_correct,
+                    "average_time_sec": new_avg_time,
+                    "difficulty_mean": new_difficulty,
+                    "correct_rate": new_correct_rate,
+                    "speed_score": _speed_score_sql(new_avg_time),
+                    "weakness_score": _weakness_score_sql(new_correct_rate, _speed_score_sql(new_avg_time)),
+                    "rating": func.coalesce(t.rating, INITIAL_RATING) + (ex.rating - INITIAL_RATING),
+                    "updated_at": ex.updated_at,
+                },
             )
-            self.db.add(stat)
+            self.db.execute(stmt)
 
-        # 統計を更新（NULL値を0として扱う）
-        old_total = stat.total_questions or 0
-        old_correct = stat.correct_count or 0
-        old_avg_time = stat.average_time_sec or 0.0
-        old_difficulty = stat.difficulty_mean or 0.0
+    def _apply_global_deltas(self, insert_fn, deltas: Dict[str, _StatsDelta]):
+        """問題の全体統計に増分を反映（PostgreSQL は SQL 加算、それ以外は ORM）"""
+        if insert_fn is not None:
+            self._increment_global_question_stats(deltas)
+        else:
+            self._apply_global_question_stats(deltas)
 
-        stat.total_questions = old_total + 1
-        if is_correct:
-            stat.correct_count = old_correct + 1
+    def _increment_question_stat_shards(self, insert_fn, deltas: Dict[str, _StatsDelta]):
+        """
+        問題の全体統計の増分をランダムなシャード行に加算
 
-        # 平均時間を更新
-        stat.average_time_sec = (
-            (old_avg_time * old_total + answer_time_sec) / stat.total_questions
-        )
+        同じ問題への同時更新が K 行に分散するため、人気問題でも書き込みが 1 行に直列化しない。
+        """
+        if not deltas:
+            return
 
-        # 平均難易度を更新
-        stat.difficulty_mean = (
-            (old_difficulty * old_total + difficulty) / stat.total_questions
+        shard = random.randrange(self.stat_shards)
+        now = datetime.utcnow()
+        # 行ロックの取得順を揃えてデッドロックを避ける
+        rows = [
+            {
+                "question_id": question_id,
+                "shard": shard,
+                "attempts": d.attempts,
+                "correct_count": d.correct,
+                "time_sum": d.time_sum,
+                "rating_delta": d.rating_delta,
+                "updated_at": now,
+            }
+            for question_id, d in sorted(deltas.items())
+        ]
+
+        if insert_fn is None:
+            for row in rows:
+                stat = self.db.get(QuestionStatShard, (row["question_id"], shard))
+                if stat is None:
+                    self.db.add(QuestionStatShard(**row))
+                    continue
+                stat.attempts += row["attempts"]
+                stat.correct_count += row["correct_count"]
+                stat.time_sum += row["time_sum"]
+                stat.rating_delta = (stat.rating_delta or 0.0) + row["rating_delta"]
+                stat.updated_at = now
+            return
+
+        t = QuestionStatShard.__table__.c
+        stmt = insert_fn(QuestionStatShard.__table__)
+        ex = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[t.question_id, t.shard],
+            set_={
+                "attempts": t.attempts + ex.attempts,
+                "correct_count": t.correct_count + ex.correct_count,
+                "time_sum": t.time_sum + ex.time_sum,
+                "rating_delta": func.coalesce(t.rating_delta, 0.0) + ex.rating_delta,
+                "updated_at": ex.updated_at,
+            },
         )
+        for chunk in _chunks(rows, _UPSERT_CHUNK_SIZE):
+            self.db.execute(stmt, chunk)
 
-        # 正答率を計算
-        stat.correct_rate = stat.correct_count / stat.total_questions
+    def rollup_question_stat_shards(self, commit: bool = True) -> int:
+        """
+        シャード行を questions の非正規化カラム（回答数・正解数・平均時間・難易度・レーティング）に畳み込む
 
-        # 速度スコアを計算（理想: 5-15秒）
-        stat.speed_score = self._calculate_speed_score(stat.average_time_sec)
+        DELETE ... RETURNING でシャード行の取り出しと削除を 1 文で行うため、
+        ロールアップ中に加算された増分は新しいシャード行に残り、次回に反映される。
 
-        # 苦手度スコアを計算
-        stat.weakness_score = self._calculate_weakness_score(
-            stat.correct_rate,
-            stat.speed_score
+        Returns:
+            更新した問題数
+        """
+        table = QuestionStatShard.__table__
+        rows = self.db.execute(
+            delete(table).returning(
+                table.c.question_id,
+                table.c.attempts,
+                table.c.correct_count,
+                table.c.time_sum,
+                table.c.rating_delta,
+            )
+        ).all()
+
+        deltas: Dict[str, _StatsDelta] = {}
+        for question_id, attempts, correct, time_sum, rating_delta in rows:
+            d = deltas.setdefault(question_id, _StatsDelta())
+            d.attempts += attempts
+            d.correct += correct
+            d.time_sum += time_sum
+            d.rating_delta += rating_delta or 0.0
+
+        self._apply_global_deltas(self._upsert_insert(), deltas)
+        if commit:
+            self.db.commit()
+        if deltas:
+            logger.info(f"Rolled up {len(rows)} stat shards into {len(deltas)} questions")
+        return len(deltas)
+
+    def _increment_global_question_stats(self, deltas: Dict[str, _StatsDelta]):
+        """問題の全体統計を UPDATE ... SET x = x + :delta で加算（全ユーザーの統計）"""
+        if not deltas:
+            return
+
+        t = Question.__table__.c
+        old_total = func.coalesce(t.total_attempts, 0)
+        new_total = old_total + bindparam("d_attempts")
+        new_correct = func.coalesce(t.correct_count, 0) + bindparam("d_correct")
+        stmt = (
+            update(Question.__table__)
+            .where(t.id == bindparam("q_id"))
+            .values(
+                total_attempts=new_total,
+                correct_count=new_correct,
+                average_time_sec=(
+                    func.coalesce(t.average_time_sec, 0.0) * old_total + bindparam("d_time_sum")
+                ) / new_total,
+                # 難易度を自動調整（正答率が高い = 簡単）
+                difficulty=case(
+                    (new_total >= 10, 1 - cast(new_correct, Float) / new_total),
+                    else_=t.difficulty,
+                ),
+                rating=func.coalesce(t.rating, INITIAL_RATING) + bindparam("d_rating"),
+                updated_at=bindparam("d_updated_at"),
+            )
         )
+        now = datetime.utcnow()
+        self.db.execute(stmt, [
+            {
+                "q_id": question_id,
+                "d_attempts": d.attempts,
+                "d_correct": d.correct,
+                "d_time_sum": d.time_sum,
+                "d_rating": d.rating_delta,
+                "d_updated_at": now,
+            }
+            # 行ロックの取得順を揃えてデッドロックを避ける
+            for question_id, d in sorted(deltas.items())
+        ])
+
+    def _apply_question_stats(self, deltas: Dict[Tuple[str, str], _StatsDelta]):
+        """問題別統計に増分を反映"""
+        if not deltas:
+            return
+
+        user_ids = {user_id for user_id, _ in deltas}
+        question_ids = {question_id for _, question_id in deltas}
+        existing = {
+            (s.user_id, s.question_id): s
+            for s in self.db.query(UserQuestionStats).filter(
+                UserQuestionStats.user_id.in_(user_ids),
+                UserQuestionStats.question_id.in_(question_ids),
+            ).all()
+        }
+
+        for (user_id, question_id), d in deltas.items():
+            stat = existing.get((user_id, question_id))
+            if stat is None:
+                # 新規作成
+                stat = UserQuestionStats(
+                    id=f"{user_id}_{question_id}",
+                    user_id=user_id,
+                    question_id=question_id,
+                    total_attempts=0,
+                    correct_count=0,
+                    average_time_sec=0.0,
+                    mastery_score=0.0
+                )
+                self.db.add(stat)
+
+            # 統計を更新（NULL値を0として扱う）
+            old_total = stat.total_attempts or 0
+            old_avg_time = stat.average_time_sec or 0.0
+
+            stat.total_attempts = old_total + d.attempts
+            stat.correct_count = (stat.correct_count or 0) + d.correct
+
+            # 平均時間を更新（移動平均）
+            stat.average_time_sec = (
+                (old_avg_time * old_total + d.time_sum) / stat.total_attempts
+            )
 
-        stat.updated_at = datetime.utcnow()
+            # 最終回答日時を更新
+            stat.last_attempt_at = d.last_attempt_at
 
-    def _update_global_question_stats(
-        self,
-        question_id: str,
-        is_correct: bool,
-        answer_time_sec: float
-    ):
-        """問題の全体統計を更新（全ユーザーの統計）"""
-        question = self.db.query(Question).filter(
-            Question.id == question_id
-        ).first()
+            # 習熟度スコアを計算
+            stat.mastery_score = self._calculate_mastery_score(
+                stat.correct_count,
+                stat.total_attempts,
+                stat.average_time_sec
+            )
 
-        if not question:
+            stat.updated_at = datetime.utcnow()
+
+    def _apply_category_stats(self, deltas: Dict[Tuple[str, str], _StatsDelta]):
+        """カテゴリ別統計に増分を反映"""
+        if not deltas:
             return
 
-        # NULL値を0として扱う
-        old_total = question.total_attempts or 0
-        old_avg_time = question.average_time_sec or 0.0
-        old_correct = question.correct_count or 0
+        user_ids = {user_id for user_id, _ in deltas}
+        categories = {category for _, category in deltas}
+        existing = {
+            (s.user_id, s.category): s
+            for s in self.db.query(UserCategoryStats).filter(
+                UserCategoryStats.user_id.in_(user_ids),
+                UserCategoryStats.category.in_(categories),
+            ).all()
+        }
+
+        for (user_id, category), d in deltas.items():
+            stat = existing.get((user_id, category))
+            if stat is None:
+                # 新規作成
+                stat = UserCategoryStats(
+                    id=f"{user_id}_{category}",
+                    user_id=user_id,
+                    category=category,
+                    total_questions=0,
+                    correct_count=0,
+                    average_time_sec=0.0,
+                    difficulty_mean=0.0,
+                    correct_rate=0.0,
+                    speed_score=0.0,
+                    weakness_score=0.0
+                )
+                self.db.add(stat)
+
+            # 統計を更新（NULL値を0として扱う）
+            old_total = stat.total_questions or 0
+            old_avg_time = stat.average_time_sec or 0.0
+            old_difficulty = stat.difficulty_mean or 0.0
+
+            stat.total_questions = old_total + d.attempts
+            stat.correct_count = (stat.correct_count or 0) + d.correct
+
+            # 平均時間を更新
+            stat.average_time_sec = (
+                (old_avg_time * old_total + d.time_sum) / stat.total_questions
+            )
 
-        question.total_attempts = old_total + 1
-        if is_correct:
-            question.correct_count = old_correct + 1
+            # 平均難易度を更新
+            stat.difficulty_mean = (
+                (old_difficulty * old_total + d.difficulty_sum) / stat.total_questions
+            )
 
-        # 平均時間を更新
-        question.average_time_sec = (
-            (old_avg_time * old_total + answer_time_sec) / question.total_attempts
-        )
+            # 正答率を計算
+            stat.correct_rate = stat.correct_count / stat.total_questions
+
+            # 速度スコアを計算（理想: 5-15秒）
+            stat.speed_score = self._calculate_speed_score(stat.average_time_sec)
+
+            # 苦手度スコアを計算
+            stat.weakness_score = self._calculate_weakness_score(
+                stat.correct_rate,
+                stat.speed_score
+            )
+
+            # カテゴリ別レーティング
+            stat.rating = (stat.rating if stat.rating is not None else INITIAL_RATING) + d.rating_delta
 
-        # 難易度を自動調整（正答率が高い = 簡単）
-        if question.total_attempts >= 10:
-            correct_rate = question.correct_count / question.total_attempts
-            # 正答率に基づいて難易度を調整（逆相関）
-            question.difficulty = 1 - correct_rate
+            stat.updated_at = datetime.utcnow()
+
+    def _apply_global_question_stats(self, deltas: Dict[str, _StatsDelta]):
+        """問題の全体統計に増分を反映（全ユーザーの統計）"""
+        if not deltas:
+            return
 
-        question.updated_at = datetime.utcnow()
+        questions = {
+            q.id: q
+            for q in self.db.query(Question).filter(Question.id.in_(deltas.keys())).all()
+        }
+        for question_id, d in deltas.items():
+            question = questions[question_id]
+
+            # NULL値を0として扱う
+            old_total = question.total_attempts or 0
+            old_avg_time = question.average_time_sec or 0.0
+
+            question.total_attempts = old_total + d.attempts
+            question.correct_count = (question.correct_count or 0) + d.correct
+
+            # 平均時間を更新
+            question.average_time_sec = (
+                (old_avg_time * old_total + d.time_sum) / question.total_attempts
+            )
+
+            # 難易度を自動調整（正答率が高い = 簡単）
+            if question.total_attempts >= 10:
+                correct_rate = question.correct_count / question.total_attempts
+                # 正答率に基づいて難易度を調整（逆相関）
+                question.difficulty = 1 - correct_rate
+
+            question.rating = (question.rating if question.rating is not None else INITIAL_RATING) + d.rating_delta
+
+            question.updated_at = datetime.utcnow()
 
     def _calculate_mastery_score(
         self,
@@ -296,32 +789,131 @@ class StatsUpdater:
         """
         ユーザーの全統計を再計算
 
-        データの整合性が崩れた時や、初期データ投入時に使用
+        データの整合性が崩れた時や、初期データ投入時に使用。
+        answers JOIN questions の GROUP BY 集計から 1 トランザクションで作り直す
+        （問題の全体統計 questions.total_attempts 等には触れない）。
         """
         logger.info(f"Recalculating all stats for user {user_id}")
+        rebuilt = self._rebuild_user_stats([user_id])
+        self.db.commit()
+        logger.info(f"Recalculated {rebuilt} question stats for user {user_id}")
+
+    @classmethod
+    def recalculate_all_users_stats(
+        cls,
+        session_factory,
+        chunk_size: int = 200,
+        max_workers: int = 4
+    ) -> int:
+        """
+        全ユーザーの統計を再計算（メンテナンス用）
 
-        self.db.query(UserQuestionStats).filter(
-            UserQuestionStats.user_id == user_id
-        ).delete()
+        ユーザーを chunk_size 人ずつに分け、チャンクごとに別セッション・別トランザクションで
+        並列に再構築する。
 
-        self.db.query(UserCategoryStats).filter(
-            UserCategoryStats.user_id == user_id
-        ).delete()
-
-        answers = self.db.query(Answer).filter(
-            Answer.user_id == user_id
-        ).order_by(Answer.answered_at).all()
-
-        for answer in answers:
-            self.update_on_answer(
-                user_id=answer.user_id,
-                question_id=answer.question_id,
-                is_correct=answer.is_correct,
-                answer_time_sec=answer.answer_time_sec
+        Args:
+            session_factory: セッションを作る callable（例: SessionLocal）
+            chunk_size: 1 トランザクションで再構築するユーザー数
+            max_workers: 並列数
+
+        Returns:
+            再構築したユーザー数
+        """
+        db = session_factory()
+        try:
+            user_ids = sorted(
+                {uid for (uid,) in db.query(Answer.user_id).distinct()}
+                | {uid for (uid,) in db.query(UserQuestionStats.user_id).distinct()}
+                | {uid for (uid,) in db.query(UserCategoryStats.user_id).distinct()}
             )
+        finally:
+            db.close()
+
+        def rebuild_chunk(chunk: List[str]) -> int:
+            chunk_db = session_factory()
+            try:
+                cls(chunk_db)._rebuild_user_stats(chunk)
+                chunk_db.commit()
+                return len(chunk)
+            except Exception:
+                chunk_db.rollback()
+                raise
+            finally:
+                chunk_db.close()
+
+        chunks = list(_chunks(user_ids, chunk_size))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            total = sum(executor.map(rebuild_chunk, chunks))
+        logger.info(f"Recalculated stats for {total} users in {len(chunks)} chunks")
+        return total
+
+    def _rebuild_user_stats(self, user_ids: List[str]) -> int:
+        """指定ユーザーの問題別・カテゴリ別統計と日次集計を集計クエリから作り直す（コミットしない）"""
+        # レーティングは回答順に依存するため集計では作り直せない。既存の値を引き継ぐ
+        category_ratings = {
+            (user_id, category): rating
+            for user_id, category, rating in self.db.query(
+                UserCategoryStats.user_id, UserCategoryStats.category, UserCategoryStats.rating
+            ).filter(UserCategoryStats.user_id.in_(user_ids))
+            if rating is not None
+        }
 
-        self.db.commit()
-        logger.info(f"Recalculated {len(answers)} answers for user {user_id}")
+        self.db.query(UserQuestionStats).filter(
+            UserQuestionStats.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+
+        self.db.query(UserCategoryStats).filter(
+            UserCategoryStats.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+
+        correct = func.sum(cast(Answer.is_correct, Integer))
+        difficulty = func.coalesce(Question.difficulty, 0.5)
+
+        question_rows = self.db.query(
+            Answer.user_id,
+            Answer.question_id,
+            func.count(Answer.id),
+            correct,
+            func.sum(Answer.answer_time_sec),
+            func.sum(difficulty),
+            func.max(Answer.answered_at),
+        ).join(Question, Question.id == Answer.question_id).filter(
+            Answer.user_id.in_(user_ids)
+        ).group_by(Answer.user_id, Answer.question_id).all()
+
+        category_rows = self.db.query(
+            Answer.user_id,
+            Question.category,
+            func.count(Answer.id),
+            correct,
+            func.sum(Answer.answer_time_sec),
+            func.sum(difficulty),
+            func.max(Answer.answered_at),
+        ).join(Question, Question.id == Answer.question_id).filter(
+            Answer.user_id.in_(user_ids),
+            Question.category.isnot(None),
+            Question.category != "",
+        ).group_by(Answer.user_id, Question.category).all()
+
+        now = datetime.utcnow()
+        question_stats = [
+            self._question_stats_row(user_id, question_id, _aggregate_delta(*agg), now)
+            for user_id, question_id, *agg in question_rows
+        ]
+        category_stats = [
+            self._category_stats_row(user_id, category, _aggregate_delta(*agg), now)
+            for user_id, category, *agg in category_rows
+        ]
+        for row in category_stats:
+            row["rating"] = category_ratings.get((row["user_id"], row["category"]), INITIAL_RATING)
+
+        for chunk in _chunks(question_stats, _UPSERT_CHUNK_SIZE):
+            self.db.execute(insert(UserQuestionStats.__table__), chunk)
+        for chunk in _chunks(category_stats, _UPSERT_CHUNK_SIZE):
+            self.db.execute(insert(UserCategoryStats.__table__), chunk)
+        rebuild_daily_rollups(self.db, user_ids)
+        bump_user_versions_after_commit(self.db, user_ids)
+        return len(question_stats)
 
     def recalculate_question_set_stats(self, question_set_id: str):
         """問題集の非正規化集計カラムを answers / questions / purchases / reviews から再計算"""
@@ -348,3 +940,46 @@ class StatsUpdater:
         qs.updated_at = datetime.utcnow()
         self.db.commit()
         logger.info(f"Recalculated question_set stats for {question_set_id}")
+
+
+def _aggregate_delta(attempts, correct, time_sum, difficulty_sum, last_attempt_at) -> _StatsDelta:
+    """GROUP BY 集計 1 行を _StatsDelta に詰め替える"""
+    return _StatsDelta(
+        attempts=attempts,
+        correct=correct or 0,
+        time_sum=time_sum or 0.0,
+        difficulty_sum=difficulty_sum or 0.0,
+        last_attempt_at=last_attempt_at,
+    )
+
+
+def _chunks(rows: list, size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+# --- StatsUpdater のスコア計算を SQL 式で表したもの（ON CONFLICT DO UPDATE 用） ---
+
+def _mastery_score_sql(correct_count, total_attempts, avg_time):
+    """_calculate_mastery_score と同じ式"""
+    correct_rate = cast(correct_count, Float) / total_attempts
+    # min(1, 15 / max(avg_time, 1))
+    speed_score = case((avg_time > 15.0, 15.0 / avg_time), else_=1.0)
+    mastery = correct_rate * 0.7 + speed_score * 0.3
+    return case((mastery > 1.0, 1.0), else_=mastery)
+
+
+def _speed_score_sql(avg_time):
+    """_calculate_speed_score と同じ式"""
+    return case(
+        (avg_time < 5.0, 0.8 + 0.2 * (avg_time / 5.0)),
+        (avg_time <= 15.0, 1.0),
+        (avg_time >= 45.0, 0.0),
+        else_=1.0 - (avg_time - 15.0) / 30.0,
+    )
+
+
+def _weakness_score_sql(correct_rate, speed_score):
+    """_calculate_weakness_score と同じ式"""
+    weakness = (1 - correct_rate) * 0.7 + (1 - speed_score) * 0.3
+    return case((weakness > 1.0, 1.0), else_=weakness)
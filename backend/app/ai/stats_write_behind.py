@@ -0,0 +1,319 @@
+"""
+回答統計の write-behind（遅延書き込み）
+submit 時は回答の INSERT だけを行い、統計の増分はキューに積んでバックグラウンドで集約反映する
+
+- キューはプロセス内（REDIS_URL 未設定時）または Redis のリスト
+- ワーカーは一定間隔、または未反映件数が閾値を超えた時点でまとめて flush する
+- flush は StatsUpdater.update_on_answers に渡し、(user, question) / (user, category) ごとに集約される
+- flush に失敗したバッチはキューの先頭に戻して再試行する。max_attempts 回失敗したら 1 件ずつ反映し直し、
+  それでも失敗する増分（削除済みの問題を指すものなど）は dead-letter に移して後続の反映を止めない。
+  dead-letter の統計は answers に回答が残っているので `python rebuild_stats.py --user USER_ID` で作り直せる
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+from .stats_updater import AnswerEvent, StatsUpdater
+
+logger = logging.getLogger(__name__)
+
+REDIS_QUEUE_KEY = "stats:write_behind:events"
+REDIS_DEAD_LETTER_KEY = "stats:write_behind:dead"
+# 1 バッチの再試行回数（超えたら 1 件ずつ反映し、失敗した増分は dead-letter へ）と dead-letter の保持上限
+MAX_FLUSH_ATTEMPTS = 5
+MAX_DEAD_LETTERS = 10000
+
+
+class _MemoryQueue:
+    """プロセス内キュー（要素は (enqueue 時刻, 増分, 失敗回数)）"""
+
+    def __init__(self):
+        self._items: deque = deque()
+        self._dead: deque = deque(maxlen=MAX_DEAD_LETTERS)
+        self._lock = threading.Lock()
+
+    def push(self, events: List[AnswerEvent]) -> int:
+        now = time.time()
+        with self._lock:
+            self._items.extend((now, e, 0) for e in events)
+            return len(self._items)
+
+    def pop(self, limit: int) -> List[tuple]:
+        with self._lock:
+            n = min(limit, len(self._items))
+            return [self._items.popleft() for _ in range(n)]
+
+    def requeue(self, items: List[tuple]) -> None:
+        with self._lock:
+            self._items.extendleft(reversed(items))
+
+    def dead_letter(self, items: List[tuple]) -> None:
+        with self._lock:
+            self._dead.extend(items)
+
+    def pending(self) -> int:
+        return len(self._items)
+
+    def dead_letters(self) -> int:
+        return len(self._dead)
+
+    def oldest_enqueued_at(self) -> Optional[float]:
+        with self._lock:
+            return self._items[0][0] if self._items else None
+
+
+class _RedisQueue:
+    """Redis リストによるキュー（複数インスタンスで共有。取り出しは LRANGE + LTRIM を原子的に実行）"""
+
+    def __init__(self, redis_url: str, key: str = REDIS_QUEUE_KEY, dead_key: str = REDIS_DEAD_LETTER_KEY):
+        import redis
+
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self._key = key
+        self._dead_key = dead_key
+
+    @staticmethod
+    def _encode(enqueued_at: float, e: AnswerEvent, attempts: int = 0) -> str:
+        return json.dumps({
+            "t": enqueued_at,
+            "n": attempts,
+            "user_id": e.user_id,
+            "question_id": e.question_id,
+            "is_correct": e.is_correct,
+            "answer_time_sec": e.answer_time_sec,
+            "answered_at": e.answered_at.isoformat() if e.answered_at else None,
+        })
+
+    @staticmethod
+    def _decode(raw: str) -> tuple:
+        d = json.loads(raw)
+        return d["t"], AnswerEvent(
+            user_id=d["user_id"],
+            question_id=d["question_id"],
+            is_correct=d["is_correct"],
+            answer_time_sec=d["answer_time_sec"],
+            answered_at=datetime.fromisoformat(d["answered_at"]) if d["answered_at"] else None,
+        ), d.get("n", 0)
+
+    def push(self, events: List[AnswerEvent]) -> int:
+        now = time.time()
+        return self._redis.rpush(self._key, *(self._encode(now, e) for e in events))
+
+    def pop(self, limit: int) -> List[tuple]:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.lrange(self._key, 0, limit - 1)
+        pipe.ltrim(self._key, limit, -1)
+        raw, _ = pipe.execute()
+        return [self._decode(r) for r in raw]
+
+    def requeue(self, items: List[tuple]) -> None:
+        if items:
+            self._redis.lpush(self._key, *(self._encode(*item) for item in reversed(items)))
+
+    def dead_letter(self, items: List[tuple]) -> None:
+        if items:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.rpush(self._dead_key, *(self._encode(*item) for item in items))
+            pipe.ltrim(self._dead_key, -MAX_DEAD_LETTERS, -1)
+            pipe.execute()
+
+    def pending(self) -> int:
+        return self._redis.llen(self._key)
+
+    def dead_letters(self) -> int:
+        return self._redis.llen(self._dead_key)
+
+    def oldest_enqueued_at(self) -> Optional[float]:
+        raw = self._redis.lindex(self._key, 0)
+        return json.loads(raw)["t"] if raw else None
+
+
+class StatsWriteBehind:
+    """回答統計の write-behind キューとバックグラウンド flush ワーカー"""
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        flush_interval_sec: float = 2.0,
+        max_pending: int = 500,
+        redis_url: Optional[str] = None,
+        max_attempts: int = MAX_FLUSH_ATTEMPTS,
+    ):
+        self._session_factory = session_factory
+        self._flush_interval_sec = flush_interval_sec
+        self._max_pending = max_pending
+        self._max_attempts = max_attempts
+        self._queue = _RedisQueue(redis_url) if redis_url else _MemoryQueue()
+        self._backend = "redis" if redis_url else "memory"
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self._flushed_total = 0
+        self._flush_failures = 0
+        self._dead_lettered_total = 0
+        self._last_flush_at: Optional[float] = None
+        self._last_flush_duration_sec = 0.0
+
+    def enqueue(self, events: Iterable[AnswerEvent]) -> None:
+        """統計の増分をキューに積む（閾値を超えたらワーカーを起こす）"""
+        events = list(events)
+        if not events:
+            return
+        if self._queue.push(events) >= self._max_pending:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-write-behind", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Stats write-behind started backend=%s interval=%.1fs max_pending=%d",
+            self._backend,
+            self._flush_interval_sec,
+            self._max_pending,
+        )
+
+    def stop(self) -> None:
+        """ワーカーを止め、残っている増分をすべて反映する（シャットダウン時）"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while self.flush():
+            pass
+        logger.info("Stats write-behind stopped (flushed_total=%d)", self._flushed_total)
+
+    def flush(self) -> int:
+        """キューから最大 max_pending 件を取り出して統計に反映する。反映した件数を返す"""
+        with self._flush_lock:
+            items = self._queue.pop(self._max_pending)
+            if not items:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._apply([e for _, e, _ in items])
+                flushed = len(items)
+            except Exception:
+                self._flush_failures += 1
+                items = [(t, e, n + 1) for t, e, n in items]
+                if max(n for _, _, n in items) < self._max_attempts:
+                    self._queue.requeue(items)
+                    logger.exception("Stats write-behind flush failed; requeued %d events", len(items))
+                    return 0
+                logger.exception(
+                    "Stats write-behind flush failed %d times; applying %d events one by one",
+                    self._max_attempts,
+                    len(items),
+                )
+                flushed = self._apply_individually(items)
+
+            self._flushed_total += flushed
+            self._last_flush_at = time.time()
+            self._last_flush_duration_sec = time.perf_counter() - started
+            return flushed
+
+    def _apply(self, events: List[AnswerEvent]) -> None:
+        db = self._session_factory()
+        try:
+            StatsUpdater(db).update_on_answers(events)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _apply_individually(self, items: List[tuple]) -> int:
+        """失敗したバッチを 1 件ずつ反映し、それでも失敗した増分を dead-letter に移す。反映した件数を返す"""
+        dead = []
+        for item in items:
+            try:
+                self._apply([item[1]])
+            except Exception:
+                dead.append(item)
+        if dead:
+            self._queue.dead_letter(dead)
+            self._dead_lettered_total += len(dead)
+            logger.error(
+                "Stats write-behind moved %d events to dead-letter (e.g. user=%s question=%s); "
+                "rebuild those users' stats with rebuild_stats.py",
+                len(dead),
+                dead[0][1].user_id,
+                dead[0][1].question_id,
+            )
+        return len(items) - len(dead)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._flush_interval_sec)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                # 閾値を超えている間は続けて flush する
+                while self.flush() >= self._max_pending:
+                    pass
+            except Exception:
+                logger.exception("Stats write-behind worker error")
+
+    def metrics(self) -> dict:
+        """未反映件数と遅延（最古の未反映増分が積まれてからの秒数）"""
+        oldest = self._queue.oldest_enqueued_at()
+        return {
+            "enabled": True,
+            "backend": self._backend,
+            "pending": self._queue.pending(),
+            "lag_sec": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "flushed_total": self._flushed_total,
+            "flush_failures": self._flush_failures,
+            "dead_lettered_total": self._dead_lettered_total,
+            "dead_letter_pending": self._queue.dead_letters(),
+            "last_flush_at": self._last_flush_at,
+            "last_flush_duration_sec": round(self._last_flush_duration_sec, 4),
+        }
+
+
+_write_behind: Optional[StatsWriteBehind] = None
+
+
+def get_stats_write_behind() -> Optional[StatsWriteBehind]:
+    """起動中の write-behind を返す（無効時は None。呼び出し側はその場で統計を更新する）"""
+    return _write_behind
+
+
+def start_stats_write_behind(session_factory: Callable) -> Optional[StatsWriteBehind]:
+    """設定で有効な場合に write-behind を起動する（lifespan から呼ぶ）"""
+    global _write_behind
+    from ..core.config import settings
+
+    if not settings.STATS_WRITE_BEHIND or _write_behind is not None:
+        return _write_behind
+    _write_behind = StatsWriteBehind(
+        session_factory,
+        flush_interval_sec=settings.STATS_FLUSH_INTERVAL_SEC,
+        max_pending=settings.STATS_FLUSH_MAX_PENDING,
+        redis_url=settings.REDIS_URL,
+    )
+    _write_behind.start()
+    return _write_behind
+
+
+def stop_stats_write_behind() -> None:
+    """残りの増分を反映して停止する（lifespan のシャットダウン時に呼ぶ）"""
+    global _write_behind
+    if _write_behind is None:
+        return
+    try:
+        _write_behind.stop()
+    finally:
+        _write_behind = None
@@ -7,12 +7,23 @@ from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
 
+from ..core.config import settings
 from ..core.database import get_db
 from ..core.auth import get_current_admin_user, get_current_super_admin_user, get_password_hash
 from ..models import User, QuestionSet
 from ..utils.content_languages import serialize_from_question_set_row
 from ..models.user import UserRole, SellerApplicationStatus
 from ..models.question import QuestionSetApprovalStatus
+from ..ai.stats_write_behind import get_stats_write_behind
+from ..ai.question_stat_rollup import get_question_stat_rollup
+from ..ai.category_matrix import get_user_category_matrix_cache
+from ..ai.cold_start import get_learner_cluster_refresher, refresh_learner_clusters
+from ..ai.irt import calibrate_question_set
+from ..ai.recommendation_cache import get_recommendation_cache
+from ..services.embedding_grading import get_compiled_rubric_cache
+from ..services.grading_cache import get_grading_cache
+from ..services.grading_pool import get_grading_pool
+from ..services.tfidf_grading import get_tfidf_model_cache
 
 router = APIRouter()
 
@@ -399,3 +410,73 @@ async def reject_seller_application(
     db.commit()
     db.refresh(user)
     return _build_application_response(user, db)
+
+
+@router.get("/performance-metrics")
+async def get_performance_metrics(
+    current_admin: User = Depends(get_current_admin_user),
+):
+    """
+    バックグラウンド処理・キャッシュの計測値を取得（管理者専用）
+    """
+    write_behind = get_stats_write_behind()
+    rollup = get_question_stat_rollup()
+    cluster_refresher = get_learner_cluster_refresher()
+    return {
+        "stats_write_behind": write_behind.metrics() if write_behind else {"enabled": False},
+        "question_stat_rollup": rollup.metrics() if rollup else {"enabled": False},
+        "recommender_matrix": get_user_category_matrix_cache().metrics(),
+        "recommendation_cache": get_recommendation_cache().metrics(),
+        "compiled_rubric_cache": get_compiled_rubric_cache().metrics(),
+        "grading_pool": get_grading_pool().metrics(),
+        "grading_cache": get_grading_cache().metrics(),
+        "tfidf_models": get_tfidf_model_cache().metrics(),
+        "learner_clusters": cluster_refresher.metrics() if cluster_refresher else {"enabled": False},
+    }
+
+
+@router.post("/learner-clusters/{question_set_id}/refresh")
+def refresh_question_set_learner_clusters(
+    question_set_id: str,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    """
+    問題集の学習者クラスタ（コールドスタート推薦用）を今すぐ作り直す（管理者専用）
+
+    k-means と表の書き換えでイベントループを止めないよう、同期関数にしてスレッドプールで実行する。
+    """
+    qs = db.query(QuestionSet).filter(QuestionSet.id == question_set_id).first()
+    if not qs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question set not found")
+
+    clusters = refresh_learner_clusters(db, question_set_id, settings.COLD_START_CLUSTERS)
+    db.commit()
+    return {"question_set_id": question_set_id, "clusters": clusters}
+
+
+@router.post("/irt/{question_set_id}/calibrate")
+def calibrate_question_set_irt(
+    question_set_id: str,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    """
+    問題集の IRT（2PL）パラメータと学習者能力を answers から推定し直す（管理者専用）
+
+    EM の当てはめでイベントループを止めないよう、同期関数にしてスレッドプールで実行する。
+    全問題集をまとめて較正する場合は CLI（python calibrate_irt.py）を使う。
+    """
+    qs = db.query(QuestionSet).filter(QuestionSet.id == question_set_id).first()
+    if not qs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question set not found")
+
+    try:
+        summary = calibrate_question_set(db, question_set_id)
+        db.commit()
+        return summary
+    except Exception as e:
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,9 +1,13 @@
 """
 AI関連のAPIエンドポイント
 """
+import hashlib
+import json
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -15,6 +19,9 @@ from ..ai import QuestionRecommender, ScorePredictor
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# /dashboard で問題集別の予想スコアを出せる問題集数の上限
+MAX_DASHBOARD_QUESTION_SETS = 20
+
 
 class RecommendationRequest(BaseModel):
     user_id: str
@@ -128,6 +135,48 @@ async def get_improvement_suggestions(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/dashboard/{user_id}")
+async def get_dashboard(
+    user_id: str,
+    request: Request,
+    question_set_ids: List[str] = Query([], description="問題集別に予想スコアを出す問題集ID（複数指定可）"),
+    max_score: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    AIダッシュボードの一括取得
+
+    全体統計・予想スコア（全体と問題集別）・カテゴリ別予想・改善提案を
+    同じ集計から 1 回で返す。ETag を付け、If-None-Match が一致すれば 304 を返す。
+    """
+    if len(question_set_ids) > MAX_DASHBOARD_QUESTION_SETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"question_set_ids は最大 {MAX_DASHBOARD_QUESTION_SETS} 件までです"
+        )
+
+    predictor = ScorePredictor(db)
+
+    try:
+        dashboard = jsonable_encoder(predictor.get_dashboard(
+            user_id=user_id,
+            question_set_ids=question_set_ids,
+            max_score=max_score
+        ))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    body = json.dumps(dashboard, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    etag = f'W/"{hashlib.sha1(body.encode()).hexdigest()}"'
+    # ユーザー固有のデータなので共有キャッシュには置かせず、毎回 ETag で再検証させる
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=dashboard, headers=headers)
+
+
 @router.get("/adaptive-difficulty/{user_id}/{category}")
 async def get_adaptive_difficulty(
     user_id: str,
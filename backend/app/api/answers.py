@@ -2,26 +2,42 @@
 回答関連のAPIエンドポイント
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
-from pydantic import BaseModel
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field
 import uuid
 
+from ..core.config import settings
 from ..core.database import get_db
 from ..core.auth import get_current_active_user
 from ..models import Answer, User, QuestionSet, Question
 from ..utils.content_languages import normalize_content_language_list
-from ..ai import StatsUpdater
+from ..ai import AnswerEvent, StatsUpdater
+from ..ai.daily_rollups import rollup_totals, summarize_totals
+from ..ai.stats_write_behind import get_stats_write_behind
 from ..services.ai_evaluator import evaluate_text_answer
+from ..services.batch_grading import evaluate_compiled_batch, evaluate_rubric_batch
 from ..services.embedding_grading import (
     RubricItem,
     MisconceptionItem,
+    compile_text,
     evaluate_with_rubric_and_misconceptions,
+    rubric_hash,
     to_legacy_evaluation_format,
 )
+from ..services.grading_cache import answer_key_hash, get_grading_cache
+from ..services.grading_pool import GradingTimeoutError, run_grading
+from ..services.question_rubrics import stored_rubric
+from ..services.tfidf_grading import get_tfidf_model_cache, rescore_with_tfidf
 router = APIRouter()
 
+# 1 リクエストで受け付ける回答数の上限（クイズ 1 セッション分を想定）
+MAX_SUBMIT_BATCH_SIZE = 500
+# ルーブリック一括採点で 1 リクエストに含められる回答数の上限（1 クラス分を想定）
+MAX_RUBRIC_BATCH_SIZE = 500
+
 
 class SubmitAnswerRequest(BaseModel):
     user_id: str
@@ -32,6 +48,15 @@ class SubmitAnswerRequest(BaseModel):
     session_id: Optional[str] = None
 
 
+class SubmitAnswerBatchItem(SubmitAnswerRequest):
+    # クライアント側で回答した時刻（未指定ならサーバー受信時刻）
+    answered_at: Optional[datetime] = None
+
+
+class SubmitAnswerBatchRequest(BaseModel):
+    answers: List[SubmitAnswerBatchItem] = Field(..., min_length=1, max_length=MAX_SUBMIT_BATCH_SIZE)
+
+
 class EvaluateTextAnswerRequest(BaseModel):
     question_id: str
     user_answer: str
@@ -56,6 +81,18 @@ class EvaluateTextWithRubricRequest(BaseModel):
     misconceptions: Optional[List[MisconceptionItemSchema]] = None
 
 
+class EvaluateTextWithRubricBatchRequest(BaseModel):
+    question_id: str
+    user_answers: List[str] = Field(..., min_length=1, max_length=MAX_RUBRIC_BATCH_SIZE)
+    rubrics: List[RubricItemSchema]
+    misconceptions: Optional[List[MisconceptionItemSchema]] = None
+
+
+class EvaluateTextWithStoredRubricBatchRequest(BaseModel):
+    question_id: str
+    user_answers: List[str] = Field(..., min_length=1, max_length=MAX_RUBRIC_BATCH_SIZE)
+
+
 class AnswerResponse(BaseModel):
     id: str
     user_id: str
@@ -69,6 +106,20 @@ class AnswerResponse(BaseModel):
         from_attributes = True
 
 
+class SubmitAnswerBatchResponse(BaseModel):
+    answers: List[AnswerResponse]
+    count: int
+
+
+def _to_utc_naive(value: Optional[datetime], now: datetime) -> datetime:
+    """クライアント時刻を DB と同じ naive UTC に揃える（未来時刻はサーバー時刻に丸める）"""
+    if value is None:
+        return now
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(value, now)
+
+
 @router.post("/evaluate-text")
 async def evaluate_text_answer_endpoint(
     request: EvaluateTextAnswerRequest,
@@ -94,6 +145,28 @@ async def evaluate_text_answer_endpoint(
                 detail="This endpoint is only for text_input questions"
             )
 
+        # TF-IDF で再判定するときは問題集のモデル（内容が変わっていればここで作り直される）
+        tfidf_model = None
+        if settings.TFIDF_GRADING_ENABLED:
+            tfidf_model = await get_tfidf_model_cache().get(db, question.question_set_id)
+
+        # 同じ問題・正解・回答の評価結果があれば再利用する
+        # （TF-IDF の結果は問題集の他の文章にもよるため、モデルの内容ハッシュもキーに含める）
+        cache = get_grading_cache()
+        if tfidf_model is None:
+            kind, answer_key = "text", question.correct_answer
+        else:
+            kind, answer_key = "text-tfidf", f"{question.correct_answer}\0{tfidf_model.content_hash}"
+        cache_key = cache.key(
+            kind,
+            question.id,
+            answer_key_hash(answer_key),
+            request.user_answer.strip(),
+        )
+        evaluation = cache.get(cache_key)
+        if evaluation is not None:
+            return evaluation
+
         # AI評価を実行
         evaluation = await evaluate_text_answer(
             question_text=question.question_text,
@@ -101,11 +174,22 @@ async def evaluate_text_answer_endpoint(
             user_answer=request.user_answer,
             explanation=question.explanation
         )
+        if tfidf_model is not None:
+            evaluation = rescore_with_tfidf(
+                evaluation,
+                tfidf_model,
+                question.correct_answer,
+                request.user_answer,
+                settings.TFIDF_GRADING_THRESHOLD,
+            )
+        cache.set(cache_key, evaluation)
 
         return evaluation
 
     except HTTPException:
         raise
+    except GradingTimeoutError:
+        raise HTTPException(status_code=504, detail="Grading timed out")
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -134,32 +218,219 @@ async def evaluate_text_with_rubric_endpoint(
                 detail="This endpoint is only for text_input questions",
             )
 
-        rubrics = [
-            RubricItem(id=r.id, text=r.text, weight=r.weight) for r in request.rubrics
-        ]
-        misconceptions = None
-        if request.misconceptions:
-            misconceptions = [
-                MisconceptionItem(
-                    id=m.id, label=m.label, example_phrases=m.example_phrases
-                )
-                for m in request.misconceptions
-            ]
+        rubrics, misconceptions = _rubric_items(request)
+        cache = get_grading_cache()
+        cache_key = _rubric_cache_keys(
+            question.id, rubrics, misconceptions, [request.user_answer]
+        )[0]
+        evaluation = cache.get(cache_key) if cache_key else None
+        if evaluation is not None:
+            return evaluation
+
+        result = await run_grading(
+            evaluate_with_rubric_and_misconceptions,
+            request.user_answer,
+            rubrics,
+            misconceptions,
+        )
+        evaluation = to_legacy_evaluation_format(result, pass_threshold=60.0)
+        if cache_key:
+            cache.set(cache_key, evaluation)
+        return evaluation
+    except HTTPException:
+        raise
+    except GradingTimeoutError:
+        raise HTTPException(status_code=504, detail="Grading timed out")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-        result = evaluate_with_rubric_and_misconceptions(
-            answer=request.user_answer,
-            rubrics=rubrics,
-            misconceptions=misconceptions,
+@router.post("/evaluate-text-with-rubric/batch")
+async def evaluate_text_with_rubric_batch_endpoint(
+    request: EvaluateTextWithRubricBatchRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    同じ問題・ルーブリックの記述式回答をまとめて採点（クラス全員分など）。
+
+    結果は回答の順で、各要素は /evaluate-text-with-rubric と同じ形。
+    全回答 × 全ルーブリック文・誤概念フレーズの文字 bigram の重複を疎行列積で一度に求め、
+    しきい値に届きうる組だけレーベンシュタイン距離を計算する。
+    """
+    try:
+        question = db.query(Question).filter(Question.id == request.question_id).first()
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+        if question.question_type != "text_input":
+            raise HTTPException(
+                status_code=400,
+                detail="This endpoint is only for text_input questions",
+            )
+
+        rubrics, misconceptions = _rubric_items(request)
+        evaluations = await _cached_rubric_evaluations(
+            question.id,
+            request.user_answers,
+            rubrics,
+            misconceptions,
+            lambda answers: run_grading(evaluate_rubric_batch, answers, rubrics, misconceptions),
         )
-        return to_legacy_evaluation_format(result, pass_threshold=60.0)
+        return {
+            "results": evaluations,
+            "count": len(evaluations),
+        }
     except HTTPException:
         raise
+    except GradingTimeoutError:
+        raise HTTPException(status_code=504, detail="Grading timed out")
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/evaluate-text-with-stored-rubric")
+async def evaluate_text_with_stored_rubric_endpoint(
+    request: EvaluateTextAnswerRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    問題に保存されたルーブリック・誤概念（PUT /questions/{id}/rubric）で記述式を採点。
+
+    返す形は /evaluate-text-with-rubric と同じ。ルーブリックは送らず question_id だけで採点し、
+    ルーブリック文・誤概念フレーズは保存時に計算した特徴量をそのまま使う。
+    """
+    try:
+        question, compiled = _question_with_stored_rubric(db, request.question_id)
+        evaluations = await _cached_rubric_evaluations(
+            question.id,
+            [request.user_answer],
+            compiled.rubrics,
+            compiled.misconceptions,
+            lambda answers: run_grading(evaluate_compiled_batch, answers, compiled),
+        )
+        return evaluations[0]
+    except HTTPException:
+        raise
+    except GradingTimeoutError:
+        raise HTTPException(status_code=504, detail="Grading timed out")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/evaluate-text-with-stored-rubric/batch")
+async def evaluate_text_with_stored_rubric_batch_endpoint(
+    request: EvaluateTextWithStoredRubricBatchRequest,
+    db: Session = Depends(get_db),
+):
+    """保存されたルーブリックでの一括採点（結果は回答の順で、各要素は単体版と同じ形）"""
+    try:
+        question, compiled = _question_with_stored_rubric(db, request.question_id)
+        evaluations = await _cached_rubric_evaluations(
+            question.id,
+            request.user_answers,
+            compiled.rubrics,
+            compiled.misconceptions,
+            lambda answers: run_grading(evaluate_compiled_batch, answers, compiled),
+        )
+        return {
+            "results": evaluations,
+            "count": len(evaluations),
+        }
+    except HTTPException:
+        raise
+    except GradingTimeoutError:
+        raise HTTPException(status_code=504, detail="Grading timed out")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _question_with_stored_rubric(db: Session, question_id: str) -> tuple:
+    """text_input の問題と、保存されたルーブリック・誤概念の CompiledRubric"""
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if question.question_type != "text_input":
+        raise HTTPException(
+            status_code=400,
+            detail="This endpoint is only for text_input questions",
+        )
+    compiled = stored_rubric(question)
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="No rubric stored for this question")
+    return question, compiled
+
+
+async def _cached_rubric_evaluations(
+    question_id: str,
+    user_answers: List[str],
+    rubrics: List[RubricItem],
+    misconceptions: Optional[List[MisconceptionItem]],
+    grade_batch,
+) -> List[dict]:
+    """
+    結果キャッシュを引き、キャッシュにない回答だけ（同じキーは 1 回だけ）grade_batch で採点する
+
+    grade_batch(answers) は EmbeddingGradingResult のリストを返すコルーチン（採点プールでの実行）。
+    """
+    cache = get_grading_cache()
+    keys = _rubric_cache_keys(question_id, rubrics, misconceptions, user_answers)
+    cached = iter(cache.get_many([key for key in keys if key]))
+    evaluations = [next(cached) if key else None for key in keys]
+
+    pending: dict = {}
+    for i, (key, evaluation) in enumerate(zip(keys, evaluations)):
+        if evaluation is None:
+            pending.setdefault(key or f"#{i}", []).append(i)
+    if pending:
+        results = await grade_batch([user_answers[indices[0]] for indices in pending.values()])
+        for (key, indices), result in zip(pending.items(), results):
+            evaluation = to_legacy_evaluation_format(result, pass_threshold=60.0)
+            if not key.startswith("#"):
+                cache.set(key, evaluation)
+            for i in indices:
+                evaluations[i] = evaluation
+    return evaluations
+
+
+def _rubric_cache_keys(
+    question_id: str,
+    rubrics: List[RubricItem],
+    misconceptions: Optional[List[MisconceptionItem]],
+    user_answers: List[str],
+) -> List[Optional[str]]:
+    """ルーブリック採点の結果キャッシュのキー（空の回答はキャッシュしないため None）"""
+    keys = get_grading_cache().keys(
+        "rubric",
+        question_id,
+        rubric_hash(rubrics, misconceptions),
+        [compile_text(answer).text for answer in user_answers],
+    )
+    return [key if answer else None for key, answer in zip(keys, user_answers)]
+
+
+def _rubric_items(request) -> tuple:
+    """リクエストのルーブリック・誤概念を採点サービスの型にする"""
+    rubrics = [
+        RubricItem(id=r.id, text=r.text, weight=r.weight) for r in request.rubrics
+    ]
+    misconceptions = None
+    if request.misconceptions:
+        misconceptions = [
+            MisconceptionItem(
+                id=m.id, label=m.label, example_phrases=m.example_phrases
+            )
+            for m in request.misconceptions
+        ]
+    return rubrics, misconceptions
+
+
 @router.post("/submit", response_model=AnswerResponse)
 async def submit_answer(
     request: SubmitAnswerRequest,
@@ -194,14 +465,26 @@ async def submit_answer(
         db.commit()
         db.refresh(answer)
 
-        # 統計情報を更新
-        stats_updater = StatsUpdater(db)
-        stats_updater.update_on_answer(
-            user_id=request.user_id,
-            question_id=request.question_id,
-            is_correct=request.is_correct,
-            answer_time_sec=request.answer_time_sec
-        )
+        # 統計情報を更新（write-behind 有効時はキューに積むだけ）
+        write_behind = get_stats_write_behind()
+        if write_behind is not None:
+            write_behind.enqueue([
+                AnswerEvent(
+                    user_id=answer.user_id,
+                    question_id=answer.question_id,
+                    is_correct=answer.is_correct,
+                    answer_time_sec=answer.answer_time_sec,
+                    answered_at=answer.answered_at,
+                )
+            ])
+        else:
+            stats_updater = StatsUpdater(db)
+            stats_updater.update_on_answer(
+                user_id=request.user_id,
+                question_id=request.question_id,
+                is_correct=request.is_correct,
+                answer_time_sec=request.answer_time_sec
+            )
 
         return answer
 
@@ -212,6 +495,85 @@ async def submit_answer(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/submit-batch", response_model=SubmitAnswerBatchResponse)
+async def submit_answers_batch(
+    request: SubmitAnswerBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    回答をまとめて提出（クイズ終了時の一括送信用）
+
+    回答は 1 回の bulk INSERT で保存し、統計は (user, question) / (user, category) /
+    question ごとに集約してテーブルごとに 1 回だけ更新する。全体で 1 トランザクション
+    （write-behind 有効時は回答のみコミットし、統計はキュー経由で反映）。
+    """
+    try:
+        items = request.answers
+        user_ids = {item.user_id for item in items}
+        question_ids = {item.question_id for item in items}
+
+        # 既存の回答数をまとめて取得（try_count計算用）
+        previous_counts = {
+            (user_id, question_id): count
+            for user_id, question_id, count in db.query(
+                Answer.user_id, Answer.question_id, func.count(Answer.id)
+            ).filter(
+                Answer.user_id.in_(user_ids),
+                Answer.question_id.in_(question_ids),
+            ).group_by(Answer.user_id, Answer.question_id).all()
+        }
+
+        now = datetime.utcnow()
+        default_session_id = str(uuid.uuid4())
+        rows = []
+        for item in items:
+            key = (item.user_id, item.question_id)
+            previous_counts[key] = previous_counts.get(key, 0) + 1
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "user_id": item.user_id,
+                "question_id": item.question_id,
+                "user_answer": item.user_answer,
+                "is_correct": item.is_correct,
+                "answer_time_sec": item.answer_time_sec,
+                "try_count": previous_counts[key],
+                "session_id": item.session_id or default_session_id,
+                "answered_at": _to_utc_naive(item.answered_at, now),
+            })
+
+        db.execute(insert(Answer), rows)
+
+        events = [
+            AnswerEvent(
+                user_id=row["user_id"],
+                question_id=row["question_id"],
+                is_correct=row["is_correct"],
+                answer_time_sec=row["answer_time_sec"],
+                answered_at=row["answered_at"],
+            )
+            for row in rows
+        ]
+        write_behind = get_stats_write_behind()
+        if write_behind is not None:
+            db.commit()
+            write_behind.enqueue(events)
+        else:
+            stats_updater = StatsUpdater(db)
+            stats_updater.update_on_answers(events, commit=False)
+            db.commit()
+
+        return SubmitAnswerBatchResponse(
+            answers=[AnswerResponse(**row) for row in rows],
+            count=len(rows),
+        )
+
+    except Exception as e:
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/history/{user_id}")
 async def get_answer_history(
     user_id: str,
@@ -253,30 +615,10 @@ async def get_user_stats(
     db: Session = Depends(get_db)
 ):
     """
-    ユーザーの全体統計を取得
+    ユーザーの全体統計を取得（日次集計 user_daily_rollups の合計）
     """
-    from sqlalchemy import func, Integer
-
-    result = db.query(
-        func.count(Answer.id).label("total"),
-        func.sum(func.cast(Answer.is_correct, Integer)).label("correct"),
-        func.avg(Answer.answer_time_sec).label("avg_time")
-    ).filter(Answer.user_id == user_id).first()
-
-    if result.total == 0:
-        return {
-            "total_attempts": 0,
-            "correct_count": 0,
-            "correct_rate": 0.0,
-            "avg_time_sec": 0.0
-        }
-
-    return {
-        "total_attempts": result.total,
-        "correct_count": result.correct,
-        "correct_rate": result.correct / result.total,
-        "avg_time_sec": result.avg_time or 0.0
-    }
+    result = rollup_totals(db, user_id).one()
+    return summarize_totals(result.total, result.correct, result.time_sum)
 
 
 @router.post("/recalculate-stats/{user_id}")
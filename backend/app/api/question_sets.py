@@ -31,6 +31,7 @@ from ..models.user import SellerApplicationStatus
 from ..services.copyright_checker import get_copyright_checker
 from ..services.llm_router import AllLLMProvidersFailed
 from ..services.question_set_pdf import build_question_set_pdf_bytes
+from ..services.tfidf_grading import get_tfidf_model_cache
 from ..utils.csv_injection import sanitize_csv_cell
 
 logger = logging.getLogger(__name__)
@@ -511,6 +512,8 @@ async def update_question_set(
 
     db.commit()
     db.refresh(question_set)
+    # 教科書本文が変わると TF-IDF の採点モデルを作り直す
+    get_tfidf_model_cache().invalidate(question_set.id)
 
     return question_set
 
@@ -4,7 +4,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
 import csv
@@ -16,8 +16,11 @@ from pathlib import Path
 from ..core.database import get_db
 from ..core.auth import get_current_active_user
 from ..core.config import settings
-from ..models import User, Question, QuestionSet, Answer
+from ..models import User, Question, QuestionSet, Answer, QuestionRubricItem, QuestionMisconception
 from ..utils.csv_injection import sanitize_csv_cell
+from ..services.grading_cache import get_grading_cache
+from ..services.question_rubrics import apply_misconception_features, apply_rubric_item_features
+from ..services.tfidf_grading import get_tfidf_model_cache
 
 _CSV_ALLOWED_MEDIA = frozenset({"text/csv", "application/csv", "text/plain"})
 
@@ -382,6 +385,9 @@ async def update_question(
 
     db.commit()
     db.refresh(question)
+    # 問題文・正解などが変わるとキャッシュ済みの記述式採点結果は使えない
+    get_grading_cache().invalidate_questions([question.id])
+    get_tfidf_model_cache().invalidate(question.question_set_id)
 
     return question
 
@@ -424,6 +430,8 @@ async def delete_question(
 
     db.delete(question)
     db.commit()
+    get_grading_cache().invalidate_questions([question_id])
+    get_tfidf_model_cache().invalidate(question_set.id)
 
     return None
 
@@ -962,3 +970,267 @@ async def delete_media(
     db.commit()
 
     return {"message": "Media deleted", "media_urls": question.media_urls}
+
+
+# ── 記述式の採点ルーブリック・誤概念 ─────────────────────────────
+# 保存時に採点用の特徴量（正規化済みテキスト・文字 bigram）を計算しておき、
+# /answers/evaluate-text-with-stored-rubric は question_id だけで採点する。
+
+# 1 問あたりのルーブリック項目・誤概念の上限
+MAX_RUBRIC_ITEMS = 50
+MAX_MISCONCEPTIONS = 50
+
+
+class RubricItemCreate(BaseModel):
+    text: str = Field(..., min_length=1)
+    weight: float = Field(1.0, gt=0)
+
+
+class RubricItemUpdate(BaseModel):
+    text: Optional[str] = Field(None, min_length=1)
+    weight: Optional[float] = Field(None, gt=0)
+    position: Optional[int] = None
+
+
+class RubricItemResponse(BaseModel):
+    id: str
+    text: str
+    weight: float
+    position: int
+
+    class Config:
+        from_attributes = True
+
+
+class MisconceptionCreate(BaseModel):
+    label: str = Field(..., min_length=1)
+    example_phrases: List[str]
+
+
+class MisconceptionUpdate(BaseModel):
+    label: Optional[str] = Field(None, min_length=1)
+    example_phrases: Optional[List[str]] = None
+    position: Optional[int] = None
+
+
+class MisconceptionResponse(BaseModel):
+    id: str
+    label: str
+    example_phrases: List[str]
+    position: int
+
+    class Config:
+        from_attributes = True
+
+
+class QuestionRubricReplace(BaseModel):
+    rubrics: List[RubricItemCreate] = Field(default_factory=list, max_length=MAX_RUBRIC_ITEMS)
+    misconceptions: List[MisconceptionCreate] = Field(default_factory=list, max_length=MAX_MISCONCEPTIONS)
+
+
+class QuestionRubricResponse(BaseModel):
+    question_id: str
+    rubrics: List[RubricItemResponse]
+    misconceptions: List[MisconceptionResponse]
+
+
+def _get_own_question(db: Session, question_id: str, current_user: User) -> Question:
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    question_set = db.query(QuestionSet).filter(QuestionSet.id == question.question_set_id).first()
+    if not question_set or question_set.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return question
+
+
+def _new_rubric_item(question_id: str, position: int, item: RubricItemCreate) -> QuestionRubricItem:
+    row = QuestionRubricItem(
+        id=str(uuid.uuid4()),
+        question_id=question_id,
+        position=position,
+        text=item.text,
+        weight=item.weight,
+    )
+    apply_rubric_item_features(row)
+    return row
+
+
+def _new_misconception(question_id: str, position: int, item: MisconceptionCreate) -> QuestionMisconception:
+    row = QuestionMisconception(
+        id=str(uuid.uuid4()),
+        question_id=question_id,
+        position=position,
+        label=item.label,
+        example_phrases=list(item.example_phrases),
+    )
+    apply_misconception_features(row)
+    return row
+
+
+def _rubric_response(question: Question) -> QuestionRubricResponse:
+    return QuestionRubricResponse(
+        question_id=question.id,
+        rubrics=[RubricItemResponse.model_validate(r) for r in question.rubric_items],
+        misconceptions=[MisconceptionResponse.model_validate(m) for m in question.misconceptions],
+    )
+
+
+def _next_position(rows) -> int:
+    return max((r.position for r in rows), default=-1) + 1
+
+
+@router.get("/{question_id}/rubric", response_model=QuestionRubricResponse)
+async def get_question_rubric(
+    question_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """問題に保存された採点ルーブリックと誤概念（問題集の作成者のみ）"""
+    return _rubric_response(_get_own_question(db, question_id, current_user))
+
+
+@router.put("/{question_id}/rubric", response_model=QuestionRubricResponse)
+async def replace_question_rubric(
+    question_id: str,
+    request: QuestionRubricReplace,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """採点ルーブリックと誤概念をまとめて置き換える（リストの順が position になる）"""
+    question = _get_own_question(db, question_id, current_user)
+    question.rubric_items = [
+        _new_rubric_item(question.id, i, item) for i, item in enumerate(request.rubrics)
+    ]
+    question.misconceptions = [
+        _new_misconception(question.id, i, item) for i, item in enumerate(request.misconceptions)
+    ]
+    db.commit()
+    db.refresh(question)
+    return _rubric_response(question)
+
+
+@router.post(
+    "/{question_id}/rubric/items",
+    response_model=RubricItemResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_rubric_item(
+    question_id: str,
+    request: RubricItemCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """ルーブリック項目を末尾に追加する"""
+    question = _get_own_question(db, question_id, current_user)
+    if len(question.rubric_items) >= MAX_RUBRIC_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many rubric items (max {MAX_RUBRIC_ITEMS})")
+    row = _new_rubric_item(question.id, _next_position(question.rubric_items), request)
+    question.rubric_items.append(row)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+@router.put("/{question_id}/rubric/items/{item_id}", response_model=RubricItemResponse)
+async def update_rubric_item(
+    question_id: str,
+    item_id: str,
+    request: RubricItemUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """ルーブリック項目を更新する（text が変わったら特徴量も計算し直す）"""
+    question = _get_own_question(db, question_id, current_user)
+    row = next((r for r in question.rubric_items if r.id == item_id), None)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Rubric item not found")
+    if request.text is not None:
+        row.text = request.text
+        apply_rubric_item_features(row)
+    if request.weight is not None:
+        row.weight = request.weight
+    if request.position is not None:
+        row.position = request.position
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+@router.delete("/{question_id}/rubric/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_rubric_item(
+    question_id: str,
+    item_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    question = _get_own_question(db, question_id, current_user)
+    row = next((r for r in question.rubric_items if r.id == item_id), None)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Rubric item not found")
+    question.rubric_items.remove(row)
+    db.commit()
+    return None
+
+
+@router.post(
+    "/{question_id}/misconceptions",
+    response_model=MisconceptionResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_misconception(
+    question_id: str,
+    request: MisconceptionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """誤概念を末尾に追加する"""
+    question = _get_own_question(db, question_id, current_user)
+    if len(question.misconceptions) >= MAX_MISCONCEPTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many misconceptions (max {MAX_MISCONCEPTIONS})")
+    row = _new_misconception(question.id, _next_position(question.misconceptions), request)
+    question.misconceptions.append(row)
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+@router.put("/{question_id}/misconceptions/{misconception_id}", response_model=MisconceptionResponse)
+async def update_misconception(
+    question_id: str,
+    misconception_id: str,
+    request: MisconceptionUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """誤概念を更新する（example_phrases が変わったら特徴量も計算し直す）"""
+    question = _get_own_question(db, question_id, current_user)
+    row = next((m for m in question.misconceptions if m.id == misconception_id), None)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Misconception not found")
+    if request.label is not None:
+        row.label = request.label
+    if request.example_phrases is not None:
+        row.example_phrases = list(request.example_phrases)
+        apply_misconception_features(row)
+    if request.position is not None:
+        row.position = request.position
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+@router.delete("/{question_id}/misconceptions/{misconception_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_misconception(
+    question_id: str,
+    misconception_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    question = _get_own_question(db, question_id, current_user)
+    row = next((m for m in question.misconceptions if m.id == misconception_id), None)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Misconception not found")
+    question.misconceptions.remove(row)
+    db.commit()
+    return None
@@ -0,0 +1,160 @@
+"""
+間隔反復（SRS）API
+回答ごとに StatsUpdater が更新する user_srs_state から、今復習すべき問題を返す
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from ..core.auth import get_current_active_user
+from ..core.database import get_db
+from ..models import Question, QuestionSet, User, UserSrsState
+from ..ai.srs import SrsState, retention
+
+router = APIRouter()
+
+MAX_IMPORT_STATES = 5000
+
+
+class SrsStateResponse(BaseModel):
+    question_id: str
+    question_set_id: str
+    ease_factor: float
+    interval_days: int
+    repetitions: int
+    stability: float
+    next_review_at: datetime
+    last_review_at: Optional[datetime]
+    retention: float
+
+
+class SrsImportState(BaseModel):
+    """frontend の srsService.ts（AsyncStorage）の SRSState と同じ形"""
+    easeFactor: float = Field(..., ge=1.3)
+    interval: int = Field(..., ge=0)
+    repetitions: int = Field(..., ge=0)
+    nextReviewDate: datetime
+    lastReviewDate: datetime
+    stability: float = Field(1.0, ge=0)
+
+
+class SrsImportRequest(BaseModel):
+    question_set_id: str
+    states: Dict[str, SrsImportState] = Field(..., max_length=MAX_IMPORT_STATES)
+
+
+class SrsImportResponse(BaseModel):
+    imported: int
+    skipped: int
+
+
+def _to_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/due", response_model=List[SrsStateResponse])
+async def get_due_reviews(
+    limit: int = Query(50, ge=1, le=500),
+    question_set_id: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    復習期限が来ている問題を期限の古い順に取得
+
+    (user_id, next_review_at) インデックスの範囲スキャンで limit 件だけ読む
+    （問題集指定時は (user_id, question_set_id, next_review_at)）。
+    """
+    now = datetime.utcnow()
+    query = db.query(UserSrsState).filter(
+        UserSrsState.user_id == current_user.id,
+        UserSrsState.next_review_at <= now,
+    )
+    if question_set_id:
+        query = query.filter(UserSrsState.question_set_id == question_set_id)
+    rows = query.order_by(UserSrsState.next_review_at).limit(limit).all()
+
+    return [
+        SrsStateResponse(
+            question_id=row.question_id,
+            question_set_id=row.question_set_id,
+            ease_factor=row.ease_factor,
+            interval_days=row.interval_days,
+            repetitions=row.repetitions,
+            stability=row.stability,
+            next_review_at=row.next_review_at,
+            last_review_at=row.last_review_at,
+            retention=retention(
+                SrsState(stability=row.stability, last_review_at=row.last_review_at), now
+            ),
+        )
+        for row in rows
+    ]
+
+
+@router.post("/import", response_model=SrsImportResponse)
+async def import_srs_states(
+    request: SrsImportRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    端末に保存していた SRS マップ（{question_id: SRSState}）をまとめて取り込む
+
+    問題集に存在しない問題は無視する。サーバー側の方が新しく復習済みの問題は上書きしない。
+    """
+    if not db.query(QuestionSet.id).filter(QuestionSet.id == request.question_set_id).first():
+        raise HTTPException(status_code=404, detail="Question set not found")
+
+    try:
+        valid_ids = {
+            qid for (qid,) in db.query(Question.id).filter(
+                Question.question_set_id == request.question_set_id,
+                Question.id.in_(list(request.states)),
+            )
+        }
+        existing = {
+            row.question_id: row
+            for row in db.query(UserSrsState).filter(
+                UserSrsState.user_id == current_user.id,
+                UserSrsState.question_id.in_(list(valid_ids)),
+            )
+        }
+
+        imported = 0
+        now = datetime.utcnow()
+        for question_id, state in request.states.items():
+            if question_id not in valid_ids:
+                continue
+            last_review_at = _to_utc_naive(state.lastReviewDate)
+            row = existing.get(question_id)
+            if row is not None and row.last_review_at is not None and row.last_review_at >= last_review_at:
+                continue
+            if row is None:
+                row = UserSrsState(
+                    user_id=current_user.id,
+                    question_id=question_id,
+                    question_set_id=request.question_set_id,
+                )
+                db.add(row)
+            row.ease_factor = state.easeFactor
+            row.interval_days = state.interval
+            row.repetitions = state.repetitions
+            row.stability = max(1.0, state.stability)
+            row.next_review_at = _to_utc_naive(state.nextReviewDate)
+            row.last_review_at = last_review_at
+            row.updated_at = now
+            imported += 1
+
+        db.commit()
+        return SrsImportResponse(imported=imported, skipped=len(request.states) - imported)
+    except Exception as e:
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
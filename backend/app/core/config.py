@@ -63,6 +63,40 @@ class Settings(BaseSettings):
     OAUTH_FAIL_WINDOW_SEC: int = 900  # 15 分
     OAUTH_BLOCK_DURATION_SEC: int = 900
 
+    # 回答統計の write-behind。True のとき submit は回答の INSERT のみ行い、統計の増分は
+    # キュー（REDIS_URL 設定時は Redis、未設定時はプロセス内）に積んでバックグラウンドで集約反映する
+    STATS_WRITE_BEHIND: bool = False
+    STATS_FLUSH_INTERVAL_SEC: float = 2.0
+    STATS_FLUSH_MAX_PENDING: int = 500  # この件数を超えたら間隔を待たずに flush
+    # 問題の全体統計（questions.total_attempts 等）のシャード数。0 で無効（questions 行を直接加算）。
+    # 有効時は question_stat_shards のランダムな 1 行に加算し、定期ロールアップで questions に畳み込む
+    QUESTION_STAT_SHARDS: int = 0
+    QUESTION_STAT_ROLLUP_INTERVAL_SEC: float = 30.0
+    # 類似ユーザー検索に使う問題集ごとのユーザー×カテゴリ行列の再構築間隔（秒）
+    RECOMMENDER_MATRIX_TTL_SEC: float = 300.0
+    # コールドスタート推薦用の学習者クラスタ（k-means）と誤答数テーブルの再集計間隔（秒）。0 で定期再集計しない
+    COLD_START_REFRESH_INTERVAL_SEC: float = 3600.0
+    COLD_START_CLUSTERS: int = 8
+    # 推薦結果キャッシュ（プロセス内 LRU の件数。0 で無効。REDIS_URL 設定時は Redis にも保持）
+    RECOMMENDATION_CACHE_SIZE: int = 2048
+    RECOMMENDATION_CACHE_TTL_SEC: float = 300.0
+    # 推薦の難易度マッチングとスコア予測に Elo レーティング（学習者・問題）を使う。False で正答率ベース
+    USE_ELO_RATINGS: bool = False
+    # 記述式採点で正規化・特徴量化したルーブリック（CompiledRubric）を保持する LRU の件数
+    COMPILED_RUBRIC_CACHE_SIZE: int = 512
+    # 記述式採点を実行するプロセスプールのワーカー数（0 でプロセスを使わずスレッドで実行）と
+    # 1 ジョブのタイムアウト（秒、0 で無制限）
+    GRADING_POOL_WORKERS: int = 0
+    GRADING_TIMEOUT_SEC: float = 10.0
+    # 記述式採点結果のキャッシュ件数（問題・正解・正規化済み回答ごと、0 で無効）と Redis 上の保持秒数
+    GRADING_CACHE_SIZE: int = 10000
+    GRADING_CACHE_TTL_SEC: float = 86400.0
+    # 表層の採点で不正解の記述式回答を、問題集ごとの文字 n-gram TF-IDF の余弦類似度で再判定する（しきい値以上で正解）
+    TFIDF_GRADING_ENABLED: bool = False
+    TFIDF_GRADING_THRESHOLD: float = 0.5
+    # TF-IDF モデルを保持する問題集の数
+    TFIDF_MODEL_CACHE_SIZE: int = 64
+
     # 問題 CSV 一括アップロード上限（バイト）
     BULK_CSV_MAX_BYTES: int = 5_242_880  # 5 MiB
 
@@ -47,7 +47,25 @@ async def lifespan(app: FastAPI):
             )
     except Exception:
         _logger.exception("Failed to verify AI / LLM routes in OpenAPI")
-    yield
+
+    from .core.database import SessionLocal
+    from .ai.stats_write_behind import start_stats_write_behind, stop_stats_write_behind
+    from .ai.question_stat_rollup import start_question_stat_rollup, stop_question_stat_rollup
+    from .ai.cold_start import start_learner_cluster_refresher, stop_learner_cluster_refresher
+    from .services.grading_pool import start_grading_pool, stop_grading_pool
+
+    start_stats_write_behind(SessionLocal)
+    start_question_stat_rollup(SessionLocal)
+    start_learner_cluster_refresher(SessionLocal)
+    start_grading_pool()
+    try:
+        yield
+    finally:
+        # 未反映の統計増分をシャットダウン前に書き切る（write-behind → シャードの順）
+        stop_stats_write_behind()
+        stop_question_stat_rollup()
+        stop_learner_cluster_refresher()
+        stop_grading_pool()
 
 
 app = FastAPI(
@@ -141,7 +159,7 @@ async def health():
 
 # APIルーターを追加
 from .api.contact import router as contact_router
-from .api import ai_router, answers_router, auth_router, feedback_router, question_sets_router, questions_router, payments_router, admin_router, two_factor_router, translate_router, textbooks_router, reports_router, subscriptions_router
+from .api import ai_router, answers_router, auth_router, feedback_router, question_sets_router, questions_router, payments_router, admin_router, two_factor_router, translate_router, textbooks_router, reports_router, subscriptions_router, srs_router
 from .api.ai_llm import router as ai_llm_router
 from .api.question_sets_render_pdf import router as question_sets_render_pdf_router
 
@@ -159,6 +177,7 @@ app.include_router(translate_router, prefix=f"{settings.API_V1_STR}/translate",
 app.include_router(textbooks_router, prefix=f"{settings.API_V1_STR}/textbooks", tags=["textbooks"])
 app.include_router(reports_router, prefix=f"{settings.API_V1_STR}/reports", tags=["reports"])
 app.include_router(subscriptions_router, prefix=f"{settings.API_V1_STR}/subscriptions", tags=["subscriptions"])
+app.include_router(srs_router, prefix=f"{settings.API_V1_STR}/srs", tags=["srs"])
 app.include_router(feedback_router, prefix=f"{settings.API_V1_STR}/feedback", tags=["feedback"])
 app.include_router(contact_router, prefix=f"{settings.API_V1_STR}/contact", tags=["contact"])
 
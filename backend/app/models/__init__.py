@@ -1,19 +1,27 @@
 from .user import User
-from .question import QuestionSet, Question
-from .answer import Answer, UserQuestionStats, UserCategoryStats
+from .question import QuestionSet, Question, QuestionRubricItem, QuestionMisconception, QuestionStatShard
+from .answer import Answer, UserQuestionStats, UserCategoryStats, UserRating, UserSrsState, UserIrtAbility, UserDailyRollup
 from .marketplace import Purchase, Review
 from .otp import OTPCode
 from .copyright_check import CopyrightCheckRecord, RiskLevel
 from .report import ContentReport, ReportReason, ReportStatus
 from .processed_checkout import ProcessedCheckoutSession
+from .recommendation import LearnerClusterModel, ClusterQuestionMiss
 
 __all__ = [
     "User",
     "QuestionSet",
     "Question",
+    "QuestionRubricItem",
+    "QuestionMisconception",
+    "QuestionStatShard",
     "Answer",
     "UserQuestionStats",
     "UserCategoryStats",
+    "UserRating",
+    "UserSrsState",
+    "UserIrtAbility",
+    "UserDailyRollup",
     "Purchase",
     "Review",
     "OTPCode",
@@ -23,4 +31,6 @@ __all__ = [
     "ReportReason",
     "ReportStatus",
     "ProcessedCheckoutSession",
+    "LearnerClusterModel",
+    "ClusterQuestionMiss",
 ]
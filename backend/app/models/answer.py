@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, Boolean, Index, UniqueConstraint
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, Date, DateTime, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..core.database import Base
@@ -9,7 +9,14 @@ class Answer(Base):
     __tablename__ = "answers"
     __table_args__ = (
         Index("ix_answers_user_question", "user_id", "question_id"),
-        Index("ix_answers_user_answered_at", "user_id", "answered_at"),
+        # 新しい順の走査（予想スコアの最近 N 問など）を問題集の絞り込み・集計列ごと索引だけで済ませる
+        # （B-tree は逆順にも走査できるため DESC 指定は不要）
+        Index(
+            "ix_answers_user_answered_at_covering",
+            "user_id",
+            "answered_at",
+            postgresql_include=["question_id", "is_correct", "answer_time_sec"],
+        ),
     )
 
     id = Column(String, primary_key=True, index=True)
@@ -74,5 +81,71 @@ class UserCategoryStats(Base):
     correct_rate = Column(Float, default=0.0)
     speed_score = Column(Float, default=0.0)
     weakness_score = Column(Float, default=0.0)  # 高いほど苦手
+    rating = Column(Float, default=1500.0)  # カテゴリ別 Elo レーティング
 
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserRating(Base):
+    """ユーザーの全体 Elo レーティング（回答ごとに StatsUpdater が更新）"""
+    __tablename__ = "user_ratings"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rating = Column(Float, nullable=False, default=1500.0)
+    rating_count = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserDailyRollup(Base):
+    """ユーザー×日（UTC）×問題集×カテゴリの回答集計（回答ごとに StatsUpdater が加算）"""
+    __tablename__ = "user_daily_rollups"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    question_set_id = Column(String, ForeignKey("question_sets.id", ondelete="CASCADE"), primary_key=True)
+    category = Column(String, primary_key=True, default="")  # カテゴリ未設定は空文字
+
+    attempts = Column(Integer, nullable=False, default=0)
+    correct_count = Column(Integer, nullable=False, default=0)
+    time_sum = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserSrsState(Base):
+    """ユーザーごと・問題ごとの間隔反復（SM-2）スケジュール"""
+    __tablename__ = "user_srs_state"
+    __table_args__ = (
+        # 「今復習すべき問題」を next_review_at の範囲スキャンで取る
+        Index("ix_user_srs_state_user_next_review", "user_id", "next_review_at"),
+        Index("ix_user_srs_state_user_set_next_review", "user_id", "question_set_id", "next_review_at"),
+    )
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    question_set_id = Column(String, ForeignKey("question_sets.id", ondelete="CASCADE"), nullable=False)
+
+    ease_factor = Column(Float, nullable=False, default=2.5)
+    interval_days = Column(Integer, nullable=False, default=0)
+    repetitions = Column(Integer, nullable=False, default=0)
+    stability = Column(Float, nullable=False, default=1.0)
+    next_review_at = Column(DateTime, nullable=False)
+    last_review_at = Column(DateTime)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserIrtAbility(Base):
+    """問題集ごとの学習者能力 θ（IRT 2PL のオフライン較正で更新）"""
+    __tablename__ = "user_irt_abilities"
+    __table_args__ = (
+        Index("ix_user_irt_abilities_question_set", "question_set_id"),
+    )
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    question_set_id = Column(String, ForeignKey("question_sets.id", ondelete="CASCADE"), primary_key=True)
+    ability = Column(Float, nullable=False)
+    answer_count = Column(Integer, nullable=False, default=0)
+
+    calibrated_at = Column(DateTime, default=datetime.utcnow)
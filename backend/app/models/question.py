@@ -89,6 +89,10 @@ class Question(Base):
     total_attempts = Column(Integer, default=0)
     correct_count = Column(Integer, default=0)
     average_time_sec = Column(Float, default=0.0)
+    rating = Column(Float, default=1500.0)  # Elo レーティング（高いほど難しい）
+    # IRT（2PL）の較正値（オフラインバッチで更新。未較正は NULL）
+    irt_discrimination = Column(Float, nullable=True)
+    irt_difficulty = Column(Float, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -96,3 +100,76 @@ class Question(Base):
     # リレーション
     question_set = relationship("QuestionSet", back_populates="questions")
     answers = relationship("Answer", back_populates="question")
+    rubric_items = relationship(
+        "QuestionRubricItem",
+        order_by="QuestionRubricItem.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    misconceptions = relationship(
+        "QuestionMisconception",
+        order_by="QuestionMisconception.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class QuestionRubricItem(Base):
+    """記述式問題の採点ルーブリック 1 項目
+
+    採点用の特徴量（正規化済みテキストと文字 bigram の指紋）を保存時に計算して持ち、
+    採点のたびにルーブリック文を正規化し直さない。features_version が現行と違う行は読み込み時に計算し直す。
+    """
+    __tablename__ = "question_rubric_items"
+
+    id = Column(String, primary_key=True)
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+    text = Column(Text, nullable=False)
+    weight = Column(Float, nullable=False, default=1.0)
+
+    # 採点用の特徴量
+    normalized_text = Column(Text, nullable=False, default="")
+    fingerprint = Column(JSON, nullable=False, default=list)  # 文字 bigram（ソート済み）
+    features_version = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class QuestionMisconception(Base):
+    """記述式問題のよくある誤概念（代表フレーズで照合する）と、フレーズごとの採点用特徴量"""
+    __tablename__ = "question_misconceptions"
+
+    id = Column(String, primary_key=True)
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+    label = Column(String, nullable=False)
+    example_phrases = Column(JSON, nullable=False, default=list)
+
+    # 採点用の特徴量（example_phrases と同じ順）
+    normalized_phrases = Column(JSON, nullable=False, default=list)
+    phrase_fingerprints = Column(JSON, nullable=False, default=list)
+    features_version = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class QuestionStatShard(Base):
+    """問題の全体統計の未集約の増分（シャードカウンタ）
+
+    人気問題の questions 行に全ユーザーの更新が集中しないよう、回答ごとの増分は
+    ランダムに選んだシャード行に加算し、定期ロールアップで questions に畳み込んで削除する。
+    """
+    __tablename__ = "question_stat_shards"
+
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    correct_count = Column(Integer, nullable=False, default=0)
+    time_sum = Column(Float, nullable=False, default=0.0)
+    rating_delta = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, JSON
+from datetime import datetime
+from ..core.database import Base
+
+
+class LearnerClusterModel(Base):
+    """問題集ごとの学習者クラスタ（カテゴリ別正答率ベクトルの k-means 重心）"""
+    __tablename__ = "learner_cluster_models"
+
+    question_set_id = Column(String, ForeignKey("question_sets.id", ondelete="CASCADE"), primary_key=True)
+    categories = Column(JSON, nullable=False)  # 重心ベクトルの次元に対応するカテゴリ名
+    centroids = Column(JSON, nullable=False)  # [[rate, ...], ...]（クラスタ数 × カテゴリ数）
+    learner_count = Column(Integer, default=0)
+
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ClusterQuestionMiss(Base):
+    """クラスタごとの問題別誤答数（コールドスタート推薦用、定期再集計）"""
+    __tablename__ = "cluster_question_misses"
+
+    question_set_id = Column(String, ForeignKey("question_sets.id", ondelete="CASCADE"), primary_key=True)
+    cluster = Column(Integer, primary_key=True)
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+
+    wrong_count = Column(Integer, nullable=False, default=0)
@@ -4,59 +4,47 @@ AI回答評価サービス
 外部ライブラリ不使用 ── 標準的な文字列操作のみで実装
 """
 import re
-import unicodedata
+from functools import lru_cache
 from typing import Optional
 
+from .grading_pool import run_grading
+from .string_distance import levenshtein, levenshtein_within, max_distance_for
+from .text_normalizer import (  # noqa: F401 （正規化関数は従来どおりここからも使える）
+    TextForms,
+    katakana_to_hiragana,
+    normalize_numbers,
+    normalize_text,
+    remove_punctuation,
+    text_forms,
+)
 
-def normalize_text(text: str) -> str:
-    """テキストを正規化（全角半角、大文字小文字、空白など）"""
-    text = unicodedata.normalize('NFKC', text)
-    text = text.strip()
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    return text
+# 正解パターンの正規化形を保持する件数（正解文字列ごと。ワーカープロセスごとに持つ）
+_PATTERN_FORMS_CACHE_SIZE = 4096
 
 
 def levenshtein_distance(s1: str, s2: str) -> int:
-    """レーベンシュタイン距離を計算（DP）"""
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-
-    if len(s2) == 0:
-        return len(s1)
-
-    prev_row = list(range(len(s2) + 1))
-    for i, c1 in enumerate(s1):
-        curr_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            cost = 0 if c1 == c2 else 1
-            curr_row.append(min(
-                curr_row[j] + 1,       # insertion
-                prev_row[j + 1] + 1,   # deletion
-                prev_row[j] + cost,    # substitution
-            ))
-        prev_row = curr_row
-
-    return prev_row[-1]
-
-
-def calculate_similarity(s1: str, s2: str) -> float:
-    """2つの文字列のレーベンシュタイン距離ベースの類似度 (0.0–1.0)"""
+    """レーベンシュタイン距離を計算（ビット並列。string_distance.levenshtein）"""
+    return levenshtein(s1, s2)
+
+
+def calculate_similarity(s1: str, s2: str, min_similarity: float = 0.0) -> float:
+    """
+    2つの文字列のレーベンシュタイン距離ベースの類似度 (0.0–1.0)
+
+    min_similarity を渡すと、それに届かない場合は距離計算を途中で打ち切り 0.0 を返す。
+    """
     longer = max(len(s1), len(s2))
     if longer == 0:
         return 1.0
-    dist = levenshtein_distance(s1, s2)
+    if min_similarity <= 0.0:
+        dist = levenshtein(s1, s2)
+    else:
+        dist = levenshtein_within(s1, s2, max_distance_for(longer, min_similarity))
+        if dist is None:
+            return 0.0
     return (longer - dist) / longer
 
 
-def remove_punctuation(text: str) -> str:
-    """日本語・英語の句読点や記号を削除"""
-    return re.sub(
-        r'[、。，．,!！?？;；:：\'\"\'\'""（）()\[\]【】『』「」\-\s]',
-        '', text,
-    )
-
-
 def extract_numbers(text: str) -> list[str]:
     """テキストから数値（整数・小数）を抽出"""
     return re.findall(r'-?\d+\.?\d*', text)
@@ -64,8 +52,12 @@ def extract_numbers(text: str) -> list[str]:
 
 def numbers_match(correct: str, user: str) -> tuple[bool, float]:
     """数値が含まれる回答の数値一致を確認"""
-    cn = extract_numbers(correct)
-    un = extract_numbers(user)
+    return _numbers_match(text_forms(correct), text_forms(user))
+
+
+def _numbers_match(c: TextForms, u: TextForms) -> tuple[bool, float]:
+    cn = c.numbers
+    un = u.numbers
     if not cn:
         return False, 0.0
     if cn == un:
@@ -73,69 +65,28 @@ def numbers_match(correct: str, user: str) -> tuple[bool, float]:
     return False, 0.0
 
 
-_NUMBER_CONVERSIONS: dict[str, list[str]] = {
-    '0': ['〇', 'ゼロ', 'ぜろ', '零', 'れい'],
-    '1': ['一', 'いち', 'ひとつ', '1つ'],
-    '2': ['二', 'に', 'ふたつ', '2つ'],
-    '3': ['三', 'さん', 'みっつ', '3つ'],
-    '4': ['四', 'よん', 'し', 'よっつ', '4つ'],
-    '5': ['五', 'ご', 'いつつ', '5つ'],
-    '6': ['六', 'ろく', 'むっつ', '6つ'],
-    '7': ['七', 'なな', 'しち', 'ななつ', '7つ'],
-    '8': ['八', 'はち', 'やっつ', '8つ'],
-    '9': ['九', 'きゅう', 'く', 'ここのつ', '9つ'],
-    '10': ['十', 'じゅう', 'とお'],
-}
-
-
-def normalize_numbers(text: str) -> str:
-    """数字表現を統一（全角→半角、漢数字→アラビア数字）"""
-    normalized = re.sub(
-        r'[０-９]',
-        lambda m: chr(ord(m.group()) - 0xFEE0),
-        text,
-    )
-    for digit, variants in _NUMBER_CONVERSIONS.items():
-        for v in variants:
-            normalized = normalized.replace(v, digit)
-    return normalized
-
-
-def katakana_to_hiragana(text: str) -> str:
-    """カタカナをひらがなに変換"""
-    return re.sub(
-        r'[\u30A1-\u30F6]',
-        lambda m: chr(ord(m.group()) - 0x60),
-        text,
-    )
-
-
 def reading_match(correct: str, user: str) -> tuple[bool, float]:
     """カタカナ⇔ひらがなの読み一致チェック"""
-    c_hira = katakana_to_hiragana(normalize_text(correct))
-    u_hira = katakana_to_hiragana(normalize_text(user))
+    return _reading_match(text_forms(correct), text_forms(user))
 
-    if c_hira == u_hira:
+
+def _reading_match(c: TextForms, u: TextForms) -> tuple[bool, float]:
+    if c.hiragana == u.hiragana:
         return True, 0.97
 
-    clean_c = remove_punctuation(c_hira)
-    clean_u = remove_punctuation(u_hira)
+    clean_c = c.clean_hiragana
+    clean_u = u.clean_hiragana
     if clean_c == clean_u:
         return True, 0.96
 
-    has_kanji = lambda s: bool(re.search(r'[\u4E00-\u9FFF]', s))
-    is_only_kana = lambda s: bool(re.fullmatch(r'[\u3040-\u309F\u30A0-\u30FF\s]+', s))
-
-    if has_kanji(correct) and is_only_kana(user):
-        kanji_count = len(re.findall(r'[\u4E00-\u9FFF]', correct))
+    if c.kanji_count and u.only_kana:
         kana_count = len(clean_u)
-        if kanji_count * 1.5 <= kana_count <= kanji_count * 5:
+        if c.kanji_count * 1.5 <= kana_count <= c.kanji_count * 5:
             return True, 0.85
 
-    if is_only_kana(correct) and has_kanji(user):
-        kanji_count = len(re.findall(r'[\u4E00-\u9FFF]', user))
+    if c.only_kana and u.kanji_count:
         kana_count = len(clean_c)
-        if kanji_count * 1.5 <= kana_count <= kanji_count * 5:
+        if u.kanji_count * 1.5 <= kana_count <= u.kanji_count * 5:
             return True, 0.85
 
     return False, 0.0
@@ -143,8 +94,12 @@ def reading_match(correct: str, user: str) -> tuple[bool, float]:
 
 def contains_match(correct: str, user: str) -> tuple[bool, float]:
     """一方が他方を含んでいるかチェック"""
-    clean_c = remove_punctuation(normalize_text(correct))
-    clean_u = remove_punctuation(normalize_text(user))
+    return _contains_match(text_forms(correct), text_forms(user))
+
+
+def _contains_match(c: TextForms, u: TextForms) -> tuple[bool, float]:
+    clean_c = c.clean
+    clean_u = u.clean
     if not clean_c or not clean_u:
         return False, 0.0
 
@@ -158,12 +113,14 @@ def contains_match(correct: str, user: str) -> tuple[bool, float]:
 
 def word_overlap_match(correct: str, user: str) -> tuple[bool, float]:
     """単語レベルの一致（英語等スペース区切り向け）"""
-    cw = [w for w in normalize_text(correct).split() if w]
-    uw = [w for w in normalize_text(user).split() if w]
-    if not cw or not uw:
+    return _word_overlap_match(text_forms(correct), text_forms(user))
+
+
+def _word_overlap_match(c: TextForms, u: TextForms) -> tuple[bool, float]:
+    cs, us = c.words, u.words
+    if not cs or not us:
         return False, 0.0
 
-    cs, us = set(cw), set(uw)
     inter = cs & us
     precision = len(inter) / len(us)
     recall = len(inter) / len(cs)
@@ -181,39 +138,40 @@ def evaluate_semantic_similarity(
     user_answer: str,
 ) -> tuple[bool, float, str]:
     """独自ルールで意味的類似度を評価"""
-    norm_c = normalize_text(correct_answer)
-    norm_u = normalize_text(user_answer)
+    return _evaluate_forms(text_forms(correct_answer), text_forms(user_answer))
 
-    if norm_c == norm_u:
+
+def _evaluate_forms(c: TextForms, u: TextForms) -> tuple[bool, float, str]:
+    """正規化形どうしで evaluate_semantic_similarity の判定を行う"""
+    if c.norm == u.norm:
         return True, 1.0, "完全一致！正解です。"
 
-    clean_c = remove_punctuation(norm_c)
-    clean_u = remove_punctuation(norm_u)
+    clean_c = c.clean
+    clean_u = u.clean
     if clean_c == clean_u:
         return True, 0.98, "表現は少し異なりますが、正解です！"
 
-    num_c = normalize_numbers(clean_c)
-    num_u = normalize_numbers(clean_u)
-    if num_c == num_u:
+    if c.numeric == u.numeric:
         return True, 0.95, "数字表現が正解です！"
 
-    ok, conf = reading_match(correct_answer, user_answer)
+    ok, conf = _reading_match(c, u)
     if ok:
         return True, conf, "読みが正解です！"
 
-    ok, conf = numbers_match(correct_answer, user_answer)
+    ok, conf = _numbers_match(c, u)
     if ok:
         return True, conf, "数値が正解です！"
 
-    ok, conf = contains_match(correct_answer, user_answer)
+    ok, conf = _contains_match(c, u)
     if ok:
         return True, conf, "正解です！"
 
-    ok, conf = word_overlap_match(correct_answer, user_answer)
+    ok, conf = _word_overlap_match(c, u)
     if ok:
         return True, conf, "正解です！表現が少し異なります。"
 
-    similarity = calculate_similarity(clean_c, clean_u)
+    # 0.4 未満はどれも同じ判定なので、そこで距離計算を打ち切る
+    similarity = calculate_similarity(clean_c, clean_u, min_similarity=0.4)
 
     if similarity >= 0.85:
         return True, 0.9, "ほぼ正解です！わずかな表現の違いがあります。"
@@ -226,21 +184,27 @@ def evaluate_semantic_similarity(
     return False, 0.2, "残念ながら不正解です。正解と大きく異なります。"
 
 
-async def evaluate_text_answer(
+@lru_cache(maxsize=_PATTERN_FORMS_CACHE_SIZE)
+def _answer_patterns(correct_answer: str) -> tuple[tuple[str, TextForms], ...]:
+    """正解（1 行目の / 区切り）の各パターンとその正規化形（同じ問題の採点で使い回す）"""
+    first_line = correct_answer.split('\n')[0].strip()
+    return tuple((p.strip(), text_forms(p.strip())) for p in first_line.split('/'))
+
+
+def grade_text_answer(
     question_text: str,
     correct_answer: str,
     user_answer: str,
     explanation: Optional[str] = None,
 ) -> dict:
     """
-    text_input問題の回答を意味的に評価
+    text_input問題の回答を意味的に評価（同期版。採点プールのワーカーで実行される）
 
     Returns:
         {"is_correct": bool, "confidence": float, "feedback": str, "exact_match": bool}
     """
-    first_line = correct_answer.split('\n')[0].strip()
-    patterns = [p.strip() for p in first_line.split('/')]
-
+    stripped = user_answer.strip()
+    user_forms = text_forms(user_answer)
     best: dict = {
         "is_correct": False,
         "confidence": 0.0,
@@ -248,8 +212,8 @@ async def evaluate_text_answer(
         "exact_match": False,
     }
 
-    for pattern in patterns:
-        if pattern.strip() == user_answer.strip():
+    for pattern, forms in _answer_patterns(correct_answer):
+        if pattern == stripped:
             return {
                 "is_correct": True,
                 "confidence": 1.0,
@@ -257,7 +221,7 @@ async def evaluate_text_answer(
                 "exact_match": True,
             }
 
-        ok, conf, fb = evaluate_semantic_similarity(pattern, user_answer)
+        ok, conf, fb = _evaluate_forms(forms, user_forms)
         if conf > best["confidence"]:
             best = {
                 "is_correct": ok,
@@ -271,15 +235,36 @@ async def evaluate_text_answer(
     return best
 
 
-async def batch_evaluate_answers(evaluations: list[dict]) -> list[dict]:
-    """複数の回答を一括評価"""
-    results = []
-    for ev in evaluations:
-        r = await evaluate_text_answer(
+def grade_text_answers(evaluations: list[dict]) -> list[dict]:
+    """複数の回答を一括評価（同期版）"""
+    return [
+        grade_text_answer(
             question_text=ev["question_text"],
             correct_answer=ev["correct_answer"],
             user_answer=ev["user_answer"],
             explanation=ev.get("explanation"),
         )
-        results.append(r)
-    return results
+        for ev in evaluations
+    ]
+
+
+async def evaluate_text_answer(
+    question_text: str,
+    correct_answer: str,
+    user_answer: str,
+    explanation: Optional[str] = None,
+) -> dict:
+    """
+    text_input問題の回答を意味的に評価
+
+    文字列処理は採点プール（grading_pool）で行い、イベントループを止めない。
+
+    Returns:
+        {"is_correct": bool, "confidence": float, "feedback": str, "exact_match": bool}
+    """
+    return await run_grading(grade_text_answer, question_text, correct_answer, user_answer, explanation)
+
+
+async def batch_evaluate_answers(evaluations: list[dict]) -> list[dict]:
+    """複数の回答を一括評価（まとめて 1 ジョブとして採点プールで実行）"""
+    return await run_grading(grade_text_answers, evaluations)
@@ -0,0 +1,156 @@
+"""
+記述式回答の一括採点（クラス全員分の回答を同じルーブリックで採点する）
+
+回答・ルーブリック文・誤概念フレーズのトークン（CompiledText.tokens の文字 bigram）を
+CSR 形式の疎行列（NumPy 配列）にし、全組の共通トークン数を 1 回の疎行列積で求める。
+トークン重複率と長さの差からしきい値に届かない組を落とし、残った組だけ
+レーベンシュタイン距離を計算する。結果は 1 件ずつ evaluate_compiled した場合と同じ。
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+from .embedding_grading import (
+    DEFAULT_FULL_MATCH_THRESHOLD,
+    DEFAULT_PARTIAL_MATCH_THRESHOLD,
+    CompiledRubric,
+    CompiledText,
+    EmbeddingGradingResult,
+    MisconceptionItem,
+    RubricItem,
+    compile_text,
+    compiled_similarity,
+    compose_result,
+    get_compiled_rubric,
+)
+
+
+def _token_csr(texts: list[CompiledText], vocab: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """テキスト × トークンの 0/1 疎行列を CSR（indptr, indices）で作る。未知のトークンは語彙に追加する"""
+    indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+    indices: list[int] = []
+    for i, t in enumerate(texts):
+        for tok in t.tokens:
+            indices.append(vocab.setdefault(tok, len(vocab)))
+        indptr[i + 1] = len(indices)
+    return indptr, np.asarray(indices, dtype=np.int64)
+
+
+def _intersection_counts(
+    a: tuple[np.ndarray, np.ndarray],
+    b: tuple[np.ndarray, np.ndarray],
+    n_vocab: int,
+) -> np.ndarray:
+    """
+    共通トークン数の行列（A · Bᵀ）
+
+    B をトークン順に並べ替えて列ごとの範囲を求め、A の非ゼロ要素ごとに
+    同じトークンを持つ B の行を展開して (行, 列) ごとに数える。
+    """
+    a_indptr, a_tokens = a
+    b_indptr, b_tokens = b
+    n_a, n_b = len(a_indptr) - 1, len(b_indptr) - 1
+    if n_a == 0 or n_b == 0 or len(a_tokens) == 0 or len(b_tokens) == 0:
+        return np.zeros((n_a, n_b), dtype=np.int64)
+
+    b_rows = np.repeat(np.arange(n_b), np.diff(b_indptr))
+    order = np.argsort(b_tokens, kind="stable")
+    b_rows_by_token = b_rows[order]
+    starts = np.searchsorted(b_tokens[order], np.arange(n_vocab), side="left")
+    ends = np.searchsorted(b_tokens[order], np.arange(n_vocab), side="right")
+
+    a_rows = np.repeat(np.arange(n_a), np.diff(a_indptr))
+    counts = ends[a_tokens] - starts[a_tokens]
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros((n_a, n_b), dtype=np.int64)
+    # 各非ゼロ要素が対応する B の範囲 [start, end) を 1 本の添字列に展開する
+    offsets = np.repeat(starts[a_tokens] - (np.cumsum(counts) - counts), counts)
+    rows = np.repeat(a_rows, counts)
+    cols = b_rows_by_token[np.arange(total) + offsets]
+    return np.bincount(rows * n_b + cols, minlength=n_a * n_b).reshape(n_a, n_b)
+
+
+def similarity_matrix(
+    answers: list[CompiledText],
+    targets: list[CompiledText],
+    threshold: float,
+) -> np.ndarray:
+    """
+    全組の compiled_similarity(answer, target, threshold)（回答 × 対象の行列）
+
+    しきい値に届かないことが共通トークン数と長さの差から分かる組は距離計算をせず 0.0 にする。
+    """
+    sims = np.zeros((len(answers), len(targets)), dtype=np.float64)
+    if not answers or not targets:
+        return sims
+
+    vocab: dict[str, int] = {}
+    a = _token_csr(answers, vocab)
+    b = _token_csr(targets, vocab)
+    inter = _intersection_counts(a, b, len(vocab))
+
+    a_len = np.array([len(t.text) for t in answers], dtype=np.float64)[:, None]
+    b_len = np.array([len(t.text) for t in targets], dtype=np.float64)[None, :]
+    a_tok = np.diff(a[0]).astype(np.float64)[:, None]
+    b_tok = np.diff(b[0]).astype(np.float64)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tok_sim = np.where((a_tok > 0) & (b_tok > 0), inter / np.maximum(a_tok, b_tok), 0.0)
+    longer = np.maximum(a_len, b_len)
+    # compiled_similarity / levenshtein_within と同じ式で許される距離の上限を出す
+    need = (threshold - 0.4 * tok_sim) / 0.6
+    max_dist = np.trunc(longer * (1.0 - need) + 1e-9)
+    survive = (a_len > 0) & (b_len > 0) & (
+        (threshold <= 0.4 * tok_sim) | (np.abs(a_len - b_len) <= max_dist)
+    )
+
+    for i, j in zip(*np.nonzero(survive)):
+        sims[i, j] = compiled_similarity(answers[i], targets[j], threshold)
+    return sims
+
+
+def evaluate_compiled_batch(
+    answers: list[str],
+    compiled: CompiledRubric,
+    full_threshold: float = DEFAULT_FULL_MATCH_THRESHOLD,
+    partial_threshold: float = DEFAULT_PARTIAL_MATCH_THRESHOLD,
+    misconception_min_sim: float = 0.65,
+) -> list[EmbeddingGradingResult]:
+    """複数の回答を同じ CompiledRubric で採点する（回答の順に結果を返す）"""
+    answer_texts = [compile_text(a) for a in answers if a]
+    rubric_sims = similarity_matrix(answer_texts, compiled.rubric_texts, partial_threshold)
+    flat_phrases = [p for phrases in compiled.misconception_phrases for p in phrases]
+    phrase_sims = similarity_matrix(answer_texts, flat_phrases, misconception_min_sim)
+    bounds = np.cumsum([0] + [len(phrases) for phrases in compiled.misconception_phrases])
+
+    results: list[EmbeddingGradingResult] = []
+    row = 0
+    for answer in answers:
+        if not answer:
+            results.append(compose_result(compiled, None, []))
+            continue
+        score = None
+        if compiled.rubrics:
+            score = compiled.score_from_similarities(
+                rubric_sims[row].tolist(), full_threshold, partial_threshold
+            )
+        matches = []
+        if compiled.misconceptions:
+            matches = compiled.classify_from_similarities(
+                [phrase_sims[row, bounds[k]:bounds[k + 1]].tolist() for k in range(len(bounds) - 1)],
+                misconception_min_sim,
+            )
+        results.append(compose_result(compiled, score, matches))
+        row += 1
+    return results
+
+
+def evaluate_rubric_batch(
+    answers: list[str],
+    rubrics: list[RubricItem],
+    misconceptions: Optional[list[MisconceptionItem]] = None,
+) -> list[EmbeddingGradingResult]:
+    """ルーブリック・誤概念を（LRU から）コンパイルして一括採点する（採点プールのジョブ用）"""
+    return evaluate_compiled_batch(answers, get_compiled_rubric(rubrics, misconceptions))
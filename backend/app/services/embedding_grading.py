@@ -4,14 +4,22 @@
 - ルーブリック項目ごとに独自テキスト類似度で部分点を付与
 - 誤概念（ミスコンセプション）の分類
 - 同義語・言い換えはレーベンシュタイン距離 + トークン重複で吸収
+- ルーブリック・誤概念は正規化済み（CompiledRubric）を内容のハッシュごとに LRU で再利用
+- 誤概念の分類はトークン → 代表フレーズの転置インデックスで候補を絞る
 - 外部ライブラリ不使用
 """
 from __future__ import annotations
 
+import hashlib
 import re
+import threading
 import unicodedata
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional
+from itertools import chain
+from typing import Callable, Optional
+
+from .string_distance import levenshtein, levenshtein_within, max_distance_for
 
 
 def _normalize(text: str) -> str:
@@ -27,55 +35,69 @@ def _remove_punctuation(text: str) -> str:
     )
 
 
-def _levenshtein(s1: str, s2: str) -> int:
-    if len(s1) < len(s2):
-        return _levenshtein(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    prev = list(range(len(s2) + 1))
-    for i, c1 in enumerate(s1):
-        curr = [i + 1]
-        for j, c2 in enumerate(s2):
-            cost = 0 if c1 == c2 else 1
-            curr.append(min(curr[j] + 1, prev[j + 1] + 1, prev[j] + cost))
-        prev = curr
-    return prev[-1]
-
-
-def _levenshtein_similarity(s1: str, s2: str) -> float:
-    longer = max(len(s1), len(s2))
-    if longer == 0:
-        return 1.0
-    return (longer - _levenshtein(s1, s2)) / longer
+def _char_ngrams(text: str, n: int = 2) -> list[str]:
+    """文字 n-gram を生成"""
+    return [text[i:i + n] for i in range(max(0, len(text) - n + 1))]
 
 
-def _token_overlap(a: str, b: str) -> float:
-    """トークン（単語 or 文字 n-gram）の重複率"""
-    ta = set(a.split()) if ' ' in a else set(_char_ngrams(a, 2))
-    tb = set(b.split()) if ' ' in b else set(_char_ngrams(b, 2))
-    if not ta or not tb:
-        return 0.0
-    inter = ta & tb
-    return len(inter) / max(len(ta), len(tb))
+@dataclass(frozen=True)
+class CompiledText:
+    """正規化・句読点除去済みのテキストと、類似度計算用のトークン集合"""
+    text: str
+    tokens: frozenset
 
 
-def _char_ngrams(text: str, n: int = 2) -> list[str]:
-    """文字 n-gram を生成"""
-    return [text[i:i + n] for i in range(max(0, len(text) - n + 1))]
+def compile_text(raw: str) -> CompiledText:
+    """text_similarity と同じ正規化をして、トークン（単語 or 文字 bigram）集合を作る"""
+    t = _remove_punctuation(_normalize(raw))
+    tokens = frozenset(t.split()) if ' ' in t else frozenset(_char_ngrams(t, 2))
+    return CompiledText(text=t, tokens=tokens)
 
 
-def text_similarity(a: str, b: str) -> float:
+# 類似度の重み（レーベンシュタイン類似度・トークン重複率）。トークンを共有しない組の類似度は _LEV_WEIGHT 以下
+_LEV_WEIGHT = 0.6
+_TOKEN_WEIGHT = 0.4
+
+
+def compiled_similarity(a: CompiledText, b: CompiledText, min_similarity: float = 0.0) -> float:
+    """
+    compile_text 済みの 2 テキストの類似度（text_similarity と同じ値）
+
+    min_similarity を渡すと、長さの比・トークン数の比による上限で届かない組を
+    距離計算なしで 0.0 にし、距離計算もそれに届かない時点で打ち切る。
+    """
+    if not a.text or not b.text:
+        return 0.0
+    la, lb = len(a.text), len(b.text)
+    longer = max(la, lb)
+    na, nb = len(a.tokens), len(b.tokens)
+    if min_similarity > 0.0:
+        # 距離は長さの差以上、共通トークンは少ない方の数以下
+        tok_bound = min(na, nb) / max(na, nb) if na and nb else 0.0
+        if _LEV_WEIGHT * min(la, lb) / longer + _TOKEN_WEIGHT * tok_bound < min_similarity:
+            return 0.0
+    tok_sim = len(a.tokens & b.tokens) / max(na, nb) if na and nb else 0.0
+    if min_similarity <= _TOKEN_WEIGHT * tok_sim:
+        lev_sim = (longer - levenshtein(a.text, b.text)) / longer
+    else:
+        # 0.6 * lev_sim + 0.4 * tok_sim >= min_similarity に必要な距離の上限
+        max_dist = max_distance_for(longer, (min_similarity - _TOKEN_WEIGHT * tok_sim) / _LEV_WEIGHT)
+        dist = levenshtein_within(a.text, b.text, max_dist)
+        if dist is None:
+            return 0.0
+        lev_sim = (longer - dist) / longer
+    return _LEV_WEIGHT * lev_sim + _TOKEN_WEIGHT * tok_sim
+
+
+def text_similarity(a: str, b: str, min_similarity: float = 0.0) -> float:
     """
     独自テキスト類似度（0.0–1.0）。
     レーベンシュタイン類似度とトークン重複率の加重平均。
+
+    min_similarity を渡すと、それに届かないことが分かった時点で距離計算を打ち切り 0.0 を返す
+    （しきい値以上の値は打ち切らない場合と同じ）。
     """
-    na = _remove_punctuation(_normalize(a))
-    nb = _remove_punctuation(_normalize(b))
-    if not na or not nb:
-        return 0.0
-    lev_sim = _levenshtein_similarity(na, nb)
-    tok_sim = _token_overlap(na, nb)
-    return 0.6 * lev_sim + 0.4 * tok_sim
+    return compiled_similarity(compile_text(a), compile_text(b), min_similarity)
 
 
 # --- ルーブリック・誤概念の型 ---
@@ -98,9 +120,13 @@ class MisconceptionItem:
 
 @dataclass
 class RubricScoreDetail:
-    """ルーブリック1項目ごとのスコア"""
+    """
+    ルーブリック1項目ごとのスコア
+
+    similarity は部分点のしきい値に届かない項目では None（距離計算を省くため実際の値は出さない）。
+    """
     rubric_id: str
-    similarity: float
+    similarity: Optional[float]
     partial_score: float
     weight: float
 
@@ -136,6 +162,304 @@ def _partial_score(sim: float, full_thresh: float, partial_thresh: float) -> flo
     return 0.0
 
 
+@dataclass(frozen=True)
+class PhraseIndex:
+    """
+    誤概念の代表フレーズの転置インデックス（トークン → フレーズ番号）
+
+    フレーズは全誤概念分を 1 列に並べ、owners[i] がフレーズ i の誤概念の番号。
+    """
+    phrases: list[CompiledText]
+    owners: list[int]
+    postings: dict[str, list[int]]
+
+    @classmethod
+    def build(cls, misconception_phrases: list[list[CompiledText]]) -> PhraseIndex:
+        phrases: list[CompiledText] = []
+        owners: list[int] = []
+        postings: dict[str, list[int]] = {}
+        for k, group in enumerate(misconception_phrases):
+            for phrase in group:
+                if not phrase.text:
+                    continue
+                for tok in phrase.tokens:
+                    postings.setdefault(tok, []).append(len(phrases))
+                phrases.append(phrase)
+                owners.append(k)
+        return cls(phrases=phrases, owners=owners, postings=postings)
+
+    def shared_counts(self, answer: CompiledText) -> Counter:
+        """回答とトークンを 1 つ以上共有するフレーズ → 共有トークン数"""
+        return Counter(chain.from_iterable(self.postings.get(tok, ()) for tok in answer.tokens))
+
+    @staticmethod
+    def upper_bound(answer: CompiledText, phrase: CompiledText, shared: int) -> float:
+        """
+        compiled_similarity(answer, phrase) の上限（共有トークン数と長さだけから求める）
+
+        距離は長さの差以上。また相手にない bigram は 1 回の編集で高々 2 個しか作れないので、
+        距離は (相手にない bigram の数 / 2) の切り上げ以上。
+        """
+        la, lp = len(answer.text), len(phrase.text)
+        longer = max(la, lp)
+        most = max(len(answer.tokens), len(phrase.tokens))
+        min_dist = max(abs(la - lp), (most - shared + 1) // 2)
+        return _LEV_WEIGHT * (longer - min_dist) / longer + _TOKEN_WEIGHT * shared / most
+
+
+@dataclass
+class CompiledRubric:
+    """
+    ルーブリック・誤概念を正規化・特徴量化したもの
+
+    ルーブリック文・誤概念フレーズの正規化と bigram 集合を 1 回だけ作り、
+    採点のたびには回答だけを正規化する。get_compiled_rubric で内容のハッシュごとに再利用する。
+    """
+    rubrics: list[RubricItem]
+    misconceptions: list[MisconceptionItem]
+    rubric_texts: list[CompiledText]
+    misconception_phrases: list[list[CompiledText]]
+    # 誤概念フレーズの転置インデックス（classify で初めて使うときに作る）
+    _phrase_index: Optional[PhraseIndex] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def build(
+        cls,
+        rubrics: list[RubricItem],
+        misconceptions: Optional[list[MisconceptionItem]] = None,
+    ) -> CompiledRubric:
+        misconceptions = list(misconceptions or [])
+        return cls(
+            rubrics=list(rubrics),
+            misconceptions=misconceptions,
+            rubric_texts=[compile_text(r.text) for r in rubrics],
+            misconception_phrases=[
+                [compile_text(p) for p in mc.example_phrases] for mc in misconceptions
+            ],
+        )
+
+    @property
+    def max_raw(self) -> float:
+        return sum(r.weight for r in self.rubrics)
+
+    def score(
+        self,
+        answer: CompiledText,
+        full_threshold: float = DEFAULT_FULL_MATCH_THRESHOLD,
+        partial_threshold: float = DEFAULT_PARTIAL_MATCH_THRESHOLD,
+    ) -> tuple[list[RubricScoreDetail], float]:
+        """ルーブリック項目ごとの詳細と合計点（部分点に届かない組は距離計算を省く）"""
+        sims = [compiled_similarity(answer, rt, partial_threshold) for rt in self.rubric_texts]
+        return self.score_from_similarities(sims, full_threshold, partial_threshold)
+
+    def score_from_similarities(
+        self,
+        sims: list[float],
+        full_threshold: float = DEFAULT_FULL_MATCH_THRESHOLD,
+        partial_threshold: float = DEFAULT_PARTIAL_MATCH_THRESHOLD,
+    ) -> tuple[list[RubricScoreDetail], float]:
+        """
+        ルーブリック項目ごとの類似度（rubrics と同じ順）から詳細と合計点を作る
+
+        部分点のしきい値未満の類似度は打ち切られた値のことがあるため、詳細には None を入れる。
+        """
+        details: list[RubricScoreDetail] = []
+        total_raw = 0.0
+        for r, sim in zip(self.rubrics, sims):
+            sim = float(sim)
+            partial = _partial_score(sim, full_threshold, partial_threshold)
+            total_raw += partial * r.weight
+            details.append(RubricScoreDetail(
+                rubric_id=r.id,
+                similarity=round(sim, 4) if sim >= partial_threshold else None,
+                partial_score=partial,
+                weight=r.weight,
+            ))
+        return details, total_raw
+
+    def classify(
+        self,
+        answer: CompiledText,
+        min_similarity: float = 0.65,
+        top_k: int = 3,
+    ) -> list[MisconceptionMatch]:
+        """回答に近い誤概念（代表フレーズとの最大類似度が min_similarity 以上）を上位 top_k 件"""
+        if min_similarity > _LEV_WEIGHT:
+            sims = self._candidate_similarities(answer, min_similarity)
+        else:
+            sims = [
+                [compiled_similarity(answer, p, min_similarity) for p in phrases]
+                for phrases in self.misconception_phrases
+            ]
+        return self.classify_from_similarities(sims, min_similarity, top_k)
+
+    def phrase_index(self) -> PhraseIndex:
+        """誤概念の代表フレーズの転置インデックス（初回に作って保持する）"""
+        if self._phrase_index is None:
+            self._phrase_index = PhraseIndex.build(self.misconception_phrases)
+        return self._phrase_index
+
+    def _candidate_similarities(self, answer: CompiledText, min_similarity: float) -> list[list[float]]:
+        """
+        回答とトークンを共有する代表フレーズだけの類似度（誤概念ごと。候補外のフレーズは含めない）
+
+        共有トークンがないフレーズの類似度は _LEV_WEIGHT 以下なので、min_similarity がそれより
+        大きければ候補にならない。候補も PhraseIndex.upper_bound で落としてから compiled_similarity を
+        計算する。しきい値以上の類似度は全件計算と同じなので分類結果も同じ。
+        """
+        sims: list[list[float]] = [[] for _ in self.misconception_phrases]
+        if not answer.text or not answer.tokens:
+            return sims
+        index = self.phrase_index()
+        for i, shared in index.shared_counts(answer).items():
+            phrase = index.phrases[i]
+            if index.upper_bound(answer, phrase, shared) >= min_similarity:
+                sims[index.owners[i]].append(compiled_similarity(answer, phrase, min_similarity))
+        return sims
+
+    def classify_from_similarities(
+        self,
+        sims: list[list[float]],
+        min_similarity: float = 0.65,
+        top_k: int = 3,
+    ) -> list[MisconceptionMatch]:
+        """誤概念ごとの代表フレーズとの類似度（misconception_phrases と同じ形）から分類する"""
+        matches: list[tuple[str, str, float]] = []
+        for mc, phrase_sims in zip(self.misconceptions, sims):
+            if len(phrase_sims) == 0:
+                continue
+            best = float(max(phrase_sims))
+            if best >= min_similarity:
+                matches.append((mc.id, mc.label, best))
+
+        matches.sort(key=lambda x: -x[2])
+        return [
+            MisconceptionMatch(misconception_id=m[0], label=m[1], similarity=round(m[2], 4))
+            for m in matches[:top_k]
+        ]
+
+
+def rubric_hash(
+    rubrics: list[RubricItem],
+    misconceptions: Optional[list[MisconceptionItem]] = None,
+) -> str:
+    """ルーブリック・誤概念の内容のハッシュ（CompiledRubric のキャッシュキー）"""
+    content = repr((
+        [(r.id, r.text, r.weight) for r in rubrics],
+        [(m.id, m.label, list(m.example_phrases)) for m in misconceptions or []],
+    ))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CompiledRubricCache:
+    """ルーブリック内容のハッシュ → CompiledRubric の LRU"""
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, CompiledRubric]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        rubrics: list[RubricItem],
+        misconceptions: Optional[list[MisconceptionItem]] = None,
+        build: Optional[Callable[[], CompiledRubric]] = None,
+    ) -> CompiledRubric:
+        """
+        内容のハッシュで引き、なければ作って入れる
+
+        build を渡すとそれで作る（保存済みの特徴量から組み立てる場合など）。
+        """
+        if build is None:
+            build = lambda: CompiledRubric.build(rubrics, misconceptions)  # noqa: E731
+        if self._max_entries <= 0:
+            return build()
+
+        key = rubric_hash(rubrics, misconceptions)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+
+        compiled = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_compiled_rubric_cache: Optional[CompiledRubricCache] = None
+_compiled_rubric_cache_lock = threading.Lock()
+
+
+def get_compiled_rubric_cache() -> CompiledRubricCache:
+    global _compiled_rubric_cache
+    if _compiled_rubric_cache is None:
+        with _compiled_rubric_cache_lock:
+            if _compiled_rubric_cache is None:
+                from ..core.config import settings
+
+                _compiled_rubric_cache = CompiledRubricCache(
+                    max_entries=settings.COMPILED_RUBRIC_CACHE_SIZE
+                )
+    return _compiled_rubric_cache
+
+
+def get_compiled_rubric(
+    rubrics: list[RubricItem],
+    misconceptions: Optional[list[MisconceptionItem]] = None,
+) -> CompiledRubric:
+    """内容が同じルーブリック・誤概念なら正規化済みのものを再利用する"""
+    return get_compiled_rubric_cache().get(rubrics, misconceptions)
+
+
+def _empty_answer_result(max_raw: float) -> EmbeddingGradingResult:
+    return EmbeddingGradingResult(
+        total_raw=0.0, max_raw=max_raw, normalized_score=0.0,
+        details=[], feedback_summary="回答が空です。",
+    )
+
+
+def _rubric_result(
+    details: list[RubricScoreDetail],
+    total_raw: float,
+    max_raw: float,
+    rubrics: list[RubricItem],
+) -> EmbeddingGradingResult:
+    normalized = (total_raw / max_raw * 100.0) if max_raw > 0 else 0.0
+    return EmbeddingGradingResult(
+        total_raw=round(total_raw, 2),
+        max_raw=max_raw,
+        normalized_score=round(normalized, 1),
+        details=details,
+        feedback_summary=_build_rubric_feedback(details, rubrics),
+    )
+
+
 def score_with_rubric(
     answer: str,
     rubrics: list[RubricItem],
@@ -149,36 +473,11 @@ def score_with_rubric(
     """
     max_raw = sum(r.weight for r in rubrics)
     if not answer or not rubrics:
-        return EmbeddingGradingResult(
-            total_raw=0.0, max_raw=max_raw, normalized_score=0.0,
-            details=[], feedback_summary="回答が空です。",
-        )
-
-    details: list[RubricScoreDetail] = []
-    total_raw = 0.0
-
-    for r in rubrics:
-        sim = text_similarity(answer, r.text)
-        partial = _partial_score(sim, full_threshold, partial_threshold)
-        weighted = partial * r.weight
-        total_raw += weighted
-        details.append(RubricScoreDetail(
-            rubric_id=r.id,
-            similarity=round(sim, 4),
-            partial_score=partial,
-            weight=r.weight,
-        ))
+        return _empty_answer_result(max_raw)
 
-    normalized = (total_raw / max_raw * 100.0) if max_raw > 0 else 0.0
-    feedback = _build_rubric_feedback(details, rubrics)
-
-    return EmbeddingGradingResult(
-        total_raw=round(total_raw, 2),
-        max_raw=max_raw,
-        normalized_score=round(normalized, 1),
-        details=details,
-        feedback_summary=feedback,
-    )
+    compiled = get_compiled_rubric(rubrics)
+    details, total_raw = compiled.score(compile_text(answer), full_threshold, partial_threshold)
+    return _rubric_result(details, total_raw, max_raw, rubrics)
 
 
 def _build_rubric_feedback(
@@ -205,20 +504,8 @@ def classify_misconceptions(
     if not answer or not misconceptions:
         return []
 
-    matches: list[tuple[str, str, float]] = []
-    for mc in misconceptions:
-        if not mc.example_phrases:
-            continue
-        sims = [text_similarity(answer, phrase) for phrase in mc.example_phrases]
-        best = max(sims) if sims else 0.0
-        if best >= min_similarity:
-            matches.append((mc.id, mc.label, best))
-
-    matches.sort(key=lambda x: -x[2])
-    return [
-        MisconceptionMatch(misconception_id=m[0], label=m[1], similarity=round(m[2], 4))
-        for m in matches[:top_k]
-    ]
+    compiled = get_compiled_rubric([], misconceptions)
+    return compiled.classify(compile_text(answer), min_similarity, top_k)
 
 
 def evaluate_with_rubric_and_misconceptions(
@@ -231,24 +518,53 @@ def evaluate_with_rubric_and_misconceptions(
     **_kwargs,
 ) -> EmbeddingGradingResult:
     """ルーブリック採点 + 誤概念分類をまとめて実行。"""
-    result = score_with_rubric(
-        answer=answer,
-        rubrics=rubrics,
+    return evaluate_compiled(
+        answer,
+        get_compiled_rubric(rubrics, misconceptions),
         full_threshold=full_threshold,
         partial_threshold=partial_threshold,
+        misconception_min_sim=misconception_min_sim,
     )
 
-    if misconceptions:
-        result.misconceptions = classify_misconceptions(
-            answer=answer,
-            misconceptions=misconceptions,
-            min_similarity=misconception_min_sim,
-        )
-        if result.misconceptions and result.feedback_summary:
-            result.feedback_summary += " また、回答内容から考えられる誤解: " + ", ".join(
-                m.label for m in result.misconceptions[:2]
-            ) + "。"
 
+def evaluate_compiled(
+    answer: str,
+    compiled: CompiledRubric,
+    full_threshold: float = DEFAULT_FULL_MATCH_THRESHOLD,
+    partial_threshold: float = DEFAULT_PARTIAL_MATCH_THRESHOLD,
+    misconception_min_sim: float = 0.65,
+) -> EmbeddingGradingResult:
+    """CompiledRubric でルーブリック採点 + 誤概念分類（回答の正規化は 1 回）"""
+    if not answer:
+        return _empty_answer_result(compiled.max_raw)
+
+    answer_text = compile_text(answer)
+    score = None
+    if compiled.rubrics:
+        score = compiled.score(answer_text, full_threshold, partial_threshold)
+    matches = []
+    if compiled.misconceptions:
+        matches = compiled.classify(answer_text, misconception_min_sim)
+    return compose_result(compiled, score, matches)
+
+
+def compose_result(
+    compiled: CompiledRubric,
+    score: Optional[tuple[list[RubricScoreDetail], float]],
+    misconceptions: list[MisconceptionMatch],
+) -> EmbeddingGradingResult:
+    """ルーブリック採点（score / score_from_similarities の戻り値）と誤概念分類を 1 つの結果にまとめる"""
+    if score is None:
+        result = _empty_answer_result(compiled.max_raw)
+    else:
+        details, total_raw = score
+        result = _rubric_result(details, total_raw, compiled.max_raw, compiled.rubrics)
+
+    result.misconceptions = misconceptions
+    if result.misconceptions and result.feedback_summary:
+        result.feedback_summary += " また、回答内容から考えられる誤解: " + ", ".join(
+            m.label for m in result.misconceptions[:2]
+        ) + "。"
     return result
 
 
@@ -0,0 +1,185 @@
+"""
+記述式採点結果のキャッシュ
+
+同じ問題に同じ回答が繰り返し送られる（単語帳の text_input 問題など）ため、
+(問題, 正解またはルーブリックの内容ハッシュ, 回答) ごとの評価結果（API が返す dict）を
+プロセス内の LRU と（REDIS_URL 設定時は）Redis の 2 段で保持する。
+
+- evaluate-text: 回答は前後の空白を除いたもの（評価の最初の完全一致判定がこの形で比較するため、
+  これ以上正規化すると結果の異なる回答が同じキーになる）
+- ルーブリック採点: 回答は compile_text 後のテキスト（採点結果はこれだけで決まる）
+
+キーに問題ごとのバージョンを含め、問題の更新・削除でバージョンを上げて古い結果を無効化する。
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = "grade:ver:{question_id}"
+
+
+def answer_key_hash(value: str) -> str:
+    """正解文字列などを短いキーにする"""
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+
+class GradingCache:
+    """採点結果の LRU（+ 任意の Redis）キャッシュ"""
+
+    def __init__(self, max_entries: int = 10000, ttl_sec: float = 86400.0, redis_url: Optional[str] = None):
+        self._max_entries = max_entries
+        self._ttl_sec = ttl_sec
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis
+
+            self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def _question_version(self, question_id: str) -> int:
+        if self._redis is not None:
+            try:
+                return int(self._redis.get(_VERSION_KEY.format(question_id=question_id)) or 0)
+            except Exception:
+                logger.warning("Redis grading version read failed; using local version", exc_info=True)
+        with self._lock:
+            return self._versions.get(question_id, 0)
+
+    def key(self, kind: str, question_id: str, answer_key: str, user_answer: str) -> str:
+        """
+        キャッシュキー
+
+        Args:
+            kind: 評価の種類（"text" / "text-tfidf" / "rubric"）
+            answer_key: 正解文字列やルーブリック内容のハッシュ
+            user_answer: 正規化済みの回答
+        """
+        return self.keys(kind, question_id, answer_key, [user_answer])[0]
+
+    def keys(self, kind: str, question_id: str, answer_key: str, user_answers: Iterable[str]) -> List[str]:
+        """同じ問題の複数の回答のキー（問題のバージョンは 1 回だけ読む）"""
+        prefix = f"grade:{kind}:{question_id}:v{self._question_version(question_id)}:{answer_key}"
+        return [f"{prefix}:{answer_key_hash(a)}" for a in user_answers]
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        """複数のキーを引く（Redis は見つからなかった分だけ 1 回の MGET）"""
+        if not self.enabled:
+            return [None] * len(keys)
+        found: List[Optional[str]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    found[i] = entry
+
+        missing = [i for i, raw in enumerate(found) if raw is None]
+        if missing and self._redis is not None:
+            try:
+                raws = self._redis.mget([keys[i] for i in missing])
+            except Exception:
+                logger.warning("Redis grading cache read failed", exc_info=True)
+                raws = [None] * len(missing)
+            for i, raw in zip(missing, raws):
+                if raw is not None:
+                    self._store_local(keys[i], raw)
+                    found[i] = raw
+                    with self._lock:
+                        self.redis_hits += 1
+
+        with self._lock:
+            self.misses += sum(1 for raw in found if raw is None)
+        return [json.loads(raw) if raw is not None else None for raw in found]
+
+    def set(self, key: str, evaluation: dict) -> None:
+        if not self.enabled:
+            return
+        raw = json.dumps(evaluation, ensure_ascii=False)
+        self._store_local(key, raw)
+        if self._redis is not None:
+            try:
+                self._redis.setex(key, max(1, int(self._ttl_sec)), raw)
+            except Exception:
+                logger.warning("Redis grading cache write failed", exc_info=True)
+
+    def _store_local(self, key: str, raw: str) -> None:
+        # 呼び出し側が結果を書き換えても影響しないよう JSON 文字列で持つ
+        with self._lock:
+            self._entries[key] = raw
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_questions(self, question_ids: Iterable[str]) -> None:
+        """問題の正解・ルーブリックが変わったときに、その問題の結果を無効化する"""
+        question_ids = set(question_ids)
+        if not question_ids or not self.enabled:
+            return
+        with self._lock:
+            for question_id in question_ids:
+                self._versions[question_id] = self._versions.get(question_id, 0) + 1
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for question_id in question_ids:
+                    pipe.incr(_VERSION_KEY.format(question_id=question_id))
+                pipe.execute()
+            except Exception:
+                logger.warning("Redis grading version bump failed", exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.redis_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "memory+redis" if self._redis is not None else "memory",
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache: Optional[GradingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_grading_cache() -> GradingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from ..core.config import settings
+
+                _cache = GradingCache(
+                    max_entries=settings.GRADING_CACHE_SIZE,
+                    ttl_sec=settings.GRADING_CACHE_TTL_SEC,
+                    redis_url=settings.REDIS_URL,
+                )
+    return _cache
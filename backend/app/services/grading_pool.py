@@ -0,0 +1,184 @@
+"""
+記述式採点（CPU バウンドな文字列処理）をイベントループの外で実行する
+
+GRADING_POOL_WORKERS > 0 のとき ProcessPoolExecutor（spawn）で採点し、lifespan の起動時に
+各ワーカーで採点モジュールを読み込んでおく。0 のときはスレッドで実行する
+（GIL は解放されないが、長い回答の採点中も他のリクエストの処理が進む）。
+どちらもジョブごとにタイムアウト（GRADING_TIMEOUT_SEC）を設け、待ち行列の深さを計測する。
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GradingTimeoutError(TimeoutError):
+    """採点ジョブがタイムアウトした"""
+
+
+def _warm_up() -> int:
+    """ワーカーで採点モジュールを読み込み、正規化・距離計算を 1 回通しておく"""
+    from . import ai_evaluator, batch_grading, embedding_grading  # noqa: F401
+
+    embedding_grading.text_similarity("ウォームアップ", "warm up")
+    ai_evaluator.evaluate_semantic_similarity("一", "1")
+    return multiprocessing.current_process().pid or 0
+
+
+class GradingPool:
+    """採点ジョブの実行先（プロセスプール or スレッド）とその計測値"""
+
+    def __init__(self, workers: int = 0, timeout_sec: float = 10.0):
+        self._workers = workers
+        self._timeout_sec = timeout_sec
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.total_sec = 0.0
+
+    @property
+    def uses_processes(self) -> bool:
+        return self._workers > 0
+
+    def start(self) -> None:
+        """プロセスプールを作り、全ワーカーを起動して採点モジュールを読み込ませる"""
+        if not self.uses_processes:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+        started = time.perf_counter()
+        # ワーカー数だけ同時に投げ、全プロセスを起動させる
+        futures = [executor.submit(_warm_up) for _ in range(self._workers)]
+        pids = {f.result() for f in futures}
+        logger.info(
+            f"Grading pool started: {self._workers} workers ({len(pids)} warmed) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # uvicorn プロセスはスレッド（write-behind 等）を持つため fork ではなく spawn で起動する
+        return ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def run(self, fn: Callable, *args, timeout_sec: Optional[float] = None):
+        """
+        fn(*args) をプール（またはスレッド）で実行して結果を返す
+
+        プロセスで実行する場合 fn はモジュールレベルの関数、引数・戻り値は pickle 可能であること。
+        タイムアウト時は GradingTimeoutError（実行中のジョブ自体は止められないため最後まで走る）。
+        """
+        timeout = self._timeout_sec if timeout_sec is None else timeout_sec
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if self.uses_processes and self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+        started = time.perf_counter()
+        try:
+            if executor is not None:
+                future = loop.run_in_executor(executor, fn, *args)
+            else:
+                future = asyncio.to_thread(fn, *args)
+            result = await asyncio.wait_for(future, timeout=timeout if timeout > 0 else None)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise GradingTimeoutError(f"grading job timed out after {timeout}s")
+        except BrokenProcessPool:
+            # ワーカーが異常終了した場合はプールを作り直す（このジョブは失敗として返す）
+            logger.exception("Grading pool broken; recreating")
+            with self._lock:
+                self.failures += 1
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.total_sec += time.perf_counter() - started
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            finished = self.completed + self.failures + self.timeouts
+            return {
+                "backend": "process" if self.uses_processes else "thread",
+                "workers": self._workers,
+                "timeout_sec": self._timeout_sec,
+                "queue_depth": self.in_flight,
+                "max_queue_depth": self.max_in_flight,
+                "completed": self.completed,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "avg_job_sec": round(self.total_sec / finished, 4) if finished else 0.0,
+            }
+
+
+_pool: Optional[GradingPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_grading_pool() -> GradingPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from ..core.config import settings
+
+                _pool = GradingPool(
+                    workers=settings.GRADING_POOL_WORKERS,
+                    timeout_sec=settings.GRADING_TIMEOUT_SEC,
+                )
+    return _pool
+
+
+def start_grading_pool() -> GradingPool:
+    """採点プールを起動してワーカーを温める（lifespan から呼ぶ）"""
+    pool = get_grading_pool()
+    pool.start()
+    return pool
+
+
+def stop_grading_pool() -> None:
+    """プロセスプールを停止する（lifespan のシャットダウン時に呼ぶ）"""
+    global _pool
+    if _pool is None:
+        return
+    try:
+        _pool.stop()
+    finally:
+        _pool = None
+
+
+async def run_grading(fn: Callable, *args):
+    """採点関数をイベントループの外で実行する"""
+    return await get_grading_pool().run(fn, *args)
@@ -0,0 +1,89 @@
+"""
+問題に保存したルーブリック・誤概念と採点用の特徴量
+
+保存時にルーブリック文・誤概念フレーズを compile_text で正規化し、正規化済みテキストと
+文字 bigram の指紋を行に書いておく。採点時はそれを CompiledText に戻すだけで CompiledRubric を組み立てる
+（クライアントが毎回ルーブリックを送る /evaluate-text-with-rubric と違い、正規化をやり直さない）。
+組み立てた CompiledRubric は内容のハッシュごとに get_compiled_rubric_cache の LRU に入れて使い回す。
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from ..models import Question, QuestionMisconception, QuestionRubricItem
+from .embedding_grading import (
+    CompiledRubric,
+    CompiledText,
+    MisconceptionItem,
+    RubricItem,
+    compile_text,
+    get_compiled_rubric_cache,
+)
+
+# 特徴量の作り方（compile_text）を変えたら上げる。古い行は読み込み時に計算し直す
+FEATURES_VERSION = 1
+
+
+def _features(text: str) -> tuple[str, list[str]]:
+    compiled = compile_text(text)
+    return compiled.text, sorted(compiled.tokens)
+
+
+def apply_rubric_item_features(item: QuestionRubricItem) -> None:
+    """ルーブリック項目の text から特徴量を計算して行に書く"""
+    item.normalized_text, item.fingerprint = _features(item.text)
+    item.features_version = FEATURES_VERSION
+
+
+def apply_misconception_features(misconception: QuestionMisconception) -> None:
+    """誤概念の example_phrases から特徴量を計算して行に書く"""
+    features = [_features(p) for p in misconception.example_phrases or []]
+    misconception.normalized_phrases = [text for text, _ in features]
+    misconception.phrase_fingerprints = [tokens for _, tokens in features]
+    misconception.features_version = FEATURES_VERSION
+
+
+def _rubric_text(item: QuestionRubricItem) -> CompiledText:
+    if item.features_version != FEATURES_VERSION:
+        return compile_text(item.text)
+    return CompiledText(text=item.normalized_text, tokens=frozenset(item.fingerprint))
+
+
+def _misconception_phrases(misconception: QuestionMisconception) -> list[CompiledText]:
+    phrases = list(misconception.example_phrases or [])
+    if misconception.features_version != FEATURES_VERSION or len(misconception.normalized_phrases) != len(phrases):
+        return [compile_text(p) for p in phrases]
+    return [
+        CompiledText(text=text, tokens=frozenset(tokens))
+        for text, tokens in zip(misconception.normalized_phrases, misconception.phrase_fingerprints)
+    ]
+
+
+def stored_rubric(question: Question) -> Optional[CompiledRubric]:
+    """
+    問題に保存されたルーブリック・誤概念（どちらもなければ None）
+
+    内容が同じ間は CompiledRubric（誤概念フレーズの転置インデックスを含む）を LRU で再利用する。
+    """
+    items = list(question.rubric_items)
+    misconceptions = list(question.misconceptions)
+    if not items and not misconceptions:
+        return None
+    rubric_items = [RubricItem(id=i.id, text=i.text, weight=i.weight) for i in items]
+    misconception_items = [
+        MisconceptionItem(id=m.id, label=m.label, example_phrases=list(m.example_phrases or []))
+        for m in misconceptions
+    ]
+
+    def build() -> CompiledRubric:
+        compiled = CompiledRubric(
+            rubrics=rubric_items,
+            misconceptions=misconception_items,
+            rubric_texts=[_rubric_text(i) for i in items],
+            misconception_phrases=[_misconception_phrases(m) for m in misconceptions],
+        )
+        # 採点プールのワーカーへ渡す前に作っておき、ジョブごとに作り直さない
+        compiled.phrase_index()
+        return compiled
+
+    return get_compiled_rubric_cache().get(rubric_items, misconception_items, build=build)
@@ -0,0 +1,140 @@
+"""
+文字列距離（採点用の共通実装）
+
+- levenshtein: Myers（Hyyrö の編集距離版）のビット並列アルゴリズム。
+  パターン側の各文字の出現位置をビットマスクにし、テキスト 1 文字ごとに列全体を
+  数回の整数演算で更新する（O(⌈m/w⌉·n)）。Python の整数は任意精度なので、
+  64 文字を超えるパターンはブロック分割版と同じ計算を整数演算がワード単位で行う。
+- levenshtein_within: 呼び出し側が必要とする上限 k を超えた時点で打ち切る版。
+  長さの差で即座に判定し、帯幅 2k+1 が狭いときは Ukkonen の帯 DP（行の最小値が k を
+  超えたら終了）、それ以外はビット並列で「残り文字数を全部一致させても k を超える」時点で終了する。
+- 外部ライブラリ不使用
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+# 帯 DP を使う帯幅の上限（これより広い帯はビット並列の方が速い）
+_BANDED_MAX_WIDTH = 5
+
+
+def _peq(pattern: str) -> dict[str, int]:
+    """パターンの各文字 → 出現位置のビットマスク"""
+    peq: dict[str, int] = {}
+    bit = 1
+    for c in pattern:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
+    return peq
+
+
+def _myers(pattern: str, text: str, max_distance: Optional[int] = None) -> int:
+    """
+    ビット並列で編集距離を計算する（pattern は空でないこと）
+
+    max_distance を渡すと、最終値が必ずそれを超えると分かった時点で max_distance + 1 を返す。
+    """
+    m = len(pattern)
+    peq = _peq(pattern)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    remaining = len(text)
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        remaining -= 1
+        # 残りの列で 1 ずつしか減らないため、これ以上は上限内に戻らない
+        if max_distance is not None and score - remaining > max_distance:
+            return max_distance + 1
+    return score
+
+
+def _banded(s1: str, s2: str, k: int) -> int:
+    """Ukkonen の帯 DP（|i - j| <= k のセルのみ）。k を超えたら k + 1 を返す"""
+    n1, n2 = len(s1), len(s2)
+    big = k + 1
+    prev = [j if j <= k else big for j in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        lo = max(1, i - k)
+        hi = min(n2, i + k)
+        curr = [big] * (n2 + 1)
+        if i <= k:
+            curr[0] = i
+        c1 = s1[i - 1]
+        row_min = curr[0] if lo == 1 else big
+        for j in range(lo, hi + 1):
+            v = prev[j - 1] + (c1 != s2[j - 1])
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if curr[j - 1] + 1 < v:
+                v = curr[j - 1] + 1
+            curr[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > k:
+            return big
+        prev = curr
+    return min(prev[n2], big)
+
+
+def levenshtein(s1: str, s2: str) -> int:
+    """レーベンシュタイン距離（ビット並列）"""
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if not s2:
+        return len(s1)
+    if s1 == s2:
+        return 0
+    # 短い方をパターン（ビット列）にする
+    return _myers(s2, s1)
+
+
+def levenshtein_within(s1: str, s2: str, max_distance: int) -> Optional[int]:
+    """
+    レーベンシュタイン距離が max_distance 以下ならその値、超えるなら None
+
+    しきい値判定だけが必要な呼び出し側向け。超えると分かった時点で計算を打ち切る。
+    """
+    if max_distance < 0:
+        return None
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if len(s1) - len(s2) > max_distance:
+        return None
+    if not s2:
+        return len(s1)
+    if s1 == s2:
+        return 0
+    if 2 * max_distance + 1 <= _BANDED_MAX_WIDTH:
+        d = _banded(s1, s2, max_distance)
+    else:
+        d = _myers(s2, s1, max_distance)
+    return d if d <= max_distance else None
+
+
+def levenshtein_similarity(s1: str, s2: str) -> float:
+    """1 - 距離 / 長い方の長さ（0.0–1.0、両方空なら 1.0）"""
+    longer = max(len(s1), len(s2))
+    if longer == 0:
+        return 1.0
+    return (longer - levenshtein(s1, s2)) / longer
+
+
+def max_distance_for(longer: int, min_similarity: float) -> int:
+    """levenshtein_similarity >= min_similarity となる距離の上限（長い方の長さ longer のとき）"""
+    # 浮動小数の誤差で境界の距離を落とさないよう少し余裕を持たせる
+    return int(longer * (1.0 - min_similarity) + 1e-9)
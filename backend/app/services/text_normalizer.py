@@ -0,0 +1,192 @@
+"""
+記述式回答の正規化（ai_evaluator の文字列照合用）
+
+evaluate_semantic_similarity は同じ文字列に NFKC・句読点除去・数字表現の統一・カタカナ→ひらがな
+を何度もかけていたため、1 つの文字列の正規化形をまとめて TextForms として 1 回で作る。
+
+- NFKC・小文字化のあとは str.translate の表（句読点・空白の削除、全角数字、カタカナ→ひらがな）
+- 漢数字・かなの数字表現はトライで全出現位置を 1 回の走査で求め、
+  従来の str.replace を _NUMBER_CONVERSIONS の順に繰り返した場合と同じ置換を選ぶ
+- 外部ライブラリ不使用
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# remove_punctuation で削除する記号（空白は str.isspace と同じ \s の全文字）
+_PUNCTUATION = "、。，．,!！?？;；:：'\"（）()[]【】『』「」-"
+
+# 句読点・空白を削除する表
+_CLEAN_TABLE = {ord(c): None for c in _PUNCTUATION}
+_CLEAN_TABLE.update({c: None for c in range(0x3001) if chr(c).isspace()})
+# カタカナ（ァ–ヶ）→ ひらがな
+_HIRAGANA_TABLE = {c: c - 0x60 for c in range(0x30A1, 0x30F7)}
+# 句読点削除とひらがな化を同時に行う表
+_CLEAN_HIRAGANA_TABLE = {**_CLEAN_TABLE, **_HIRAGANA_TABLE}
+# 全角数字 → 半角
+_FULLWIDTH_DIGIT_TABLE = {c: c - 0xFEE0 for c in range(0xFF10, 0xFF1A)}
+
+_KANJI_RE = re.compile(r'[\u4E00-\u9FFF]')
+_ONLY_KANA_RE = re.compile(r'[\u3040-\u309F\u30A0-\u30FF\s]+')
+_NUMBER_RE = re.compile(r'-?\d+\.?\d*')
+
+_NUMBER_CONVERSIONS: dict[str, list[str]] = {
+    '0': ['〇', 'ゼロ', 'ぜろ', '零', 'れい'],
+    '1': ['一', 'いち', 'ひとつ', '1つ'],
+    '2': ['二', 'に', 'ふたつ', '2つ'],
+    '3': ['三', 'さん', 'みっつ', '3つ'],
+    '4': ['四', 'よん', 'し', 'よっつ', '4つ'],
+    '5': ['五', 'ご', 'いつつ', '5つ'],
+    '6': ['六', 'ろく', 'むっつ', '6つ'],
+    '7': ['七', 'なな', 'しち', 'ななつ', '7つ'],
+    '8': ['八', 'はち', 'やっつ', '8つ'],
+    '9': ['九', 'きゅう', 'く', 'ここのつ', '9つ'],
+    '10': ['十', 'じゅう', 'とお'],
+}
+
+
+class _NumeralMatcher:
+    """
+    数字表現の置換（_NUMBER_CONVERSIONS を先頭から順に str.replace した結果と同じ）
+
+    置換後の文字は数字なので、「N つ」以外の表現は元の文字列の連続した文字にしか一致しない。
+    したがって各表現の出現位置を元の文字列上でトライにより一度に集め、優先順位
+    （辞書の順）の高いものから、既に置換された文字と重ならない出現を左から採用すればよい。
+    「N つ」は数字 N（元からある N か、N への置換結果）の直後のつを取り込む。
+    つで始まる表現はないため、この処理を最後にまとめて行っても結果は変わらない。
+    """
+
+    def __init__(self, conversions: dict[str, list[str]]):
+        self._trie: dict = {}
+        self._counter_digits: set[str] = set()
+        priority = 0
+        for digit, variants in conversions.items():
+            for variant in variants:
+                if variant == digit + 'つ':
+                    self._counter_digits.add(digit)
+                    continue
+                node = self._trie
+                for c in variant:
+                    node = node.setdefault(c, {})
+                # 同じ表現が複数あっても先の（優先順位の高い）方だけが効く
+                node.setdefault(None, (priority, len(variant), digit))
+                priority += 1
+
+    def _occurrences(self, text: str) -> list[tuple[int, int, int, str]]:
+        """全出現 (優先順位, 開始位置, 長さ, 数字)"""
+        found = []
+        trie = self._trie
+        for start in range(len(text)):
+            node = trie.get(text[start])
+            pos = start + 1
+            while node is not None:
+                hit = node.get(None)
+                if hit is not None:
+                    found.append((hit[0], start, hit[1], hit[2]))
+                if pos == len(text):
+                    break
+                node = node.get(text[pos])
+                pos += 1
+        return found
+
+    def replace(self, text: str) -> str:
+        occurrences = self._occurrences(text)
+        if not occurrences and 'つ' not in text:
+            return text
+
+        # 置換される区間: 開始位置 → (終了位置, 数字)
+        spans: dict[int, tuple[int, str]] = {}
+        consumed = bytearray(len(text))
+        for _, start, length, digit in sorted(occurrences):
+            end = start + length
+            if any(consumed[start:end]):
+                continue
+            spans[start] = (end, digit)
+            consumed[start:end] = b'\x01' * length
+
+        if 'つ' in text and self._counter_digits:
+            ends = {end: start for start, (end, _) in spans.items()}
+            for pos, c in enumerate(text):
+                if c != 'つ' or pos == 0 or consumed[pos]:
+                    continue
+                start = ends.get(pos)
+                if start is not None:
+                    digit = spans[start][1]
+                    if digit in self._counter_digits:
+                        spans[start] = (pos + 1, digit)
+                        consumed[pos] = 1
+                elif not consumed[pos - 1] and text[pos - 1] in self._counter_digits:
+                    spans[pos - 1] = (pos + 1, text[pos - 1])
+                    consumed[pos - 1:pos + 1] = b'\x01\x01'
+
+        if not spans:
+            return text
+        out = []
+        pos = 0
+        for start in sorted(spans):
+            end, digit = spans[start]
+            out.append(text[pos:start])
+            out.append(digit)
+            pos = end
+        out.append(text[pos:])
+        return ''.join(out)
+
+
+_NUMERALS = _NumeralMatcher(_NUMBER_CONVERSIONS)
+
+
+def normalize_text(text: str) -> str:
+    """NFKC・前後の空白除去・小文字化・連続する空白を 1 つに"""
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def remove_punctuation(text: str) -> str:
+    """日本語・英語の句読点や記号・空白を削除"""
+    return text.translate(_CLEAN_TABLE)
+
+
+def katakana_to_hiragana(text: str) -> str:
+    """カタカナをひらがなに変換"""
+    return text.translate(_HIRAGANA_TABLE)
+
+
+def normalize_numbers(text: str) -> str:
+    """数字表現を統一（全角→半角、漢数字・かな→アラビア数字）"""
+    return _NUMERALS.replace(text.translate(_FULLWIDTH_DIGIT_TABLE))
+
+
+@dataclass(frozen=True)
+class TextForms:
+    """1 つの文字列の正規化形（evaluate_semantic_similarity の各判定が使うもの）"""
+
+    raw: str
+    norm: str  # normalize_text
+    clean: str  # 句読点・空白を除いた norm
+    numeric: str  # clean の数字表現を統一したもの
+    hiragana: str  # norm のカタカナをひらがなにしたもの
+    clean_hiragana: str  # clean のカタカナをひらがなにしたもの
+    words: frozenset  # norm の空白区切りの単語
+    numbers: tuple  # raw に含まれる数値
+    kanji_count: int  # raw に含まれる漢字の数
+    only_kana: bool  # raw がかなと空白だけか
+
+
+def text_forms(text: str) -> TextForms:
+    """文字列の正規化形をまとめて作る（NFKC は 1 回だけ）"""
+    norm = normalize_text(text)
+    clean = norm.translate(_CLEAN_TABLE)
+    return TextForms(
+        raw=text,
+        norm=norm,
+        clean=clean,
+        # NFKC 後なので全角数字は残っていない
+        numeric=_NUMERALS.replace(clean),
+        hiragana=norm.translate(_HIRAGANA_TABLE),
+        clean_hiragana=norm.translate(_CLEAN_HIRAGANA_TABLE),
+        words=frozenset(norm.split()),
+        numbers=tuple(_NUMBER_RE.findall(text)),
+        kanji_count=len(_KANJI_RE.findall(text)),
+        only_kana=_ONLY_KANA_RE.fullmatch(text) is not None,
+    )
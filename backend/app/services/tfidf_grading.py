@@ -0,0 +1,336 @@
+"""
+問題集ごとの文字 n-gram TF-IDF による記述式の類似度
+
+レーベンシュタイン距離と bigram の重なり（ai_evaluator / embedding_grading）は表層の一致しか見ないため、
+語順の入れ替えや説明的な言い換えは低い類似度になる。問題集の正解・解説・教科書本文から
+文字 n-gram（既定 2〜3 文字）の TF-IDF を学習し、正解との余弦類似度で補う。
+
+- 語彙は整列済みの NumPy 文字列配列、IDF は float32 配列で持ち、回答の n-gram は searchsorted で引く
+- ベクトルは (語彙番号, 重み) の疎表現。余弦類似度は共通の語彙番号の重みの積和（L2 正規化済み）
+- 語彙にない n-gram は一致しようがないが、ノルムには最大の IDF で含める（無関係な文字を足した回答が満点にならない）
+- モデルは問題集ごとに LRU で保持し、問題集の文章が変わったら次の採点時に作り直す。変更は
+  問題数・正解/解説/教科書本文の文字数の合計（統計の更新では変わらない）と、問題・問題集の更新 API からの
+  invalidate で検知する（invalidate はプロセス内のみ。他のワーカーでは文字数が変わる変更だけ検知する）
+- 文章の読み込みはミス時だけ。ハッシュ計算と学習は採点プール（run_grading）で行い、イベントループを止めない
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import Question, QuestionSet
+from .grading_pool import run_grading
+from .text_normalizer import katakana_to_hiragana, normalize_text, remove_punctuation
+
+logger = logging.getLogger(__name__)
+
+NGRAM_RANGE = (2, 3)
+# 語彙の上限（文書頻度の高い順に残す）と、学習に使う教科書本文の上限文字数
+MAX_FEATURES = 100_000
+MAX_TEXTBOOK_CHARS = 200_000
+_MAX_CACHED_SETS = 64
+
+# 教科書本文を文書（文）に分ける区切り
+_SENTENCE_SPLIT = re.compile(r'[。！？!?\n]+|\.\s+')
+
+
+def _analyze(text: str) -> list[str]:
+    """正規化（NFKC・小文字・ひらがな・句読点と空白除去）した文字列の文字 n-gram"""
+    clean = remove_punctuation(katakana_to_hiragana(normalize_text(text)))
+    if not clean:
+        return []
+    low, high = NGRAM_RANGE
+    if len(clean) < low:
+        return [clean]
+    return [clean[i:i + n] for n in range(low, high + 1) for i in range(len(clean) - n + 1)]
+
+
+def answer_patterns(correct_answer: str) -> list[str]:
+    """正解（1 行目の / 区切り）のパターン（ai_evaluator の採点と同じ分け方）"""
+    first_line = (correct_answer or "").split('\n')[0].strip()
+    return [p.strip() for p in first_line.split('/') if p.strip()]
+
+
+@dataclass(frozen=True)
+class SparseVector:
+    """L2 正規化済みの疎ベクトル（indices は昇順）"""
+
+    indices: np.ndarray
+    weights: np.ndarray
+
+    def dot(self, other: "SparseVector") -> float:
+        if not len(self.indices) or not len(other.indices):
+            return 0.0
+        pos = np.searchsorted(other.indices, self.indices)
+        pos[pos >= len(other.indices)] = 0
+        shared = other.indices[pos] == self.indices
+        return float(np.dot(self.weights[shared], other.weights[pos[shared]]))
+
+
+@dataclass
+class TfidfModel:
+    """文字 n-gram TF-IDF（語彙・IDF）と、正解パターンのベクトル"""
+
+    terms: np.ndarray  # 整列済みの n-gram（Unicode 固定長配列）
+    idf: np.ndarray  # float32、terms と同じ並び
+    oov_idf: float  # 語彙にない n-gram の IDF（文書頻度 0 とみなす）
+    documents: int
+    content_hash: str = ""
+    _references: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def fit(cls, documents: Iterable[str], references: Iterable[str] = (), content_hash: str = "") -> "TfidfModel":
+        """
+        文書の集合から語彙と IDF を作る（IDF は平滑化版 ln((1+N)/(1+df)) + 1）
+
+        references（正解文字列）のパターンのベクトルは先に作っておく。
+        """
+        df: Counter = Counter()
+        n_docs = 0
+        for doc in documents:
+            grams = set(_analyze(doc))
+            if grams:
+                df.update(grams)
+                n_docs += 1
+        if len(df) > MAX_FEATURES:
+            df = Counter(dict(df.most_common(MAX_FEATURES)))
+        terms = sorted(df)
+        counts = np.array([df[t] for t in terms], dtype=np.float64)
+        idf = (np.log((1.0 + n_docs) / (1.0 + counts)) + 1.0).astype(np.float32)
+        model = cls(
+            terms=np.array(terms, dtype=f"<U{NGRAM_RANGE[1]}"),
+            idf=idf,
+            oov_idf=math.log(1.0 + n_docs) + 1.0,
+            documents=n_docs,
+            content_hash=content_hash,
+        )
+        for correct_answer in references:
+            model._reference_vectors(correct_answer)
+        return model
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.terms)
+
+    def vectorize(self, text: str) -> SparseVector:
+        """TF（1 + ln tf）× IDF を L2 正規化した疎ベクトル"""
+        counts = Counter(_analyze(text))
+        if not counts:
+            return SparseVector(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        grams = np.array(list(counts), dtype=self.terms.dtype)
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+        pos = np.searchsorted(self.terms, grams)
+        pos[pos >= len(self.terms)] = 0
+        known = (self.terms[pos] == grams) if len(self.terms) else np.zeros(len(grams), dtype=bool)
+
+        weights = tf[known] * self.idf[pos[known]]
+        oov_weights = tf[~known] * self.oov_idf
+        norm = math.sqrt(float(np.dot(weights, weights)) + float(np.dot(oov_weights, oov_weights)))
+        indices = pos[known].astype(np.int32)
+        order = np.argsort(indices)
+        return SparseVector(indices[order], (weights[order] / norm).astype(np.float32))
+
+    def _reference_vectors(self, correct_answer: str) -> list[SparseVector]:
+        vectors = self._references.get(correct_answer)
+        if vectors is None:
+            vectors = [self.vectorize(p) for p in answer_patterns(correct_answer)]
+            self._references[correct_answer] = vectors
+        return vectors
+
+    def similarity(self, user_answer: str, correct_answer: str) -> float:
+        """回答と正解（各パターンの最大）の余弦類似度 0〜1"""
+        answer = self.vectorize(user_answer)
+        if not len(answer.indices):
+            return 0.0
+        return max((answer.dot(ref) for ref in self._reference_vectors(correct_answer)), default=0.0)
+
+
+def rescore_with_tfidf(
+    evaluation: dict,
+    model: TfidfModel,
+    correct_answer: str,
+    user_answer: str,
+    threshold: float,
+) -> dict:
+    """
+    表層の採点（evaluate_text_answer）で不正解だった回答を TF-IDF の類似度で再判定する
+
+    不正解の評価には tfidf_similarity を加え、しきい値以上なら正解にする（信頼度は類似度、上限 0.9）。
+    """
+    if evaluation["is_correct"]:
+        return evaluation
+    similarity = round(model.similarity(user_answer, correct_answer), 4)
+    result = {**evaluation, "tfidf_similarity": similarity}
+    if similarity >= threshold:
+        result.update(
+            is_correct=True,
+            confidence=round(min(similarity, 0.9), 4),
+            feedback="表現は異なりますが、正解の要点を押さえています！",
+        )
+    return result
+
+
+def _set_signature(db: Session, question_set_id: str) -> Optional[tuple]:
+    """
+    問題集の文章が変わったかの目安（問題数と、正解・解説・教科書本文の文字数）。問題集がなければ None
+
+    回答ごとに更新される統計列や updated_at は使わない。
+    """
+    textbook_length = (
+        db.query(func.length(func.coalesce(QuestionSet.textbook_content, "")))
+        .filter(QuestionSet.id == question_set_id)
+        .first()
+    )
+    if textbook_length is None:
+        return None
+    count, answer_chars, explanation_chars = (
+        db.query(
+            func.count(Question.id),
+            func.coalesce(func.sum(func.length(Question.correct_answer)), 0),
+            func.coalesce(func.sum(func.length(func.coalesce(Question.explanation, ""))), 0),
+        )
+        .filter(Question.question_set_id == question_set_id)
+        .one()
+    )
+    return (count, answer_chars, explanation_chars, textbook_length[0])
+
+
+def _set_documents(db: Session, question_set_id: str) -> tuple[list[str], list[str]]:
+    """学習に使う文書（正解パターン・解説・教科書本文の文）と、問題の正解文字列"""
+    rows = (
+        db.query(Question.correct_answer, Question.explanation)
+        .filter(Question.question_set_id == question_set_id)
+        .order_by(Question.id)
+        .all()
+    )
+    textbook = db.query(QuestionSet.textbook_content).filter(QuestionSet.id == question_set_id).scalar() or ""
+    documents: list[str] = []
+    references: list[str] = []
+    for correct_answer, explanation in rows:
+        references.append(correct_answer or "")
+        documents.extend(answer_patterns(correct_answer))
+        if explanation:
+            documents.append(explanation)
+    documents.extend(s for s in _SENTENCE_SPLIT.split(textbook[:MAX_TEXTBOOK_CHARS]) if s.strip())
+    return documents, references
+
+
+def _content_hash(documents: list[str]) -> str:
+    digest = hashlib.sha1()
+    for doc in documents:
+        digest.update(doc.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def fit_set_model(documents: list[str], references: list[str], previous_hash: str = "") -> tuple[str, Optional[TfidfModel]]:
+    """
+    文章のハッシュと、それが previous_hash と違えば学習したモデル（同じなら None）
+
+    採点プールのワーカーで実行される。
+    """
+    content_hash = _content_hash(documents + ["\1"] + references)
+    if content_hash == previous_hash:
+        return content_hash, None
+    return content_hash, TfidfModel.fit(documents, references, content_hash=content_hash)
+
+
+@dataclass
+class _Entry:
+    signature: tuple
+    version: int
+    model: TfidfModel
+
+
+class TfidfModelCache:
+    """問題集ごとの TfidfModel（LRU）。問題集の内容が変わっていたら取得時に作り直す"""
+
+    def __init__(self, max_sets: int = _MAX_CACHED_SETS):
+        self._max_sets = max_sets
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self._versions: dict = {}
+
+    async def get(self, db: Session, question_set_id: str) -> Optional[TfidfModel]:
+        """問題集のモデル（問題集がなければ None）。作り直しは採点プールで行う"""
+        signature = _set_signature(db, question_set_id)
+        if signature is None:
+            return None
+        with self._lock:
+            version = self._versions.get(question_set_id, 0)
+            entry = self._entries.get(question_set_id)
+            if entry is not None and entry.signature == signature and entry.version == version:
+                self._entries.move_to_end(question_set_id)
+                self.hits += 1
+                return entry.model
+
+        documents, references = _set_documents(db, question_set_id)
+        started = time.perf_counter()
+        content_hash, model = await run_grading(
+            fit_set_model, documents, references, entry.model.content_hash if entry else ""
+        )
+        built = model is not None
+        if built:
+            logger.info(
+                f"Built TF-IDF model for set {question_set_id}: {model.documents} docs, "
+                f"{model.vocabulary_size} terms in {time.perf_counter() - started:.3f}s"
+            )
+        else:
+            # 更新 API は呼ばれたが学習に使う文章は同じ
+            model = entry.model
+        with self._lock:
+            self.misses += 1
+            self.builds += int(built)
+            self._entries[question_set_id] = _Entry(signature, version, model)
+            self._entries.move_to_end(question_set_id)
+            while len(self._entries) > self._max_sets:
+                self._entries.popitem(last=False)
+        return model
+
+    def invalidate(self, question_set_id: str) -> None:
+        """問題・問題集の更新後に呼ぶ（次の取得時に文章を読み直す）"""
+        with self._lock:
+            self._versions[question_set_id] = self._versions.get(question_set_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached_sets": len(self._entries),
+                "max_sets": self._max_sets,
+                "hits": self.hits,
+                "misses": self.misses,
+                "builds": self.builds,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_tfidf_model_cache: Optional[TfidfModelCache] = None
+
+
+def get_tfidf_model_cache() -> TfidfModelCache:
+    global _tfidf_model_cache
+    if _tfidf_model_cache is None:
+        from ..core.config import settings
+
+        _tfidf_model_cache = TfidfModelCache(max_sets=settings.TFIDF_MODEL_CACHE_SIZE)
+    return _tfidf_model_cache
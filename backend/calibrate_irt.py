@@ -0,0 +1,44 @@
+"""
+IRT（2PL）の問題パラメータ（識別力・困難度）と学習者能力を answers から推定し直す。
+
+メンテナンス時間帯向けのオフラインバッチ。問題集ごとに 1 トランザクションで較正する。
+特定の問題集だけ較正する場合は --set を指定する（管理画面の POST /admin/irt/{id}/calibrate と同じ）。
+
+    python calibrate_irt.py                        # 回答のある全問題集
+    python calibrate_irt.py --set QUESTION_SET_ID  # 1 問題集
+    python calibrate_irt.py --chunk-size 100000 --max-iter 200
+"""
+import argparse
+import logging
+
+from app.core.database import SessionLocal
+from app.ai.irt import calibrate_all_question_sets, calibrate_question_set
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibrate 2PL IRT parameters from answers")
+    parser.add_argument("--set", dest="question_set_id", help="較正する問題集ID（省略時は全問題集）")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="1 回に読み込む集計行数")
+    parser.add_argument("--max-iter", type=int, default=100, help="最大反復数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.question_set_id:
+        db = SessionLocal()
+        try:
+            summary = calibrate_question_set(
+                db, args.question_set_id, chunk_size=args.chunk_size, max_iter=args.max_iter
+            )
+            db.commit()
+        finally:
+            db.close()
+        print(f"Calibrated question set {args.question_set_id}: {summary}")
+        return
+
+    total = calibrate_all_question_sets(SessionLocal, chunk_size=args.chunk_size, max_iter=args.max_iter)
+    print(f"Calibrated {total} question sets")
+
+
+if __name__ == "__main__":
+    main()
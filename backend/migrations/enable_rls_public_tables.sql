@@ -17,6 +17,15 @@ ALTER TABLE public.processed_checkout_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.content_reports ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.copyright_check_records ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.otp_codes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.question_stat_shards ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.learner_cluster_models ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.cluster_question_misses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_srs_state ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_ratings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_irt_abilities ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_daily_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.question_rubric_items ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.question_misconceptions ENABLE ROW LEVEL SECURITY;
 
 -- Alembic 利用時のみ（テーブルが無い環境では何もしない）
 DO $$
@@ -0,0 +1,46 @@
+"""
+ユーザー統計（user_question_stats / user_category_stats / user_daily_rollups）を answers から作り直す。
+user_daily_rollups 追加直後のバックフィルにも使う。
+
+メンテナンス時間帯向け。全ユーザーをチャンクに分けて並列に再構築する。
+特定ユーザーだけ直す場合は --user を指定する。
+
+    python rebuild_stats.py                     # 全ユーザー
+    python rebuild_stats.py --user USER_ID      # 1 ユーザー
+    python rebuild_stats.py --chunk-size 500 --workers 8
+"""
+import argparse
+import logging
+
+from app.core.database import SessionLocal
+from app.ai.stats_updater import StatsUpdater
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild user stats from answers")
+    parser.add_argument("--user", help="再構築するユーザーID（省略時は全ユーザー）")
+    parser.add_argument("--chunk-size", type=int, default=200, help="1 トランザクションあたりのユーザー数")
+    parser.add_argument("--workers", type=int, default=4, help="並列数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.user:
+        db = SessionLocal()
+        try:
+            StatsUpdater(db).recalculate_all_stats(args.user)
+        finally:
+            db.close()
+        print(f"Rebuilt stats for user {args.user}")
+        return
+
+    total = StatsUpdater.recalculate_all_users_stats(
+        SessionLocal,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+    )
+    print(f"Rebuilt stats for {total} users")
+
+
+if __name__ == "__main__":
+    main()
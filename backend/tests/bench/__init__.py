@@ -0,0 +1 @@
+# grading micro-benchmarks
@@ -0,0 +1,174 @@
+"""
+採点ベンチマーク用のコーパス
+
+docs/sample_questions.csv と docs/csv/*.csv（問題集 CSV。リポジトリにない環境では
+bundle_metadata.json の問題集名だけ）から正解文字列を集め、学習者の回答の揺れを模した
+変種（大文字小文字・全角・空白、かな/カナ/漢字/ローマ字、漢数字、誤字、途中まで、長い説明付き、無関係）
+を作る。docs の英語の問題だけでは日本語の表記揺れが出ないため、日本語の語句は JA_TERMS を併用する。
+乱数のシードを固定しているので、同じ docs からは毎回同じコーパスになる。
+"""
+from __future__ import annotations
+
+import csv
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.services.embedding_grading import MisconceptionItem, RubricItem
+
+DOCS_DIR = Path(__file__).resolve().parents[3] / "docs"
+
+# (表記, ひらがな, ローマ字)
+JA_TERMS = [
+    ("東京", "とうきょう", "toukyou"),
+    ("決定木", "けっていぎ", "ketteigi"),
+    ("勾配降下法", "こうばいこうかほう", "koubaikoukahou"),
+    ("過学習", "かがくしゅう", "kagakushuu"),
+    ("正則化", "せいそくか", "seisokuka"),
+    ("特徴量", "とくちょうりょう", "tokuchouryou"),
+    ("目的変数", "もくてきへんすう", "mokutekihensuu"),
+    ("交差検証", "こうさけんしょう", "kousakenshou"),
+    ("活性化関数", "かっせいかかんすう", "kasseikakansuu"),
+    ("三角形", "さんかくけい", "sankakukei"),
+    ("十二", "じゅうに", "juuni"),
+    ("光合成", "こうごうせい", "kougousei"),
+]
+
+RUBRIC_TEXTS = [
+    "目的関数を最小化するための反復的な最適化手法である",
+    "勾配に基づいてパラメータを更新する",
+    "学習率が大きすぎると発散する",
+    "訓練データに過剰に適合して汎化性能が下がる",
+    "gradient descent updates parameters iteratively",
+    "regularization penalizes large weights",
+]
+
+MISCONCEPTION_PHRASES = [
+    ("最大化と混同", ["目的関数を最大化する", "値を大きくする方法"]),
+    ("一度で解が求まる", ["一回の計算で最適解が求まる", "すぐに答えが出る"]),
+    ("学習率は大きいほど良い", ["学習率は大きいほど速く正確", "学習率を上げれば必ず良くなる"]),
+    ("過学習は精度が高い状態", ["訓練データの精度が高いので良いモデル", "過学習は良いこと"]),
+    ("confuses with random search", ["tries random parameters", "random guessing of weights"]),
+]
+
+
+@dataclass
+class BenchCorpus:
+    # (正解, 回答)
+    text_cases: list[tuple[str, str]] = field(default_factory=list)
+    # text_similarity に渡す 2 文
+    similarity_pairs: list[tuple[str, str]] = field(default_factory=list)
+    rubrics: list[RubricItem] = field(default_factory=list)
+    misconceptions: list[MisconceptionItem] = field(default_factory=list)
+    # ルーブリック採点・誤概念分類に渡す記述式の回答
+    essay_answers: list[str] = field(default_factory=list)
+
+
+def _question_rows() -> list[dict]:
+    rows: list[dict] = []
+    paths = [DOCS_DIR / "sample_questions.csv", *sorted((DOCS_DIR / "csv").glob("*.csv"))]
+    for path in paths:
+        if not path.exists():
+            continue
+        with path.open(encoding="utf-8-sig", newline="") as f:
+            rows.extend(r for r in csv.DictReader(f) if r.get("correct_answer"))
+    return rows
+
+
+def _bundle_titles() -> list[str]:
+    path = DOCS_DIR / "csv" / "bundle_metadata.json"
+    if not path.exists():
+        return []
+    return [meta.get("title", "") for meta in json.loads(path.read_text(encoding="utf-8")).values()]
+
+
+def _correct_text(row: dict) -> str:
+    """選択肢番号の正解は選択肢本文にする"""
+    answer = row["correct_answer"].strip()
+    options = [o.strip() for o in (row.get("options") or "").split(",") if o.strip()]
+    if answer.isdigit() and options and 1 <= int(answer) <= len(options) and answer not in options:
+        return options[int(answer) - 1]
+    return answer
+
+
+def _fullwidth(text: str) -> str:
+    return "".join(chr(ord(c) + 0xFEE0) if "!" <= c <= "~" else c for c in text)
+
+
+def _katakana(text: str) -> str:
+    return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text)
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    if len(text) < 2:
+        return text + text
+    i = rng.randrange(len(text) - 1)
+    op = rng.choice(("swap", "drop", "dup"))
+    if op == "swap":
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if op == "drop":
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i] + text[i:]
+
+
+def _variants(rng: random.Random, correct: str, extra: str, unrelated: str) -> list[str]:
+    return [
+        correct,
+        f"  {correct.upper()} ",
+        _fullwidth(correct),
+        _typo(rng, correct),
+        correct[: max(1, len(correct) // 2)],
+        f"{correct}。{extra}",
+        unrelated,
+    ]
+
+
+def build_corpus(seed: int = 0) -> BenchCorpus:
+    rng = random.Random(seed)
+    corpus = BenchCorpus()
+
+    rows = _question_rows()
+    answers = [_correct_text(r) for r in rows]
+    titles = [t for t in _bundle_titles() if t]
+    pool = answers + titles + [t for t, _, _ in JA_TERMS]
+    for row, correct in zip(rows, answers):
+        extra = (row.get("explanation") or "")[:80]
+        for answer in _variants(rng, correct, extra, rng.choice(pool)):
+            corpus.text_cases.append((correct, answer))
+    for title in titles:
+        for answer in _variants(rng, title, "", rng.choice(pool)):
+            corpus.text_cases.append((title, answer))
+    for term, kana, romaji in JA_TERMS:
+        correct = f"{term}/{kana}"
+        for answer in [
+            term,
+            kana,
+            _katakana(kana),
+            romaji,
+            _typo(rng, kana),
+            f"{term}です",
+            f"{term}（{kana}）とは{rng.choice(RUBRIC_TEXTS)}",
+            rng.choice(pool),
+        ]:
+            corpus.text_cases.append((correct, answer))
+
+    texts = [a for _, a in corpus.text_cases] + RUBRIC_TEXTS
+    for _ in range(300):
+        corpus.similarity_pairs.append((rng.choice(texts), rng.choice(texts)))
+
+    corpus.rubrics = [RubricItem(id=f"R{i}", text=t, weight=1.0 + i % 2) for i, t in enumerate(RUBRIC_TEXTS)]
+    corpus.misconceptions = [
+        MisconceptionItem(id=f"M{i}", label=label, example_phrases=phrases)
+        for i, (label, phrases) in enumerate(MISCONCEPTION_PHRASES)
+    ]
+
+    phrases = RUBRIC_TEXTS + [p for _, ps in MISCONCEPTION_PHRASES for p in ps]
+    for _ in range(200):
+        parts = rng.sample(phrases, rng.randint(1, 3))
+        answer = "。".join(_typo(rng, p) if rng.random() < 0.3 else p for p in parts)
+        if rows and rng.random() < 0.2:
+            answer += "。" + (rng.choice(rows).get("explanation") or "")
+        corpus.essay_answers.append(answer)
+    corpus.essay_answers += ["", "わかりません", "a"]
+    return corpus
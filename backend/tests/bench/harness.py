@@ -0,0 +1,166 @@
+"""
+記述式採点のマイクロベンチマーク
+
+grade_text_answer / text_similarity / score_with_rubric / classify_misconceptions を
+corpus.build_corpus() の全ケースで 1 回ずつ呼び（warmup 後）、1 呼び出しごとの時間の p50 / p95（マイクロ秒）を出す。
+記述式の採点は async の evaluate_text_answer ではなく同期の grade_text_answer を直接測る
+（前者はスレッドプールへの受け渡しの時間がほとんどを占めるため）。
+
+マシンの速さの違いを吸収するため、純 Python の固定処理（_calibrate）の時間も測って一緒に保存し、
+比較時はベースラインをその比で換算する。
+
+    python -m tests.bench.harness                    # 計測して表示
+    python -m tests.bench.harness --update-baseline  # baseline.json を書き換える
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+from app.services.ai_evaluator import grade_text_answer
+from app.services.embedding_grading import (
+    classify_misconceptions,
+    get_compiled_rubric_cache,
+    score_with_rubric,
+    text_similarity,
+)
+
+from .corpus import BenchCorpus, build_corpus
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# 各関数の計測を繰り返す回数（それぞれの p50 / p95 の中央値を使う）
+DEFAULT_ROUNDS = 3
+# ベースラインに対する許容倍率（CLI と pytest で共通。CI など遅く不安定な環境では大きくする）
+DEFAULT_TOLERANCE = float(os.environ.get("GRADING_BENCH_TOLERANCE", "3.0"))
+
+
+def _percentiles(samples_ns: list[int]) -> dict:
+    ordered = sorted(samples_ns)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "p50_us": round(statistics.median(ordered) / 1000.0, 2),
+        "p95_us": round(ordered[p95_index] / 1000.0, 2),
+        "calls": len(ordered),
+    }
+
+
+def _time_calls(fn: Callable, cases: Iterable[tuple]) -> list[int]:
+    samples = []
+    for args in cases:
+        started = time.perf_counter_ns()
+        fn(*args)
+        samples.append(time.perf_counter_ns() - started)
+    return samples
+
+
+def _calibrate() -> int:
+    """マシンの速さの目安（文字列・dict を使う純 Python の固定処理の時間、ns）"""
+    best = None
+    for _ in range(5):
+        started = time.perf_counter_ns()
+        counts: dict = {}
+        for i in range(20000):
+            key = str(i % 97) + "あ"
+            counts[key] = counts.get(key, 0) + len(key)
+        elapsed = time.perf_counter_ns() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _benchmarks(corpus: BenchCorpus) -> dict[str, tuple[Callable, list[tuple]]]:
+    """名前 → (関数, 引数のリスト)"""
+    return {
+        "grade_text_answer": (
+            grade_text_answer,
+            [("", correct, answer) for correct, answer in corpus.text_cases],
+        ),
+        "text_similarity": (text_similarity, corpus.similarity_pairs),
+        "score_with_rubric": (
+            score_with_rubric,
+            [(answer, corpus.rubrics) for answer in corpus.essay_answers],
+        ),
+        "classify_misconceptions": (
+            classify_misconceptions,
+            [(answer, corpus.misconceptions) for answer in corpus.essay_answers],
+        ),
+    }
+
+
+def run_benchmarks(rounds: int = DEFAULT_ROUNDS) -> dict:
+    """全関数を計測し {"calibration_ns", "results": {名前: {p50_us, p95_us, calls}}} を返す"""
+    corpus = build_corpus()
+    get_compiled_rubric_cache().clear()
+    results = {}
+    for name, (fn, cases) in _benchmarks(corpus).items():
+        _time_calls(fn, cases[:20])  # warmup（コンパイル済みルーブリックの LRU なども温める）
+        runs = [_percentiles(_time_calls(fn, cases)) for _ in range(rounds)]
+        results[name] = {
+            "p50_us": statistics.median(r["p50_us"] for r in runs),
+            "p95_us": statistics.median(r["p95_us"] for r in runs),
+            "calls": runs[0]["calls"],
+        }
+    return {"calibration_ns": _calibrate(), "results": results}
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def find_regressions(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    ベースラインより遅くなった関数の説明（p50 / p95 がマシン換算後のベースラインの tolerance 倍を超えたもの）
+
+    ベースラインにない関数は比較しない。
+    """
+    scale = current["calibration_ns"] / baseline["calibration_ns"] if baseline.get("calibration_ns") else 1.0
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        for key in ("p50_us", "p95_us"):
+            limit = base[key] * scale * tolerance
+            if now[key] > limit:
+                regressions.append(
+                    f"{name} {key}: {now[key]:.1f}us > {limit:.1f}us "
+                    f"(baseline {base[key]:.1f}us x machine {scale:.2f} x tolerance {tolerance})"
+                )
+    return regressions
+
+
+def format_report(current: dict) -> str:
+    lines = [f"{'function':<26}{'calls':>7}{'p50 (us)':>12}{'p95 (us)':>12}"]
+    for name, r in current["results"].items():
+        lines.append(f"{name:<26}{r['calls']:>7}{r['p50_us']:>12.1f}{r['p95_us']:>12.1f}")
+    lines.append(f"calibration: {current['calibration_ns'] / 1e6:.2f} ms")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="記述式採点のマイクロベンチマーク")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--update-baseline", action="store_true", help="baseline.json を今回の結果で書き換える")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.rounds)
+    print(format_report(current))
+    if args.update_baseline:
+        BASELINE_PATH.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"baseline written: {BASELINE_PATH}")
+        return
+    if BASELINE_PATH.exists():
+        regressions = find_regressions(current, load_baseline(), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+記述式採点のマイクロベンチマーク（tests/bench/harness.py）のテスト
+
+- 各関数の p50 / p95 が baseline.json（マシンの速さで換算）の許容倍率以内であること
+  （倍率は GRADING_BENCH_TOLERANCE、既定 3.0。CLI の --tolerance の既定も同じ）
+- コーパスの表記揺れ（全角・カナ・空白）が正解として採点されること
+
+ベースラインの更新: `python -m tests.bench.harness --update-baseline`
+"""
+import sys
+from pathlib import Path
+
+backend = Path(__file__).resolve().parents[2]
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.services.ai_evaluator import grade_text_answer  # noqa: E402
+from tests.bench.corpus import JA_TERMS, _fullwidth, _katakana, build_corpus  # noqa: E402
+from tests.bench.harness import (  # noqa: E402
+    DEFAULT_TOLERANCE,
+    find_regressions,
+    format_report,
+    load_baseline,
+    run_benchmarks,
+)
+
+
+def test_corpus_is_deterministic():
+    first, second = build_corpus(), build_corpus()
+    assert first.text_cases == second.text_cases
+    assert first.essay_answers == second.essay_answers
+    assert len(first.text_cases) > 100 and len(first.similarity_pairs) == 300
+
+
+def test_spelling_variants_are_correct():
+    def grade(correct, answer):
+        return grade_text_answer("", correct, answer)["is_correct"]
+
+    for term, kana, _ in JA_TERMS[:4]:
+        correct = f"{term}/{kana}"
+        for answer in (term, f" {term} ", kana, _katakana(kana)):
+            assert grade(correct, answer), (correct, answer)
+    assert grade("Paris", _fullwidth("paris"))
+
+
+def test_no_regression_against_baseline():
+    baseline = load_baseline()
+    current = run_benchmarks(rounds=1)
+    assert set(current["results"]) == set(baseline["results"])
+    regressions = find_regressions(current, baseline, DEFAULT_TOLERANCE)
+    assert not regressions, "\n".join(regressions) + "\n" + format_report(current)
+
+
+def test_find_regressions_scales_by_calibration():
+    baseline = {"calibration_ns": 1000, "results": {"f": {"p50_us": 10.0, "p95_us": 20.0}}}
+    slow_machine = {"calibration_ns": 2000, "results": {"f": {"p50_us": 25.0, "p95_us": 50.0}}}
+    assert find_regressions(slow_machine, baseline, tolerance=1.5) == []
+    regressed = {"calibration_ns": 1000, "results": {"f": {"p50_us": 10.0, "p95_us": 45.0}}}
+    assert [r.split(":")[0] for r in find_regressions(regressed, baseline, tolerance=2.0)] == ["f p95_us"]
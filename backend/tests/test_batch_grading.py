@@ -0,0 +1,111 @@
+"""
+記述式の一括採点のテスト
+
+- 疎行列積で求めた共通トークン数が集合の積と一致すること
+- 一括採点の結果が 1 件ずつ evaluate_compiled した場合と同じこと
+- POST /api/v1/answers/evaluate-text-with-rubric/batch が回答の順に結果を返すこと
+"""
+import random
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import Question  # noqa: E402
+from app.services.batch_grading import evaluate_compiled_batch, similarity_matrix  # noqa: E402
+from app.services.embedding_grading import (  # noqa: E402
+    CompiledRubric,
+    compile_text,
+    compiled_similarity,
+    evaluate_compiled,
+    to_legacy_evaluation_format,
+)
+from tests.test_embedding_grading import ANSWERS, MISCONCEPTIONS, RUBRICS  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, _seed_sessionmaker  # noqa: E402
+
+WORDS = ["勾配", "降下", "法", "目的関数", "最小化", "最大化", "パラメータ", "更新", "学習率", "発散", "する", "です"]
+
+
+def _class_answers(n=120, seed=0):
+    rng = random.Random(seed)
+    answers = [rng.choice(ANSWERS) for _ in range(n // 3)]
+    answers += ["".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))) for _ in range(n - len(answers))]
+    answers += ["", "x"]
+    rng.shuffle(answers)
+    return answers
+
+
+def test_similarity_matrix_matches_pairwise():
+    answers = [compile_text(a) for a in _class_answers() if a]
+    targets = [compile_text(r.text) for r in RUBRICS] + [compile_text(p) for m in MISCONCEPTIONS for p in m.example_phrases]
+    for threshold in (0.0, 0.58, 0.65):
+        sims = similarity_matrix(answers, targets, threshold)
+        for i, a in enumerate(answers):
+            for j, t in enumerate(targets):
+                assert sims[i, j] == compiled_similarity(a, t, threshold), (a.text, t.text)
+
+
+def test_batch_results_match_single_evaluation():
+    compiled = CompiledRubric.build(RUBRICS, MISCONCEPTIONS)
+    answers = _class_answers()
+    batch = evaluate_compiled_batch(answers, compiled)
+    assert len(batch) == len(answers)
+    for answer, result in zip(answers, batch):
+        assert result == evaluate_compiled(answer, compiled), answer
+    assert any(r.misconceptions for r in batch)
+    assert any(r.normalized_score > 0 for r in batch)
+
+
+def test_batch_endpoint():
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    question = db.get(Question, QUESTION_IDS[0])
+    question.question_type = "text_input"
+    db.commit()
+    db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    try:
+        client = TestClient(app)
+        body = {
+            "question_id": QUESTION_IDS[0],
+            "user_answers": ANSWERS,
+            "rubrics": [{"id": r.id, "text": r.text, "weight": r.weight} for r in RUBRICS],
+            "misconceptions": [
+                {"id": m.id, "label": m.label, "example_phrases": m.example_phrases} for m in MISCONCEPTIONS
+            ],
+        }
+        r = client.post("/api/v1/answers/evaluate-text-with-rubric/batch", json=body)
+        assert r.status_code == 200, r.text
+        assert r.json()["count"] == len(ANSWERS)
+        compiled = CompiledRubric.build(RUBRICS, MISCONCEPTIONS)
+        assert r.json()["results"] == [
+            to_legacy_evaluation_format(evaluate_compiled(a, compiled)) for a in ANSWERS
+        ]
+
+        single = client.post(
+            "/api/v1/answers/evaluate-text-with-rubric",
+            json={**{k: v for k, v in body.items() if k != "user_answers"}, "user_answer": ANSWERS[1]},
+        )
+        assert single.json() == r.json()["results"][1]
+
+        r = client.post(
+            "/api/v1/answers/evaluate-text-with-rubric/batch",
+            json={**body, "question_id": QUESTION_IDS[1]},
+        )
+        assert r.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
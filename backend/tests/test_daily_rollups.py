@@ -0,0 +1,60 @@
+"""
+日次集計（user_daily_rollups）のテスト（インメモリ SQLite）。
+
+- StatsUpdater の増分（ORM 経路・ON CONFLICT 経路）と answers からの再構築が同じ行になること
+- 日次集計の合計が answers を直接数えた値と一致すること
+"""
+import itertools
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy.dialects import sqlite
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.models import UserDailyRollup  # noqa: E402
+from app.ai.daily_rollups import rebuild_daily_rollups, rollup_totals  # noqa: E402
+from app.ai.stats_updater import StatsUpdater  # noqa: E402
+from tests.test_stats_updater import USER_IDS, _insert_answers, _random_batches, _seed_session  # noqa: E402
+
+
+def _rollups(db):
+    return {
+        (r.user_id, str(r.day), r.question_set_id, r.category): (r.attempts, r.correct_count, r.time_sum)
+        for r in db.query(UserDailyRollup).all()
+    }
+
+
+@pytest.mark.parametrize("sql_path", [False, True])
+def test_incremental_rollups_match_rebuild(monkeypatch, sql_path):
+    batches = _random_batches()
+    events = list(itertools.chain.from_iterable(batches))
+    db = _seed_session()
+    _insert_answers(db, events)
+
+    updater = StatsUpdater(db)
+    if sql_path:
+        monkeypatch.setattr(updater, "_upsert_insert", lambda: sqlite.insert)
+    for batch in batches:
+        updater.update_on_answers(batch)
+    db.commit()
+    incremental = _rollups(db)
+    assert incremental
+    assert sum(v[0] for v in incremental.values()) == len(events)
+
+    rebuild_daily_rollups(db, USER_IDS)
+    db.commit()
+    rebuilt = _rollups(db)
+    assert rebuilt.keys() == incremental.keys()
+    for key in incremental:
+        assert rebuilt[key] == pytest.approx(incremental[key]), key
+
+    for uid in USER_IDS:
+        mine = [e for e in events if e.user_id == uid]
+        totals = rollup_totals(db, uid).one()
+        assert totals.total == len(mine)
+        assert totals.correct == sum(e.is_correct for e in mine)
+        assert totals.time_sum == pytest.approx(sum(e.answer_time_sec for e in mine))
@@ -3,6 +3,7 @@ embedding_grading サービスのテスト
 
 - ユニット: text_similarity, _partial_score, 空入力, to_legacy_evaluation_format など
 - 統合: score_with_rubric（独自テキスト類似度ベース、外部ライブラリ不要）
+- CompiledRubric: 枝刈りしても部分点・誤概念の結果が全組の類似度計算と同じこと、LRU で再利用されること
 """
 import sys
 from pathlib import Path
@@ -16,6 +17,10 @@ import pytest
 from app.services.embedding_grading import (
     text_similarity,
     RubricItem,
+    MisconceptionItem,
+    classify_misconceptions,
+    evaluate_with_rubric_and_misconceptions,
+    get_compiled_rubric_cache,
     RubricScoreDetail,
     MisconceptionMatch,
     EmbeddingGradingResult,
@@ -151,3 +156,110 @@ def test_score_with_rubric_integration():
 
     result_low = score_with_rubric("わかりません", rubrics)
     assert result_low.normalized_score <= result.normalized_score
+
+
+RUBRICS = [
+    RubricItem(id="R1", text="目的関数を最小化するための反復的な最適化手法である", weight=2.0),
+    RubricItem(id="R2", text="勾配に基づいてパラメータを更新する", weight=1.0),
+    RubricItem(id="R3", text="学習率が大きすぎると発散する", weight=1.0),
+    RubricItem(id="R4", text="gradient descent updates parameters", weight=1.0),
+]
+MISCONCEPTIONS = [
+    MisconceptionItem(id="M1", label="最大化と混同", example_phrases=["目的関数を最大化する", "値を大きくする方法"]),
+    MisconceptionItem(id="M2", label="一度で解が求まる", example_phrases=["一回の計算で最適解が求まる"]),
+    MisconceptionItem(id="M3", label="空", example_phrases=[]),
+]
+ANSWERS = [
+    "損失を減らすために、勾配の逆方向にパラメータを少しずつ更新する方法です。",
+    "目的関数を最小化する反復的な最適化手法で、勾配に基づいてパラメータを更新する。",
+    "目的関数を最大化する方法",
+    "一回の計算で最適解が求まる",
+    "学習率が大きすぎると発散します",
+    "Gradient descent updates the parameters.",
+    "わかりません",
+    "あ",
+]
+
+
+def test_compiled_rubric_matches_unpruned_similarity():
+    get_compiled_rubric_cache().clear()
+    for answer in ANSWERS:
+        result = score_with_rubric(answer, RUBRICS)
+        for r, d in zip(RUBRICS, result.details):
+            exact = text_similarity(answer, r.text)
+            assert d.partial_score == mod._partial_score(
+                exact, DEFAULT_FULL_MATCH_THRESHOLD, DEFAULT_PARTIAL_MATCH_THRESHOLD
+            )
+            assert d.similarity == (round(exact, 4) if d.partial_score > 0 else None)
+
+        expected = []
+        for mc in MISCONCEPTIONS:
+            sims = [text_similarity(answer, p) for p in mc.example_phrases]
+            if sims and max(sims) >= 0.65:
+                expected.append((mc.id, round(max(sims), 4)))
+        expected.sort(key=lambda x: -x[1])
+        got = classify_misconceptions(answer, MISCONCEPTIONS)
+        assert [(m.misconception_id, m.similarity) for m in got] == expected[:3]
+
+
+def test_compiled_rubric_is_reused_per_content():
+    cache = get_compiled_rubric_cache()
+    cache.clear()
+    before = cache.metrics()
+    for answer in ANSWERS:
+        evaluate_with_rubric_and_misconceptions(answer, RUBRICS, MISCONCEPTIONS)
+    after = cache.metrics()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == len(ANSWERS) - 1
+
+    # 内容が変われば別のエントリになる
+    edited = [RubricItem(id="R1", text="別の観点", weight=1.0)]
+    evaluate_with_rubric_and_misconceptions(ANSWERS[0], edited, MISCONCEPTIONS)
+    assert cache.metrics()["misses"] - before["misses"] == 2
+
+
+def test_misconceptions_without_rubrics():
+    result = evaluate_with_rubric_and_misconceptions("目的関数を最大化する", [], MISCONCEPTIONS)
+    assert result.max_raw == 0.0
+    assert [m.misconception_id for m in result.misconceptions] == ["M1"]
+
+
+def test_phrase_index_keeps_top_k_and_prunes_candidates(monkeypatch):
+    import random
+
+    rng = random.Random(0)
+    words = ["目的関数", "最大化", "最小化", "勾配", "一回", "計算", "最適解", "求まる", "する", "値", "大きく", "学習率"]
+    catalogue = MISCONCEPTIONS + [
+        MisconceptionItem(
+            id=f"X{i}",
+            label=f"誤概念{i}",
+            example_phrases=["".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(3)],
+        )
+        for i in range(200)
+    ]
+    compiled = mod.CompiledRubric.build([], catalogue)
+    answers = ANSWERS + ["".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(100)]
+
+    calls = 0
+    original = mod.compiled_similarity
+
+    def counting(*args):
+        nonlocal calls
+        calls += 1
+        return original(*args)
+
+    monkeypatch.setattr(mod, "compiled_similarity", counting)
+    for answer in answers:
+        text = mod.compile_text(answer)
+        full = [[original(text, p, 0.65) for p in phrases] for phrases in compiled.misconception_phrases]
+        assert compiled.classify(text) == compiled.classify_from_similarities(full), answer
+        # しきい値が低いと転置インデックスは使えない（全件と同じ）
+        full_low = [[original(text, p, 0.5) for p in phrases] for phrases in compiled.misconception_phrases]
+        assert compiled.classify(text, 0.5) == compiled.classify_from_similarities(full_low, 0.5)
+
+    phrases = sum(len(m.example_phrases) for m in catalogue)
+    calls = 0
+    for answer in answers:
+        compiled.classify(mod.compile_text(answer))
+    # 語彙の少ない合成データでも、類似度を計算するのは全フレーズの一部だけ
+    assert calls < len(answers) * phrases / 2
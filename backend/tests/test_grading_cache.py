@@ -0,0 +1,123 @@
+"""
+記述式採点結果のキャッシュのテスト
+
+- 同じ問題・同じ回答（前後の空白違いを含む）の 2 回目はキャッシュから返り、ヒット率に数えられること
+- 問題のバージョンを上げると古い結果が使われないこと
+- 一括採点でキャッシュ済みの回答と未採点の回答が混ざっても、結果がキャッシュなしの場合と同じこと
+"""
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import Question  # noqa: E402
+from app.services.embedding_grading import (  # noqa: E402
+    CompiledRubric,
+    evaluate_compiled,
+    to_legacy_evaluation_format,
+)
+from app.services.grading_cache import GradingCache, get_grading_cache  # noqa: E402
+from tests.test_embedding_grading import ANSWERS, MISCONCEPTIONS, RUBRICS  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, _seed_sessionmaker  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    question = db.get(Question, QUESTION_IDS[0])
+    question.question_type = "text_input"
+    question.correct_answer = "東京/とうきょう"
+    db.commit()
+    db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    get_grading_cache().clear()
+    app.dependency_overrides[get_db] = _get_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+        get_grading_cache().clear()
+
+
+def test_versioned_keys_and_lru():
+    cache = GradingCache(max_entries=2)
+    key = cache.key("text", "q1", "a", "東京")
+    cache.set(key, {"is_correct": True})
+    assert cache.get(key) == {"is_correct": True}
+    # 返した結果を書き換えてもキャッシュ側は変わらない
+    cache.get(key)["is_correct"] = False
+    assert cache.get(key) == {"is_correct": True}
+
+    cache.invalidate_questions(["q1"])
+    assert cache.key("text", "q1", "a", "東京") != key
+    assert cache.get(cache.key("text", "q1", "a", "東京")) is None
+    assert cache.key("text", "q2", "a", "東京") == cache.key("text", "q2", "a", "東京")
+
+    for answer in ("1", "2", "3"):
+        cache.set(cache.key("text", "q2", "a", answer), {"answer": answer})
+    assert cache.metrics()["entries"] == 2
+    assert cache.get(cache.key("text", "q2", "a", "1")) is None
+
+    assert GradingCache(max_entries=0).get(key) is None
+
+
+def _counts():
+    metrics = get_grading_cache().metrics()
+    return metrics["memory_hits"], metrics["misses"]
+
+
+def test_evaluate_text_is_cached(client):
+    body = {"question_id": QUESTION_IDS[0], "user_answer": "トウキョウ"}
+    hits, misses = _counts()
+    first = client.post("/api/v1/answers/evaluate-text", json=body)
+    assert first.status_code == 200, first.text
+    assert _counts() == (hits, misses + 1)
+
+    second = client.post("/api/v1/answers/evaluate-text", json={**body, "user_answer": " トウキョウ "})
+    assert second.json() == first.json()
+    assert _counts() == (hits + 1, misses + 1)
+
+    get_grading_cache().invalidate_questions([QUESTION_IDS[0]])
+    client.post("/api/v1/answers/evaluate-text", json=body)
+    assert _counts() == (hits + 1, misses + 2)
+
+
+def test_rubric_batch_mixes_cached_and_new_answers(client):
+    body = {
+        "question_id": QUESTION_IDS[0],
+        "rubrics": [{"id": r.id, "text": r.text, "weight": r.weight} for r in RUBRICS],
+        "misconceptions": [
+            {"id": m.id, "label": m.label, "example_phrases": m.example_phrases} for m in MISCONCEPTIONS
+        ],
+    }
+    hits, _ = _counts()
+    single = client.post(
+        "/api/v1/answers/evaluate-text-with-rubric", json={**body, "user_answer": ANSWERS[1]}
+    )
+    assert single.status_code == 200, single.text
+
+    answers = ANSWERS + [ANSWERS[1], ANSWERS[2], ""]
+    r = client.post("/api/v1/answers/evaluate-text-with-rubric/batch", json={**body, "user_answers": answers})
+    assert r.status_code == 200, r.text
+    compiled = CompiledRubric.build(RUBRICS, MISCONCEPTIONS)
+    assert r.json()["results"] == [to_legacy_evaluation_format(evaluate_compiled(a, compiled)) for a in answers]
+    # 単体採点でキャッシュ済みの ANSWERS[1] が 2 回分ヒットする
+    assert _counts()[0] == hits + 2
+
+    again = client.post("/api/v1/answers/evaluate-text-with-rubric/batch", json={**body, "user_answers": answers})
+    assert again.json() == r.json()
@@ -0,0 +1,70 @@
+"""
+採点プール（grading_pool）のテスト
+
+- スレッド実行・プロセス実行のどちらでも採点結果が同期版と同じこと
+- 実行中もイベントループが止まらないこと、タイムアウトと待ち行列の深さが計測されること
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.services.ai_evaluator import grade_text_answer  # noqa: E402
+from app.services.grading_pool import GradingPool, GradingTimeoutError  # noqa: E402
+
+
+def _slow(sec):
+    time.sleep(sec)
+    return sec
+
+
+def test_thread_pool_keeps_event_loop_responsive():
+    pool = GradingPool(workers=0, timeout_sec=5.0)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(pool.run(_slow, 0.2), pool.run(_slow, 0.2))
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    assert results == [0.2, 0.2]
+    assert ticks >= 5
+    metrics = pool.metrics()
+    assert metrics["completed"] == 2
+    assert metrics["max_queue_depth"] == 2
+    assert metrics["queue_depth"] == 0
+
+
+def test_timeout_is_reported():
+    pool = GradingPool(workers=0, timeout_sec=0.05)
+    with pytest.raises(GradingTimeoutError):
+        asyncio.run(pool.run(_slow, 0.3))
+    assert pool.metrics()["timeouts"] == 1
+    assert pool.metrics()["queue_depth"] == 0
+
+
+def test_process_pool_matches_inline_grading():
+    pool = GradingPool(workers=1, timeout_sec=60.0)
+    pool.start()
+    try:
+        args = ("問題", "東京/とうきょう", "トウキョウ", None)
+        assert asyncio.run(pool.run(grade_text_answer, *args)) == grade_text_answer(*args)
+        assert pool.metrics()["backend"] == "process"
+        assert pool.metrics()["completed"] == 1
+    finally:
+        pool.stop()
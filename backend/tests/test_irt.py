@@ -0,0 +1,94 @@
+"""
+IRT（2PL）較正のテスト。
+
+- 既知のパラメータから生成した回答で、困難度・識別力・能力が復元できること
+- answers から問題集ごとに較正して保存し、予想スコアが項目反応曲線の平均になること
+"""
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.models import Answer, Question, UserIrtAbility  # noqa: E402
+from app.ai.daily_rollups import rebuild_daily_rollups  # noqa: E402
+from app.ai.irt import calibrate_question_set, fit_2pl, item_response  # noqa: E402
+from app.ai.predictor import ScorePredictor  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, USER_IDS, _seed_session  # noqa: E402
+
+
+def test_fit_2pl_recovers_simulated_parameters():
+    rng = np.random.default_rng(0)
+    n_users, n_items = 2000, 40
+    theta = rng.normal(0, 1, n_users)
+    a = np.exp(rng.normal(0, 0.3, n_items))
+    b = rng.normal(0, 1, n_items)
+
+    user_idx = np.repeat(np.arange(n_users), n_items)
+    item_idx = np.tile(np.arange(n_items), n_users)
+    attempts = np.ones(len(user_idx), dtype=np.int64)
+    correct = (rng.random(len(user_idx)) < item_response(theta[user_idx], a[item_idx], b[item_idx])).astype(np.int64)
+
+    fit = fit_2pl(user_idx, item_idx, attempts, correct, n_users, n_items)
+    assert fit.converged
+    assert np.corrcoef(fit.difficulty, b)[0, 1] > 0.98
+    assert np.corrcoef(fit.discrimination, a)[0, 1] > 0.8
+    assert np.corrcoef(fit.ability, theta)[0, 1] > 0.9
+    assert np.abs(fit.difficulty - b).mean() < 0.2
+
+
+def test_calibrate_question_set_and_predict_with_item_response_curves():
+    db = _seed_session()
+    rng = np.random.default_rng(1)
+    # q-0 は全員正解しやすく、後ろの問題ほど難しい。user-0 が最も得意
+    for u, uid in enumerate(USER_IDS):
+        for j, qid in enumerate(QUESTION_IDS):
+            for _ in range(5):
+                p = item_response(1.0 - 0.6 * u, 1.0, -1.5 + 0.6 * j)
+                db.add(
+                    Answer(
+                        id=str(uuid.uuid4()),
+                        user_id=uid,
+                        question_id=qid,
+                        user_answer="A",
+                        is_correct=bool(rng.random() < p),
+                        answer_time_sec=8.0,
+                    )
+                )
+    db.commit()
+    rebuild_daily_rollups(db, USER_IDS)
+    db.commit()
+    set_id = db.get(Question, QUESTION_IDS[0]).question_set_id
+
+    summary = calibrate_question_set(db, set_id, chunk_size=7)
+    db.commit()
+    assert summary["users"] == len(USER_IDS)
+    assert summary["questions"] == len(QUESTION_IDS)
+    assert summary["observations"] == len(USER_IDS) * len(QUESTION_IDS) * 5
+
+    difficulties = [db.get(Question, qid).irt_difficulty for qid in QUESTION_IDS]
+    assert difficulties[0] < difficulties[-1]
+    assert all(db.get(Question, qid).irt_discrimination > 0 for qid in QUESTION_IDS)
+    abilities = {r.user_id: r for r in db.query(UserIrtAbility).all()}
+    assert abilities[USER_IDS[0]].ability > abilities[USER_IDS[-1]].ability
+    assert abilities[USER_IDS[0]].answer_count == len(QUESTION_IDS) * 5
+
+    questions = db.query(Question).filter(Question.question_set_id == set_id).all()
+    expected = item_response(
+        abilities[USER_IDS[0]].ability,
+        np.array([q.irt_discrimination for q in questions]),
+        np.array([q.irt_difficulty for q in questions]),
+    ).mean() * 100
+    prediction = ScorePredictor(db).predict_score(USER_IDS[0], set_id)
+    assert prediction["base_score"] == pytest.approx(expected, abs=0.05)
+    assert prediction["adjustments"]["speed"] == prediction["adjustments"]["trend"] == 0.0
+
+    # 再較正しても能力の行は重複しない
+    calibrate_question_set(db, set_id)
+    db.commit()
+    assert db.query(UserIrtAbility).count() == len(USER_IDS)
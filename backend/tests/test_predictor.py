@@ -0,0 +1,188 @@
+"""
+ScorePredictor のテスト（インメモリ SQLite）。
+
+- 全体（日次集計の合計）と最近 10 問の集計が 1 文で取れ、Python で数えた値と一致すること
+  （問題集の絞り込みを含む）
+- トレンド補正が最近 10 問の正答率と全体の正答率の差から計算されること
+- GET /ai/dashboard が個別 API と同じ値を一定数の文で返し、ETag で 304 を返せること
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import Answer, Question, QuestionSet  # noqa: E402
+from app.ai.daily_rollups import rebuild_daily_rollups, rollup_totals, summarize_totals  # noqa: E402
+from app.ai.predictor import RECENT_ANSWER_COUNT, ScorePredictor  # noqa: E402
+from app.ai.stats_updater import StatsUpdater  # noqa: E402
+from tests.test_recommender import _count_statements  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, USER_IDS, _seed_session, _seed_sessionmaker  # noqa: E402
+
+
+def _seed_history(db):
+    """user-0 の回答履歴（古い回答ほど不正解が多い）と、別問題集・別ユーザーの回答"""
+    other_set = QuestionSet(
+        id="other-set",
+        title="Other",
+        category="cat",
+        creator_id=USER_IDS[0],
+        content_languages=["ja"],
+        content_language="ja",
+    )
+    db.add(other_set)
+    db.add(
+        Question(
+            id="other-q",
+            question_set_id=other_set.id,
+            question_text="Other",
+            question_type="multiple_choice",
+            correct_answer="A",
+        )
+    )
+    base = datetime(2026, 1, 1)
+    history = []
+    for i in range(40):
+        question_id = "other-q" if i % 7 == 0 else QUESTION_IDS[i % len(QUESTION_IDS)]
+        history.append((USER_IDS[0], question_id, i >= 25 or i % 3 == 0, 4.0 + i % 9, base + timedelta(hours=i)))
+    history.append((USER_IDS[1], QUESTION_IDS[0], False, 30.0, base + timedelta(days=30)))
+    for user_id, question_id, is_correct, answer_time_sec, answered_at in history:
+        db.add(
+            Answer(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                question_id=question_id,
+                user_answer="A",
+                is_correct=is_correct,
+                answer_time_sec=answer_time_sec,
+                answered_at=answered_at,
+            )
+        )
+    db.commit()
+    # 既存回答のバックフィル
+    rebuild_daily_rollups(db, USER_IDS[:2])
+    db.commit()
+    return history
+
+
+def _reference_stats(history, user_id, question_ids=None):
+    rows = sorted(
+        (h for h in history if h[0] == user_id and (question_ids is None or h[1] in question_ids)),
+        key=lambda h: h[4],
+        reverse=True,
+    )
+    recent = rows[:RECENT_ANSWER_COUNT]
+    return {
+        "total_attempts": len(rows),
+        "correct_rate": sum(h[2] for h in rows) / len(rows),
+        "avg_time": sum(h[3] for h in rows) / len(rows),
+        "recent_attempts": len(recent),
+        "recent_correct_rate": sum(h[2] for h in recent) / len(recent),
+    }
+
+
+@pytest.mark.parametrize("by_set", [False, True])
+def test_user_stats_include_recent_window_in_one_statement(by_set):
+    db = _seed_session()
+    history = _seed_history(db)
+    set_id = db.get(Question, QUESTION_IDS[0]).question_set_id if by_set else None
+
+    stats, n_statements = _count_statements(
+        db, lambda: ScorePredictor(db)._get_user_stats(USER_IDS[0], set_id)
+    )
+    assert n_statements == 1
+    expected = _reference_stats(history, USER_IDS[0], set(QUESTION_IDS) if by_set else None)
+    assert stats == pytest.approx(expected)
+    # 最近 10 問は全体より正答率が高い（上昇トレンド）
+    assert stats["recent_correct_rate"] > stats["correct_rate"]
+
+
+def test_predict_score_trend_from_recent_answers():
+    db = _seed_session()
+    history = _seed_history(db)
+    expected = _reference_stats(history, USER_IDS[0])
+
+    prediction, n_statements = _count_statements(
+        db, lambda: ScorePredictor(db).predict_score(USER_IDS[0])
+    )
+    assert n_statements == 1
+    assert prediction["adjustments"]["trend"] == pytest.approx(
+        round((expected["recent_correct_rate"] - expected["correct_rate"]) * 10, 1)
+    )
+    assert prediction["stats"]["total_attempts"] == expected["total_attempts"]
+
+    # 回答が 5 問未満ならトレンド補正しない
+    assert ScorePredictor(db).predict_score(USER_IDS[1])["adjustments"]["trend"] == 0.0
+
+
+def test_dashboard_matches_individual_endpoints():
+    db = _seed_session()
+    _seed_history(db)
+    # カテゴリ別統計（改善提案・カテゴリ別予想の元）も answers から作る
+    StatsUpdater(db).recalculate_all_stats(USER_IDS[0])
+    set_id = db.get(Question, QUESTION_IDS[0]).question_set_id
+    set_ids = [set_id, "other-set", "missing-set"]
+
+    predictor = ScorePredictor(db)
+    dashboard, n_statements = _count_statements(
+        db, lambda: predictor.get_dashboard(USER_IDS[0], set_ids + [set_id])
+    )
+    # 集計の読み込みは 4 文。ほかは回答のある問題集ごとの IRT 較正の確認のみ
+    assert n_statements == 4 + 2
+
+    totals = rollup_totals(db, USER_IDS[0]).one()
+    assert dashboard["stats"] == pytest.approx(summarize_totals(totals.total, totals.correct, totals.time_sum))
+    assert dashboard["prediction"] == predictor.predict_score(USER_IDS[0])
+    assert [p["question_set_id"] for p in dashboard["question_set_predictions"]] == set_ids
+    for p in dashboard["question_set_predictions"]:
+        expected = predictor.predict_score(USER_IDS[0], p["question_set_id"])
+        assert {k: v for k, v in p.items() if k != "question_set_id"} == expected
+    assert dashboard["question_set_predictions"][-1]["details"]["reason"] == "insufficient_data"
+    assert dashboard["category_predictions"] == predictor.get_category_predictions(USER_IDS[0])
+    assert dashboard["category_predictions"]
+    assert dashboard["suggestions"] == predictor.get_improvement_suggestions(USER_IDS[0])
+
+
+def test_dashboard_endpoint_etag():
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    _seed_history(db)
+    db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    try:
+        client = TestClient(app)
+        url = f"/api/v1/ai/dashboard/{USER_IDS[0]}"
+        r = client.get(url, params={"question_set_ids": ["other-set"]})
+        assert r.status_code == 200, r.text
+        assert r.json()["question_set_predictions"][0]["question_set_id"] == "other-set"
+        etag = r.headers["etag"]
+
+        r = client.get(url, params={"question_set_ids": ["other-set"]}, headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert r.headers["etag"] == etag
+
+        # 内容が変われば ETag も変わる
+        r = client.get(url, headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.headers["etag"] != etag
+
+        r = client.get(url, params={"question_set_ids": [f"set-{i}" for i in range(21)]})
+        assert r.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,155 @@
+"""
+問題に保存するルーブリック・誤概念のテスト
+
+- 保存時に採点用の特徴量（正規化済みテキスト・bigram 指紋）が計算され、更新で計算し直されること
+- question_id だけの採点が、同じルーブリックを送る /evaluate-text-with-rubric と同じ結果になること
+- 作成者以外は読み書きできないこと
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.auth import get_current_active_user  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import Question, QuestionRubricItem  # noqa: E402
+from app.services.embedding_grading import compile_text  # noqa: E402
+from app.services.grading_cache import get_grading_cache  # noqa: E402
+from app.services.question_rubrics import stored_rubric  # noqa: E402
+from tests.test_embedding_grading import ANSWERS, MISCONCEPTIONS, RUBRICS  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, USER_IDS, _seed_sessionmaker  # noqa: E402
+
+RUBRIC_BODY = {
+    "rubrics": [{"text": r.text, "weight": r.weight} for r in RUBRICS],
+    "misconceptions": [{"label": m.label, "example_phrases": m.example_phrases} for m in MISCONCEPTIONS],
+}
+
+
+@pytest.fixture
+def env():
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    db.get(Question, QUESTION_IDS[0]).question_type = "text_input"
+    db.commit()
+    db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    user = SimpleNamespace(id=USER_IDS[0], is_active=True)
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    get_grading_cache().clear()
+    try:
+        yield TestClient(app), SessionLocal, user
+    finally:
+        app.dependency_overrides.clear()
+        get_grading_cache().clear()
+
+
+def test_crud_stores_features(env):
+    client, SessionLocal, _ = env
+    url = f"/api/v1/questions/{QUESTION_IDS[0]}/rubric"
+    r = client.put(url, json=RUBRIC_BODY)
+    assert r.status_code == 200, r.text
+    rubric = r.json()
+    assert [item["text"] for item in rubric["rubrics"]] == [r.text for r in RUBRICS]
+    assert [item["position"] for item in rubric["rubrics"]] == list(range(len(RUBRICS)))
+
+    db = SessionLocal()
+    row = db.get(QuestionRubricItem, rubric["rubrics"][0]["id"])
+    assert row.normalized_text == compile_text(RUBRICS[0].text).text
+    assert set(row.fingerprint) == compile_text(RUBRICS[0].text).tokens
+    db.close()
+
+    item_url = f"{url}/items/{rubric['rubrics'][0]['id']}"
+    r = client.put(item_url, json={"text": "勾配の逆向きに進む", "weight": 3})
+    assert r.status_code == 200, r.text
+    db = SessionLocal()
+    row = db.get(QuestionRubricItem, rubric["rubrics"][0]["id"])
+    assert row.normalized_text == compile_text("勾配の逆向きに進む").text
+    assert row.weight == 3
+    db.close()
+
+    r = client.post(f"{url}/items", json={"text": "学習率を決める"})
+    assert r.status_code == 201 and r.json()["position"] == len(RUBRICS)
+    assert client.delete(item_url).status_code == 204
+    assert client.delete(item_url).status_code == 404
+
+    mc_id = rubric["misconceptions"][0]["id"]
+    r = client.put(
+        f"/api/v1/questions/{QUESTION_IDS[0]}/misconceptions/{mc_id}",
+        json={"example_phrases": ["最大化する"]},
+    )
+    assert r.status_code == 200 and r.json()["example_phrases"] == ["最大化する"]
+
+    r = client.get(url)
+    assert [item["text"] for item in r.json()["rubrics"]] == [x.text for x in RUBRICS[1:]] + ["学習率を決める"]
+
+
+def test_stored_rubric_grading_matches_request_rubric(env):
+    client, _, _ = env
+    r = client.put(f"/api/v1/questions/{QUESTION_IDS[0]}/rubric", json=RUBRIC_BODY)
+    stored = r.json()
+    request_rubric = {
+        "rubrics": [{"id": x["id"], "text": x["text"], "weight": x["weight"]} for x in stored["rubrics"]],
+        "misconceptions": [
+            {"id": x["id"], "label": x["label"], "example_phrases": x["example_phrases"]}
+            for x in stored["misconceptions"]
+        ],
+    }
+
+    r = client.post(
+        "/api/v1/answers/evaluate-text-with-stored-rubric/batch",
+        json={"question_id": QUESTION_IDS[0], "user_answers": ANSWERS},
+    )
+    assert r.status_code == 200, r.text
+    get_grading_cache().clear()
+    expected = client.post(
+        "/api/v1/answers/evaluate-text-with-rubric/batch",
+        json={"question_id": QUESTION_IDS[0], "user_answers": ANSWERS, **request_rubric},
+    )
+    assert r.json() == expected.json()
+
+    single = client.post(
+        "/api/v1/answers/evaluate-text-with-stored-rubric",
+        json={"question_id": QUESTION_IDS[0], "user_answer": ANSWERS[1]},
+    )
+    assert single.json() == expected.json()["results"][1]
+
+
+def test_stale_features_are_recomputed(env):
+    client, SessionLocal, _ = env
+    client.put(f"/api/v1/questions/{QUESTION_IDS[0]}/rubric", json=RUBRIC_BODY)
+    db = SessionLocal()
+    question = db.get(Question, QUESTION_IDS[0])
+    for row in question.rubric_items:
+        row.normalized_text, row.fingerprint, row.features_version = "", [], 0
+    db.commit()
+    compiled = stored_rubric(db.get(Question, QUESTION_IDS[0]))
+    assert [t.text for t in compiled.rubric_texts] == [compile_text(r.text).text for r in RUBRICS]
+    db.close()
+
+
+def test_permissions_and_missing_rubric(env):
+    client, _, user = env
+    r = client.post(
+        "/api/v1/answers/evaluate-text-with-stored-rubric",
+        json={"question_id": QUESTION_IDS[0], "user_answer": ANSWERS[0]},
+    )
+    assert r.status_code == 404
+
+    user.id = USER_IDS[1]
+    assert client.get(f"/api/v1/questions/{QUESTION_IDS[0]}/rubric").status_code == 403
+    assert client.put(f"/api/v1/questions/{QUESTION_IDS[0]}/rubric", json=RUBRIC_BODY).status_code == 403
@@ -0,0 +1,106 @@
+"""
+Elo レーティングのテスト（インメモリ SQLite）。
+
+- 正解で学習者が上がり問題が下がる（不正解はその逆）こと
+- 回答を複数バッチに分けても 1 バッチでも、SQL 加算経路でも ORM 経路でも同じレーティングになること
+- USE_ELO_RATINGS 有効時の予想スコアが各問題の正解確率の平均になること
+"""
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy.dialects import sqlite
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.core.config import settings  # noqa: E402
+from app.models import Answer, Question, UserCategoryStats, UserRating  # noqa: E402
+from app.ai.predictor import ScorePredictor  # noqa: E402
+from app.ai.ratings import INITIAL_RATING, EloBatch, expected_score, expected_scores, k_factor  # noqa: E402
+from app.ai.stats_updater import AnswerEvent, StatsUpdater  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, USER_IDS, _random_batches, _seed_session  # noqa: E402
+
+
+def test_elo_batch_moves_user_and_question_in_opposite_directions():
+    elo = EloBatch()
+    elo.record("u", "q", "math", True)
+    user, question = elo.users["u"], elo.questions["q"]
+    assert user.rating > INITIAL_RATING > question.rating
+    assert user.delta == pytest.approx(-question.delta)
+    assert elo.categories[("u", "math")].rating == pytest.approx(user.rating)
+
+    elo.record("u", "q", None, False)
+    assert user.games_delta == question.games_delta == 2
+    assert user.rating < INITIAL_RATING + k_factor(0) / 2
+    assert ("u", None) not in elo.categories
+
+    # 対戦数が増えるほど K は小さくなる（下限あり）
+    assert k_factor(0) > k_factor(20) > k_factor(1000) == k_factor(10_000)
+    assert expected_scores(1500.0, np.array([1100.0, 1500.0]))[1] == pytest.approx(expected_score(1500, 1500))
+
+
+def _ratings(db):
+    users = {r.user_id: (r.rating, r.rating_count) for r in db.query(UserRating).all()}
+    categories = {(s.user_id, s.category): s.rating for s in db.query(UserCategoryStats).all()}
+    questions = {q.id: q.rating for q in db.query(Question).all()}
+    return users, categories, questions
+
+
+def test_batched_sql_and_orm_paths_give_same_ratings(monkeypatch):
+    batches = _random_batches()
+
+    # ORM 経路・1 回答ずつ
+    orm_db = _seed_session()
+    orm_updater = StatsUpdater(orm_db, stat_shards=0)
+    for batch in batches:
+        for e in batch:
+            orm_updater.update_on_answers([e])
+
+    # SQL 加算経路・まとめて 1 バッチ
+    sql_db = _seed_session()
+    sql_updater = StatsUpdater(sql_db, stat_shards=0)
+    monkeypatch.setattr(sql_updater, "_upsert_insert", lambda: sqlite.insert)
+    sql_updater.update_on_answers([e for batch in batches for e in batch])
+
+    expected, got = _ratings(orm_db), _ratings(sql_db)
+    for expected_part, got_part in zip(expected, got):
+        assert got_part.keys() == expected_part.keys()
+        for key in expected_part:
+            assert got_part[key] == pytest.approx(expected_part[key]), key
+
+    users = expected[0]
+    assert sum(count for _, count in users.values()) == sum(len(b) for b in batches)
+    assert any(rating != INITIAL_RATING for rating, _ in users.values())
+
+
+def test_predict_score_uses_elo_ratings_when_enabled(monkeypatch):
+    db = _seed_session()
+    uid = USER_IDS[0]
+    events = [AnswerEvent(uid, qid, i % 2 == 0, 8.0) for i, qid in enumerate(QUESTION_IDS * 2)]
+    for e in events:
+        db.add(
+            Answer(
+                id=str(uuid.uuid4()),
+                user_id=e.user_id,
+                question_id=e.question_id,
+                user_answer="A",
+                is_correct=e.is_correct,
+                answer_time_sec=e.answer_time_sec,
+            )
+        )
+    db.commit()
+    StatsUpdater(db, stat_shards=0).update_on_answers(events)
+
+    set_id = db.get(Question, QUESTION_IDS[0]).question_set_id
+    user_rating = db.get(UserRating, uid).rating
+    question_ratings = np.array([q.rating for q in db.query(Question).all()])
+    expected = float(expected_scores(user_rating, question_ratings).mean()) * 100
+
+    monkeypatch.setattr(settings, "USE_ELO_RATINGS", True)
+    prediction = ScorePredictor(db).predict_score(uid, set_id)
+    assert prediction["base_score"] == pytest.approx(expected, abs=0.05)
+    assert prediction["adjustments"]["trend"] == 0.0
@@ -0,0 +1,336 @@
+"""
+QuestionRecommender のテスト（インメモリ SQLite）。
+
+- ベクトル化したスコア計算・上位選択が、1 問ずつ計算して安定ソートした従来の結果と一致すること
+- 問題数に比例してクエリ数が増えないこと
+- ユーザー×カテゴリ行列による類似ユーザー検索が、ユーザーごとに計算した従来の類似度と一致すること
+- コールドスタート推薦が学習者クラスタの誤答数テーブルから引け、学習者数に関係なく定数回のクエリで済むこと
+- 推薦結果がキャッシュされ、統計の更新で無効化されること
+"""
+import random
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.models import Answer, QuestionSet, Question, User, UserCategoryStats  # noqa: E402
+from app.models.user import UserRole  # noqa: E402
+from app.ai.category_matrix import get_user_category_matrix_cache  # noqa: E402
+from app.ai.cold_start import kmeans, refresh_learner_clusters  # noqa: E402
+from app.ai.recommendation_cache import get_recommendation_cache  # noqa: E402
+from app.ai.recommender import QuestionRecommender, _top_k_indices  # noqa: E402
+from app.ai.stats_updater import AnswerEvent, StatsUpdater  # noqa: E402
+from tests.test_stats_updater import USER_IDS, _seed_sessionmaker  # noqa: E402
+
+SET_ID = "rec-set"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    # テストごとに別 DB を作るため、問題集 ID をキーにしたキャッシュを捨てる
+    get_user_category_matrix_cache().invalidate()
+    get_recommendation_cache().clear()
+    yield
+    get_user_category_matrix_cache().invalidate()
+    get_recommendation_cache().clear()
+
+
+def _seed_recommender_db(n_questions=40, n_answers=60, seed=3):
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    rng = random.Random(seed)
+    db.add(
+        QuestionSet(
+            id=SET_ID,
+            title="Recommend Set",
+            category="cat",
+            creator_id=USER_IDS[0],
+            content_languages=["ja"],
+            content_language="ja",
+        )
+    )
+    question_ids = [f"rq-{i}" for i in range(n_questions)]
+    for i, qid in enumerate(question_ids):
+        db.add(
+            Question(
+                id=qid,
+                question_set_id=SET_ID,
+                question_text=f"Q{i}",
+                question_type="multiple_choice",
+                correct_answer="A",
+                # 同点が出るよう難易度は数種類に限る
+                difficulty=rng.choice([0.2, 0.5, 0.8]),
+                category=("vocab", "grammar", "reading", None)[i % 4],
+            )
+        )
+    db.commit()
+
+    events = [
+        AnswerEvent(
+            user_id=rng.choice(USER_IDS[:2]),
+            question_id=rng.choice(question_ids[: n_questions // 2]),
+            is_correct=rng.random() < 0.55,
+            answer_time_sec=rng.choice([3.0, 12.0, 30.0, 60.0]),
+        )
+        for _ in range(n_answers)
+    ]
+    for e in events:
+        db.add(
+            Answer(
+                id=str(uuid.uuid4()),
+                user_id=e.user_id,
+                question_id=e.question_id,
+                user_answer="A",
+                is_correct=e.is_correct,
+                answer_time_sec=e.answer_time_sec,
+            )
+        )
+    db.commit()
+    StatsUpdater(db, stat_shards=0).update_on_answers(events)
+    return db
+
+
+def _reference_recommendation(recommender, user_id, count, target_difficulty):
+    questions = recommender.db.query(Question).filter(Question.question_set_id == SET_ID).all()
+    weak_categories = recommender._get_weak_categories(user_id)
+    scored = [
+        (q.id, recommender._calculate_recommendation_score(user_id, q, weak_categories, target_difficulty))
+        for q in questions
+    ]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [qid for qid, _ in scored[:count]]
+
+
+def _count_statements(db, fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    return result, len(statements)
+
+
+@pytest.mark.parametrize("target_difficulty", [None, 0.3])
+@pytest.mark.parametrize("count", [1, 5, 10, 25, 100])
+def test_vectorized_recommendation_matches_per_question_scoring(count, target_difficulty):
+    db = _seed_recommender_db()
+    recommender = QuestionRecommender(db)
+    user_id = max(
+        USER_IDS[:2],
+        key=lambda uid: db.query(Answer).filter(Answer.user_id == uid).count(),
+    )
+    assert not recommender._is_cold_start(user_id, SET_ID)
+
+    got = recommender.recommend_questions(user_id, SET_ID, count=count, target_difficulty=target_difficulty)
+    assert got == _reference_recommendation(recommender, user_id, count, target_difficulty)
+
+
+def test_recommendation_query_count_does_not_grow_with_set_size():
+    counts = []
+    for n_questions in (40, 200):
+        db = _seed_recommender_db(n_questions=n_questions)
+        get_recommendation_cache().clear()
+        _, n_statements = _count_statements(
+            db, lambda: QuestionRecommender(db).recommend_questions(USER_IDS[0], SET_ID, count=10)
+        )
+        counts.append(n_statements)
+    assert counts[0] == counts[1] <= 4
+
+
+def test_top_k_indices_breaks_ties_by_position():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1, 0.5])
+    assert _top_k_indices(scores, 3) == [1, 3, 0]
+    assert _top_k_indices(scores, 4) == [1, 3, 0, 2]
+    assert _top_k_indices(scores, 10) == [1, 3, 0, 2, 5, 4]
+    assert _top_k_indices(scores, 0) == []
+
+
+def _reference_similar_users(recommender, user_id, top_k):
+    """ユーザーごとに共通カテゴリのベクトルを作ってコサイン類似度を計算する従来方式"""
+    db = recommender.db
+    rates = {}
+    for stat in db.query(UserCategoryStats).all():
+        rates.setdefault(stat.user_id, {})[stat.category] = stat.correct_rate
+    learners = sorted(
+        uid for (uid,) in db.query(Answer.user_id).join(Question).filter(Question.question_set_id == SET_ID).distinct()
+    )
+    mine = rates[user_id]
+    similar = []
+    for other in learners:
+        if other == user_id or other not in rates:
+            continue
+        common = sorted(set(mine) & set(rates[other]))
+        if len(common) < 2:
+            continue
+        sim = recommender._cosine_similarity(
+            np.array([mine[c] for c in common]), np.array([rates[other][c] for c in common])
+        )
+        similar.append((other, sim))
+    similar.sort(key=lambda x: x[1], reverse=True)
+    return similar[:top_k]
+
+
+def test_similar_users_from_matrix_match_pairwise_cosine():
+    db = _seed_recommender_db(n_answers=0)
+    rng = random.Random(11)
+    categories = ["vocab", "grammar", "reading", "listening", "idiom", "kanji"]
+    learners = [f"learner-{i:02d}" for i in range(40)]
+    for uid in learners:
+        db.add(User(id=uid, email=f"{uid}@test.local", username=uid, is_active=True, role=UserRole.USER))
+        db.add(Answer(
+            id=str(uuid.uuid4()), user_id=uid, question_id="rq-0",
+            user_answer="A", is_correct=True, answer_time_sec=5.0,
+        ))
+        for category in rng.sample(categories, rng.randint(1, len(categories))):
+            db.add(UserCategoryStats(
+                id=str(uuid.uuid4()), user_id=uid, category=category, correct_rate=rng.random(),
+            ))
+    db.commit()
+
+    recommender = QuestionRecommender(db)
+    for user_id in learners[:8]:
+        got = recommender._find_similar_users(user_id, SET_ID, top_k=10)
+        expected = _reference_similar_users(recommender, user_id, top_k=10)
+        assert [uid for uid, _ in got] == [uid for uid, _ in expected]
+        for (_, g), (_, e) in zip(got, expected):
+            assert g == pytest.approx(e, abs=1e-6)
+
+    # 行列は問題集ごとに 1 回だけ作られる
+    assert get_user_category_matrix_cache().metrics()["builds"] == 1
+
+
+def test_kmeans_separates_obvious_groups():
+    rng = np.random.default_rng(0)
+    X = np.vstack([
+        rng.normal([0.9, 0.1, 0.5], 0.03, size=(20, 3)),
+        rng.normal([0.1, 0.9, 0.5], 0.03, size=(20, 3)),
+    ])
+    centroids, labels = kmeans(X, 2)
+    assert len(centroids) == 2
+    assert len(set(labels[:20])) == 1 and len(set(labels[20:])) == 1
+    assert labels[0] != labels[20]
+
+
+def _seed_cold_start_db(n_learners):
+    """vocab が得意で grammar が苦手な群と、その逆の群。それぞれ苦手カテゴリの問題を間違える"""
+    db = _seed_recommender_db(n_answers=0)
+    questions = {
+        category: [q.id for q in db.query(Question).filter(
+            Question.question_set_id == SET_ID, Question.category == category
+        ).order_by(Question.id)]
+        for category in ("vocab", "grammar")
+    }
+    for i in range(n_learners):
+        uid = f"learner-{i:03d}"
+        strong, weak = ("vocab", "grammar") if i % 2 == 0 else ("grammar", "vocab")
+        db.add(User(id=uid, email=f"{uid}@test.local", username=uid, is_active=True, role=UserRole.USER))
+        db.add(UserCategoryStats(id=str(uuid.uuid4()), user_id=uid, category=strong, correct_rate=0.9))
+        db.add(UserCategoryStats(id=str(uuid.uuid4()), user_id=uid, category=weak, correct_rate=0.2))
+        for qid in questions[weak][:6]:
+            db.add(Answer(
+                id=str(uuid.uuid4()), user_id=uid, question_id=qid,
+                user_answer="B", is_correct=False, answer_time_sec=20.0,
+            ))
+    target = USER_IDS[3]
+    db.add(UserCategoryStats(id=str(uuid.uuid4()), user_id=target, category="vocab", correct_rate=0.85))
+    db.add(UserCategoryStats(id=str(uuid.uuid4()), user_id=target, category="grammar", correct_rate=0.3))
+    db.add(Answer(
+        id=str(uuid.uuid4()), user_id=target, question_id=questions["grammar"][0],
+        user_answer="B", is_correct=False, answer_time_sec=20.0,
+    ))
+    db.commit()
+    return db, target, questions
+
+
+def test_cold_start_served_from_learner_clusters():
+    counts = []
+    for n_learners in (10, 40):
+        db, target, questions = _seed_cold_start_db(n_learners)
+        get_recommendation_cache().clear()
+        assert refresh_learner_clusters(db, SET_ID, n_clusters=2) == 2
+        db.commit()
+
+        recommender = QuestionRecommender(db)
+        assert recommender._is_cold_start(target, SET_ID)
+        got, n_statements = _count_statements(
+            db, lambda: recommender.recommend_questions(target, SET_ID, count=5)
+        )
+        # 同じ群（grammar が苦手）が間違えた問題のうち、未回答のもの
+        assert got == sorted(questions["grammar"][1:6])
+        counts.append(n_statements)
+    assert counts[0] == counts[1]
+
+
+def test_recommendations_cached_until_stats_change():
+    db = _seed_recommender_db()
+    recommender = QuestionRecommender(db)
+    cache = get_recommendation_cache()
+    before = cache.metrics()
+
+    first, _ = _count_statements(db, lambda: recommender.recommend_questions(USER_IDS[0], SET_ID, count=5))
+    second, n_statements = _count_statements(
+        db, lambda: recommender.recommend_questions(USER_IDS[0], SET_ID, count=5)
+    )
+    assert second == first
+    assert n_statements == 0
+    # 条件が違えば別エントリ
+    recommender.recommend_questions(USER_IDS[0], SET_ID, count=5, target_difficulty=0.2)
+
+    metrics = cache.metrics()
+    assert metrics["memory_hits"] - before["memory_hits"] == 1
+    assert metrics["misses"] - before["misses"] == 2
+
+    StatsUpdater(db, stat_shards=0).update_on_answers([
+        AnswerEvent(user_id=USER_IDS[0], question_id=first[0], is_correct=True, answer_time_sec=5.0)
+    ])
+    _, n_statements = _count_statements(db, lambda: recommender.recommend_questions(USER_IDS[0], SET_ID, count=5))
+    assert n_statements > 0
+    assert cache.metrics()["misses"] - before["misses"] == 3
+
+
+def test_recommendation_version_bumped_only_after_commit():
+    db = _seed_recommender_db()
+    cache = get_recommendation_cache()
+    user_id = USER_IDS[0]
+    question_id = db.query(Question.id).filter(Question.question_set_id == SET_ID).first()[0]
+
+    def answer():
+        StatsUpdater(db, stat_shards=0).update_on_answers(
+            [AnswerEvent(user_id=user_id, question_id=question_id, is_correct=True, answer_time_sec=5.0)],
+            commit=False,
+        )
+
+    version = cache._user_version(user_id)
+    answer()
+    assert cache._user_version(user_id) == version
+    db.rollback()
+    assert cache._user_version(user_id) == version
+
+    answer()
+    db.commit()
+    assert cache._user_version(user_id) == version + 1
+    db.commit()
+    assert cache._user_version(user_id) == version + 1
+
+
+def test_recommendation_cache_disabled_without_redis_for_multiple_workers(monkeypatch):
+    import app.ai.recommendation_cache as rc
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "REDIS_URL", None)
+    monkeypatch.setattr(rc, "_cache", None)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert not rc.get_recommendation_cache().enabled
+
+    monkeypatch.setattr(rc, "_cache", None)
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert rc.get_recommendation_cache().enabled
@@ -0,0 +1,147 @@
+"""
+サーバー側 SRS（SM-2）のテスト（インメモリ SQLite）。
+
+- SM-2 の計算が frontend/src/services/srsService.ts と同じであること
+- 回答の統計更新で user_srs_state が更新され、GET /srs/due が期限の古い順に返すこと
+- POST /srs/import が端末の SRS マップを取り込み、サーバー側の新しい状態は上書きしないこと
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.auth import get_current_active_user  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import User, Question, UserSrsState  # noqa: E402
+from app.ai.srs import SrsState, apply_sm2, quality_from_answer  # noqa: E402
+from app.ai.stats_updater import AnswerEvent, StatsUpdater  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, USER_IDS, _seed_sessionmaker  # noqa: E402
+
+
+def test_sm2_matches_frontend_scheduler():
+    t0 = datetime(2026, 1, 1)
+    state = SrsState()
+    # 速い正解 ×3: 間隔 1 → 6 → round(6 * 2.7) = 16、ease は 0.1 ずつ上がる
+    for expected_interval, expected_ease in ((1, 2.6), (6, 2.7), (16, 2.8)):
+        state = apply_sm2(state, 5, t0)
+        assert state.interval_days == expected_interval
+        assert state.ease_factor == pytest.approx(expected_ease)
+    assert state.stability == pytest.approx(16 * 2.8)
+    assert state.next_review_at == t0 + timedelta(days=16)
+
+    # 不正解でリセット（ease は変えない）
+    state = apply_sm2(state, quality_from_answer(False, 3.0), t0)
+    assert (state.interval_days, state.repetitions) == (1, 0)
+    assert state.ease_factor == pytest.approx(2.8)
+
+    # 遅い正解が続くと ease は 1.3 で止まる
+    for _ in range(20):
+        state = apply_sm2(state, quality_from_answer(True, 45.0), t0)
+    assert state.ease_factor == pytest.approx(1.3)
+
+
+@pytest.fixture
+def srs_client():
+    SessionLocal = _seed_sessionmaker()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    def _current_user():
+        db = SessionLocal()
+        try:
+            return db.get(User, USER_IDS[0])
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    app.dependency_overrides[get_current_active_user] = _current_user
+    yield TestClient(app), SessionLocal
+    app.dependency_overrides.clear()
+
+
+def test_answers_schedule_reviews_and_due_endpoint(srs_client):
+    client, SessionLocal = srs_client
+    uid = USER_IDS[0]
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        StatsUpdater(db).update_on_answers([
+            # 10 日前に不正解 → 9 日前が期限
+            AnswerEvent(uid, QUESTION_IDS[0], False, 5.0, answered_at=now - timedelta(days=10)),
+            # 3 日前に不正解 → 2 日前が期限
+            AnswerEvent(uid, QUESTION_IDS[1], False, 5.0, answered_at=now - timedelta(days=3)),
+            # 2 回正解 → 6 日後が期限（まだ）
+            AnswerEvent(uid, QUESTION_IDS[2], True, 5.0, answered_at=now - timedelta(hours=2)),
+            AnswerEvent(uid, QUESTION_IDS[2], True, 5.0, answered_at=now - timedelta(hours=1)),
+            # 他ユーザーは含まれない
+            AnswerEvent(USER_IDS[1], QUESTION_IDS[0], False, 5.0, answered_at=now - timedelta(days=20)),
+        ])
+        state = db.get(UserSrsState, (uid, QUESTION_IDS[2]))
+        assert (state.repetitions, state.interval_days) == (2, 6)
+    finally:
+        db.close()
+
+    r = client.get("/api/v1/srs/due")
+    assert r.status_code == 200, r.text
+    assert [s["question_id"] for s in r.json()] == [QUESTION_IDS[0], QUESTION_IDS[1]]
+
+    r = client.get("/api/v1/srs/due", params={"limit": 1})
+    assert [s["question_id"] for s in r.json()] == [QUESTION_IDS[0]]
+    assert 0.0 < r.json()[0]["retention"] < 1.0
+
+
+def test_import_local_srs_map(srs_client):
+    client, SessionLocal = srs_client
+    uid = USER_IDS[0]
+    db = SessionLocal()
+    try:
+        set_id = db.get(Question, QUESTION_IDS[0]).question_set_id
+        StatsUpdater(db).update_on_answers([
+            AnswerEvent(uid, QUESTION_IDS[1], True, 5.0, answered_at=datetime(2026, 3, 1)),
+        ])
+    finally:
+        db.close()
+
+    def local_state(last_review):
+        return {
+            "easeFactor": 2.36,
+            "interval": 6,
+            "repetitions": 2,
+            "nextReviewDate": (last_review + timedelta(days=6)).isoformat() + "Z",
+            "lastReviewDate": last_review.isoformat() + "Z",
+            "stability": 14.16,
+        }
+
+    r = client.post("/api/v1/srs/import", json={
+        "question_set_id": set_id,
+        "states": {
+            QUESTION_IDS[0]: local_state(datetime(2026, 2, 1)),
+            # サーバー側の方が新しい
+            QUESTION_IDS[1]: local_state(datetime(2026, 2, 1)),
+            "unknown-question": local_state(datetime(2026, 2, 1)),
+        },
+    })
+    assert r.status_code == 200, r.text
+    assert r.json() == {"imported": 1, "skipped": 2}
+
+    db = SessionLocal()
+    try:
+        imported = db.get(UserSrsState, (uid, QUESTION_IDS[0]))
+        assert imported.interval_days == 6
+        assert imported.next_review_at == datetime(2026, 2, 7)
+        kept = db.get(UserSrsState, (uid, QUESTION_IDS[1]))
+        assert kept.last_review_at == datetime(2026, 3, 1)
+    finally:
+        db.close()
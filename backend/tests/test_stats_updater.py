@@ -0,0 +1,284 @@
+"""
+StatsUpdater のテスト（インメモリ SQLite）。
+
+- SQL 加算経路（INSERT ... ON CONFLICT / UPDATE x = x + :d）と ORM 経路が同じ統計になること
+  SQLite も ON CONFLICT 構文を持つため、_upsert_insert を sqlite 用に差し替えて SQL 経路を検証する。
+- シャードカウンタ経由（QUESTION_STAT_SHARDS > 0）でもロールアップ後の questions の統計が同じになること
+  （Elo レーティングも含む）
+- GROUP BY 集計による再構築（recalculate_all_stats / recalculate_all_users_stats）が
+  回答ごとの増分更新と同じ統計になること
+"""
+import itertools
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.core.database import Base  # noqa: E402
+from app.models import (  # noqa: E402
+    Answer,
+    User,
+    QuestionSet,
+    Question,
+    QuestionStatShard,
+    UserQuestionStats,
+    UserCategoryStats,
+)
+from app.models.user import UserRole  # noqa: E402
+from app.ai.stats_updater import AnswerEvent, StatsUpdater  # noqa: E402
+
+USER_IDS = [f"user-{i}" for i in range(4)]
+QUESTION_IDS = [f"q-{i}" for i in range(6)]
+
+
+def _seed_sessionmaker(url="sqlite:///:memory:"):
+    # インメモリ DB は接続ごとに別 DB になるため 1 接続を共有する
+    pool = {"poolclass": StaticPool} if url.endswith(":memory:") else {}
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        **pool,
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    for uid in USER_IDS:
+        db.add(User(id=uid, email=f"{uid}@test.local", username=uid, is_active=True, role=UserRole.USER))
+    qs_id = str(uuid.uuid4())
+    db.add(
+        QuestionSet(
+            id=qs_id,
+            title="Stats Set",
+            category="cat",
+            creator_id=USER_IDS[0],
+            content_languages=["ja"],
+            content_language="ja",
+        )
+    )
+    for i, qid in enumerate(QUESTION_IDS):
+        db.add(
+            Question(
+                id=qid,
+                question_set_id=qs_id,
+                question_text=f"Q{i}",
+                question_type="multiple_choice",
+                correct_answer="A",
+                difficulty=0.1 * (i + 1),
+                category=("math", "geo", None)[i % 3],
+            )
+        )
+    db.commit()
+    db.close()
+    return SessionLocal
+
+
+def _seed_session():
+    return _seed_sessionmaker()()
+
+
+def _random_batches(seed=7, batches=6, size=9):
+    rng = random.Random(seed)
+    return [
+        [
+            AnswerEvent(
+                user_id=rng.choice(USER_IDS),
+                question_id=rng.choice(QUESTION_IDS),
+                is_correct=rng.random() < 0.6,
+                answer_time_sec=rng.choice([1.5, 4.0, 9.0, 16.0, 40.0, 70.0]),
+            )
+            for _ in range(size)
+        ]
+        for _ in range(batches)
+    ]
+
+
+def _snapshot(db):
+    q_stats = {
+        (s.user_id, s.question_id): (s.total_attempts, s.correct_count, s.average_time_sec, s.mastery_score)
+        for s in db.query(UserQuestionStats).all()
+    }
+    c_stats = {
+        (s.user_id, s.category): (
+            s.total_questions,
+            s.correct_count,
+            s.average_time_sec,
+            s.difficulty_mean,
+            s.correct_rate,
+            s.speed_score,
+            s.weakness_score,
+            s.rating,
+        )
+        for s in db.query(UserCategoryStats).all()
+    }
+    questions = {
+        q.id: (q.total_attempts, q.correct_count, q.average_time_sec, q.difficulty, q.rating)
+        for q in db.query(Question).all()
+    }
+    return q_stats, c_stats, questions
+
+
+def test_sql_upsert_path_matches_orm_path(monkeypatch):
+    batches = _random_batches()
+
+    orm_db = _seed_session()
+    orm_updater = StatsUpdater(orm_db)
+    assert orm_updater._upsert_insert() is None
+    for batch in batches:
+        orm_updater.update_on_answers(batch)
+
+    sql_db = _seed_session()
+    sql_updater = StatsUpdater(sql_db)
+    monkeypatch.setattr(sql_updater, "_upsert_insert", lambda: sqlite.insert)
+    for batch in batches:
+        sql_updater.update_on_answers(batch)
+
+    orm_snap, sql_snap = _snapshot(orm_db), _snapshot(sql_db)
+    for orm_part, sql_part in zip(orm_snap, sql_snap):
+        assert orm_part.keys() == sql_part.keys()
+        for key in orm_part:
+            assert sql_part[key] == pytest.approx(orm_part[key]), key
+
+    # 10 回以上解かれた問題は難易度が正答率から自動調整される
+    adjusted = [q for q in orm_snap[2].values() if q[0] >= 10]
+    assert adjusted
+    for total, correct, _, difficulty, _ in adjusted:
+        assert difficulty == pytest.approx(1 - correct / total)
+
+
+def test_update_on_answer_skips_unknown_question():
+    db = _seed_session()
+    updater = StatsUpdater(db)
+    applied = updater.update_on_answers([
+        AnswerEvent(user_id=USER_IDS[0], question_id="missing", is_correct=True, answer_time_sec=3.0),
+        AnswerEvent(user_id=USER_IDS[0], question_id=QUESTION_IDS[0], is_correct=True, answer_time_sec=3.0),
+    ])
+    assert applied == 1
+    assert db.query(UserQuestionStats).count() == 1
+
+
+@pytest.mark.parametrize("sql_path", [False, True])
+def test_sharded_global_stats_roll_up_to_same_totals(monkeypatch, sql_path):
+    batches = _random_batches()
+
+    direct_db = _seed_session()
+    direct_updater = StatsUpdater(direct_db, stat_shards=0)
+    for batch in batches:
+        direct_updater.update_on_answers(batch)
+
+    sharded_db = _seed_session()
+    sharded_updater = StatsUpdater(sharded_db, stat_shards=4)
+    if sql_path:
+        monkeypatch.setattr(sharded_updater, "_upsert_insert", lambda: sqlite.insert)
+    for batch in batches[:3]:
+        sharded_updater.update_on_answers(batch)
+
+    # ロールアップ前は questions 行に触れない
+    assert all(q[0] == 0 for q in _snapshot(sharded_db)[2].values())
+    assert sharded_db.query(QuestionStatShard).count() > 0
+
+    assert sharded_updater.rollup_question_stat_shards() > 0
+    assert sharded_db.query(QuestionStatShard).count() == 0
+    for batch in batches[3:]:
+        sharded_updater.update_on_answers(batch)
+    sharded_updater.rollup_question_stat_shards()
+
+    expected, got = _snapshot(direct_db), _snapshot(sharded_db)
+    assert got[0] == pytest.approx(expected[0])
+    assert got[2].keys() == expected[2].keys()
+    for key in expected[2]:
+        assert got[2][key] == pytest.approx(expected[2][key]), key
+    assert sharded_updater.rollup_question_stat_shards() == 0
+
+
+def _insert_answers(db, events):
+    base = datetime(2026, 1, 1, 9, 0, 0)
+    for i, e in enumerate(events):
+        e.answered_at = base + timedelta(minutes=i)
+        db.add(
+            Answer(
+                id=str(uuid.uuid4()),
+                user_id=e.user_id,
+                question_id=e.question_id,
+                user_answer="A",
+                is_correct=e.is_correct,
+                answer_time_sec=e.answer_time_sec,
+                answered_at=e.answered_at,
+            )
+        )
+    db.commit()
+
+
+def test_recalculate_all_stats_matches_incremental_updates():
+    # 難易度の自動調整（10 回以上）が起きない量に抑え、difficulty_mean も比較できるようにする
+    batches = _random_batches(batches=2)
+    events = list(itertools.chain.from_iterable(batches))
+    db = _seed_session()
+    _insert_answers(db, events)
+
+    updater = StatsUpdater(db)
+    for batch in batches:
+        updater.update_on_answers(batch)
+    q_stats, c_stats, questions = _snapshot(db)
+    assert all(q[0] < 10 for q in questions.values())
+
+    for uid in USER_IDS:
+        updater.recalculate_all_stats(uid)
+    rebuilt_q, rebuilt_c, rebuilt_questions = _snapshot(db)
+
+    assert rebuilt_q.keys() == q_stats.keys()
+    for key in q_stats:
+        assert rebuilt_q[key] == pytest.approx(q_stats[key]), key
+    assert rebuilt_c.keys() == c_stats.keys()
+    for key in c_stats:
+        assert rebuilt_c[key] == pytest.approx(c_stats[key]), key
+    # 再構築では問題の全体統計を二重加算しない
+    assert rebuilt_questions == questions
+
+    last = db.query(UserQuestionStats).filter(
+        UserQuestionStats.user_id == events[-1].user_id,
+        UserQuestionStats.question_id == events[-1].question_id,
+    ).one()
+    assert last.last_attempt_at == events[-1].answered_at
+
+
+def test_recalculate_all_users_stats_in_parallel_chunks(tmp_path):
+    SessionLocal = _seed_sessionmaker(f"sqlite:///{tmp_path / 'stats.db'}")
+    events = list(itertools.chain.from_iterable(_random_batches(batches=2)))
+    db = SessionLocal()
+    try:
+        _insert_answers(db, events)
+        StatsUpdater(db).update_on_answers(events)
+        expected_q, expected_c, _ = _snapshot(db)
+
+        # 回答の無いユーザーに残った古い統計は消える
+        db.add(UserQuestionStats(id="stale", user_id="stale-user", question_id=QUESTION_IDS[0], total_attempts=3))
+        db.add(User(id="stale-user", email="stale@test.local", username="stale", is_active=True, role=UserRole.USER))
+        db.commit()
+    finally:
+        db.close()
+
+    total = StatsUpdater.recalculate_all_users_stats(SessionLocal, chunk_size=2, max_workers=2)
+    assert total == len(USER_IDS) + 1
+
+    db = SessionLocal()
+    try:
+        rebuilt_q, rebuilt_c, _ = _snapshot(db)
+    finally:
+        db.close()
+    assert rebuilt_q.keys() == expected_q.keys()
+    for key in expected_q:
+        assert rebuilt_q[key] == pytest.approx(expected_q[key]), key
+    assert rebuilt_c.keys() == expected_c.keys()
+    for key in expected_c:
+        assert rebuilt_c[key] == pytest.approx(expected_c[key]), key
@@ -0,0 +1,108 @@
+"""
+StatsWriteBehind のテスト（インメモリ SQLite・プロセス内キュー）。
+
+- enqueue 直後は統計に反映されず、未反映件数と遅延がメトリクスに出ること
+- flush / stop で反映され、その場で更新した場合と同じ統計になること
+- 常に失敗する増分は再試行の上限を超えたら dead-letter に移り、後続の増分の反映を止めないこと
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.models import UserQuestionStats  # noqa: E402
+from app.ai.stats_updater import AnswerEvent, StatsUpdater  # noqa: E402
+from app.ai.stats_write_behind import StatsWriteBehind  # noqa: E402
+from tests.test_stats_updater import _random_batches, _seed_sessionmaker, _snapshot  # noqa: E402
+
+
+def test_enqueue_defers_until_flush():
+    SessionLocal = _seed_sessionmaker()
+    wb = StatsWriteBehind(SessionLocal, flush_interval_sec=60, max_pending=100)
+    batches = _random_batches(batches=2)
+    for batch in batches:
+        wb.enqueue(batch)
+
+    db = SessionLocal()
+    try:
+        assert db.query(UserQuestionStats).count() == 0
+    finally:
+        db.close()
+    metrics = wb.metrics()
+    assert metrics["backend"] == "memory"
+    assert metrics["pending"] == sum(len(b) for b in batches)
+    assert metrics["lag_sec"] >= 0.0
+
+    assert wb.flush() == metrics["pending"]
+    metrics = wb.metrics()
+    assert metrics["pending"] == 0
+    assert metrics["lag_sec"] == 0.0
+    assert metrics["flushed_total"] == sum(len(b) for b in batches)
+
+    expected_db = _seed_sessionmaker()()
+    for batch in batches:
+        StatsUpdater(expected_db).update_on_answers(batch)
+    db = SessionLocal()
+    try:
+        for got, expected in zip(_snapshot(db), _snapshot(expected_db)):
+            assert got.keys() == expected.keys()
+            for key in expected:
+                assert got[key] == pytest.approx(expected[key]), key
+    finally:
+        db.close()
+
+
+def test_stop_flushes_remaining_events_in_chunks():
+    SessionLocal = _seed_sessionmaker()
+    wb = StatsWriteBehind(SessionLocal, flush_interval_sec=60, max_pending=4)
+    wb.start()
+    events = _random_batches(batches=1, size=10)[0]
+    # 閾値超えでワーカーが起きても、stop 時点の残りはすべて反映される
+    wb.enqueue(events[:3])
+    wb.enqueue(events[3:])
+    wb.stop()
+
+    assert wb.metrics()["pending"] == 0
+    assert wb.metrics()["flushed_total"] == len(events)
+    db = SessionLocal()
+    try:
+        total = sum(s.total_attempts for s in db.query(UserQuestionStats).all())
+    finally:
+        db.close()
+    assert total == len(events)
+
+
+def test_poison_event_is_dead_lettered_after_max_attempts(monkeypatch):
+    SessionLocal = _seed_sessionmaker()
+    original = StatsUpdater.update_on_answers
+
+    def update_on_answers(self, events, commit=True):
+        events = list(events)
+        if any(e.question_id == "deleted-question" for e in events):
+            raise RuntimeError("question not found")
+        return original(self, events, commit=commit)
+
+    monkeypatch.setattr(StatsUpdater, "update_on_answers", update_on_answers)
+    wb = StatsWriteBehind(SessionLocal, flush_interval_sec=60, max_pending=100, max_attempts=3)
+    events = _random_batches(batches=1, size=5)[0]
+    poison = AnswerEvent(user_id=events[0].user_id, question_id="deleted-question", is_correct=True, answer_time_sec=1.0)
+    wb.enqueue([poison] + events)
+
+    assert [wb.flush() for _ in range(2)] == [0, 0]
+    assert wb.metrics()["pending"] == len(events) + 1
+    assert wb.flush() == len(events)
+    metrics = wb.metrics()
+    assert metrics["pending"] == 0
+    assert metrics["flush_failures"] == 3
+    assert metrics["dead_lettered_total"] == metrics["dead_letter_pending"] == 1
+    assert metrics["flushed_total"] == len(events)
+
+    db = SessionLocal()
+    try:
+        assert sum(s.total_attempts for s in db.query(UserQuestionStats).all()) == len(events)
+    finally:
+        db.close()
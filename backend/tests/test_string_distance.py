@@ -0,0 +1,66 @@
+"""
+string_distance のテスト
+
+- ビット並列（64 文字超のパターンを含む）と打ち切り版が素朴な DP と同じ距離になること
+- text_similarity / calculate_similarity のしきい値付き呼び出しが、しきい値以上の値を変えないこと
+"""
+import random
+import sys
+from pathlib import Path
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+import pytest  # noqa: E402
+
+from app.services.string_distance import levenshtein, levenshtein_within  # noqa: E402
+from app.services.embedding_grading import text_similarity  # noqa: E402
+from app.services.ai_evaluator import calculate_similarity  # noqa: E402
+
+
+def _reference(s1, s2):
+    prev = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        curr = [i + 1]
+        for j, c2 in enumerate(s2):
+            curr.append(min(curr[j] + 1, prev[j + 1] + 1, prev[j] + (c1 != c2)))
+        prev = curr
+    return prev[-1]
+
+
+def _random_pairs(n=1500, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        alphabet = rng.choice(["ab", "abcd", "あいう漢字カナ", "abcdefghijklmnop"])
+        lengths = [rng.randint(0, rng.choice([4, 30, 70, 140])) for _ in range(2)]
+        yield tuple("".join(rng.choice(alphabet) for _ in range(k)) for k in lengths)
+
+
+def test_levenshtein_matches_reference():
+    for a, b in _random_pairs():
+        assert levenshtein(a, b) == _reference(a, b), (a, b)
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("", "abc") == levenshtein("abc", "") == 3
+
+
+@pytest.mark.parametrize("k", [0, 1, 2, 3, 8, 40])
+def test_levenshtein_within_matches_reference(k):
+    for a, b in _random_pairs(n=400, seed=k):
+        d = _reference(a, b)
+        assert levenshtein_within(a, b, k) == (d if d <= k else None), (a, b)
+
+
+def test_thresholded_similarity_is_exact_above_threshold():
+    rng = random.Random(3)
+    words = ["勾配", "降下", "法", "損失", "関数", "最小", "更新", "gradient", "descent", "loss"]
+    for _ in range(300):
+        a = "".join(rng.choice(words) for _ in range(rng.randint(1, 6)))
+        b = "".join(rng.choice(words) for _ in range(rng.randint(1, 6)))
+        for threshold in (0.4, 0.58, 0.65, 0.78):
+            exact = text_similarity(a, b)
+            bounded = text_similarity(a, b, threshold)
+            assert bounded == exact if exact >= threshold else bounded < threshold
+            exact = calculate_similarity(a, b)
+            bounded = calculate_similarity(a, b, threshold)
+            assert bounded == exact if exact >= threshold else bounded < threshold
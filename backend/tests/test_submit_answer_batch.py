@@ -0,0 +1,190 @@
+"""
+POST /api/v1/answers/submit-batch の振る舞いテスト（インメモリ SQLite）。
+
+1 件ずつ /submit した場合と同じ統計になることを確認する。
+"""
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.database import Base, get_db  # noqa: E402
+from app.models import (  # noqa: E402
+    User,
+    QuestionSet,
+    Question,
+    Answer,
+    UserQuestionStats,
+    UserCategoryStats,
+)
+from app.models.user import UserRole  # noqa: E402
+
+USERS = ("batch-user", "single-user")
+
+
+@pytest.fixture
+def memory_db():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    qs_id = str(uuid.uuid4())
+    q_ids = [str(uuid.uuid4()) for _ in range(3)]
+
+    db = SessionLocal()
+    try:
+        for uid in USERS:
+            db.add(
+                User(
+                    id=uid,
+                    email=f"{uid}@test.local",
+                    username=uid,
+                    is_active=True,
+                    role=UserRole.USER,
+                )
+            )
+        db.add(
+            QuestionSet(
+                id=qs_id,
+                title="Batch Set",
+                category="cat",
+                creator_id=USERS[0],
+                content_languages=["ja"],
+                content_language="ja",
+            )
+        )
+        for i, q_id in enumerate(q_ids):
+            db.add(
+                Question(
+                    id=q_id,
+                    question_set_id=qs_id,
+                    question_text=f"Q{i}",
+                    question_type="multiple_choice",
+                    correct_answer="A",
+                    difficulty=0.2 + 0.3 * i,
+                    category="math" if i < 2 else "geo",
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+    yield TestClient(app), SessionLocal, q_ids
+    app.dependency_overrides.clear()
+
+
+def _answers(uid, q_ids):
+    pattern = [
+        (q_ids[0], True, 4.0),
+        (q_ids[1], False, 12.5),
+        (q_ids[0], False, 30.0),
+        (q_ids[2], True, 8.0),
+        (q_ids[1], True, 6.0),
+    ]
+    return [
+        {
+            "user_id": uid,
+            "question_id": qid,
+            "user_answer": "A",
+            "is_correct": ok,
+            "answer_time_sec": t,
+            "session_id": "sess-1",
+        }
+        for qid, ok, t in pattern
+    ]
+
+
+def test_submit_batch_matches_sequential_submit(memory_db):
+    client, SessionLocal, q_ids = memory_db
+
+    r = client.post(
+        "/api/v1/answers/submit-batch",
+        json={"answers": _answers(USERS[0], q_ids)},
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["count"] == 5
+    assert [a["try_count"] for a in body["answers"]] == [1, 1, 2, 1, 2]
+
+    for payload in _answers(USERS[1], q_ids):
+        assert client.post("/api/v1/answers/submit", json=payload).status_code == 200
+
+    db = SessionLocal()
+    try:
+        assert db.query(Answer).filter(Answer.user_id == USERS[0]).count() == 5
+
+        def question_stats(uid):
+            rows = db.query(UserQuestionStats).filter(UserQuestionStats.user_id == uid).all()
+            return {
+                r.question_id: (r.total_attempts, r.correct_count, r.average_time_sec, r.mastery_score)
+                for r in rows
+            }
+
+        def category_stats(uid):
+            rows = db.query(UserCategoryStats).filter(UserCategoryStats.user_id == uid).all()
+            return {
+                r.category: (
+                    r.total_questions,
+                    r.correct_count,
+                    r.average_time_sec,
+                    r.difficulty_mean,
+                    r.correct_rate,
+                    r.weakness_score,
+                )
+                for r in rows
+            }
+
+        batch_q, single_q = question_stats(USERS[0]), question_stats(USERS[1])
+        assert batch_q.keys() == single_q.keys()
+        for qid in batch_q:
+            assert batch_q[qid] == pytest.approx(single_q[qid])
+
+        batch_c, single_c = category_stats(USERS[0]), category_stats(USERS[1])
+        assert batch_c.keys() == {"math", "geo"}
+        for cat in batch_c:
+            assert batch_c[cat] == pytest.approx(single_c[cat])
+
+        q0 = db.query(Question).filter(Question.id == q_ids[0]).first()
+        assert q0.total_attempts == 4
+        assert q0.correct_count == 2
+    finally:
+        db.close()
+
+
+def test_submit_batch_rejects_invalid_payload(memory_db):
+    client, SessionLocal, q_ids = memory_db
+
+    assert client.post("/api/v1/answers/submit-batch", json={"answers": []}).status_code == 422
+
+    bad = _answers(USERS[0], q_ids)
+    bad[-1]["answer_time_sec"] = None
+    assert client.post("/api/v1/answers/submit-batch", json={"answers": bad}).status_code == 422
+
+    db = SessionLocal()
+    try:
+        assert db.query(Answer).count() == 0
+        assert db.query(UserQuestionStats).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,76 @@
+"""
+text_normalizer のテスト
+
+- トライによる数字表現の置換が、表を先頭から順に str.replace した結果と同じこと
+- text_forms の各正規化形が正規表現で 1 段ずつ正規化した結果と同じこと
+- 正解パターンの正規化形のキャッシュを使っても採点結果が変わらないこと
+"""
+import random
+import re
+import sys
+import unicodedata
+from pathlib import Path
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.services.ai_evaluator import _answer_patterns, grade_text_answer  # noqa: E402
+from app.services.text_normalizer import _NUMBER_CONVERSIONS, normalize_numbers, text_forms  # noqa: E402
+
+_PUNCT_RE = r'[、。，．,!！?？;；:：\'\"\'\'""（）()\[\]【】『』「」\-\s]'
+
+
+def _reference_numbers(text):
+    normalized = re.sub(r'[０-９]', lambda m: chr(ord(m.group()) - 0xFEE0), text)
+    for digit, variants in _NUMBER_CONVERSIONS.items():
+        for v in variants:
+            normalized = normalized.replace(v, digit)
+    return normalized
+
+
+def _reference_normalize(text):
+    text = unicodedata.normalize('NFKC', text).strip().lower()
+    return re.sub(r'\s+', ' ', text)
+
+
+def _hiragana(text):
+    return re.sub(r'[ァ-ヶ]', lambda m: chr(ord(m.group()) - 0x60), text)
+
+
+def _random_texts(n=3000, seed=0):
+    rng = random.Random(seed)
+    chars = sorted({c for vs in _NUMBER_CONVERSIONS.values() for v in vs for c in v})
+    chars += list("0123456789１２つっ東京カタナ漢字 、。ab-")
+    for _ in range(n):
+        yield "".join(rng.choice(chars) for _ in range(rng.randint(0, 12)))
+
+
+def test_numeral_replacement_matches_sequential_replace():
+    fixed = ["しち", "ななつ", "一つつ", "さんつ", "1つ", "十一", "にじゅうご", "よっつ", "ここのつ", "４つ", "ぜろ"]
+    for text in fixed + list(_random_texts()):
+        assert normalize_numbers(text) == _reference_numbers(text), text
+
+
+def test_text_forms_match_stepwise_normalization():
+    samples = ["  Hello,  World! ", "ト ウ キ ョ ウ", "東京（とうきょう）", "ｶﾞｯｺｳ", "3.14", "-2 と 10"]
+    for text in samples + list(_random_texts(500, seed=1)):
+        forms = text_forms(text)
+        norm = _reference_normalize(text)
+        clean = re.sub(_PUNCT_RE, '', norm)
+        assert forms.norm == norm
+        assert forms.clean == clean
+        assert forms.numeric == _reference_numbers(clean)
+        assert forms.hiragana == _hiragana(norm)
+        assert forms.clean_hiragana == re.sub(_PUNCT_RE, '', _hiragana(norm))
+        assert forms.numbers == tuple(re.findall(r'-?\d+\.?\d*', text))
+
+
+def test_pattern_forms_are_cached_per_correct_answer():
+    _answer_patterns.cache_clear()
+    correct = "東京/とうきょう\n解説"
+    first = grade_text_answer("首都は？", correct, "トウキョウ")
+    assert first["is_correct"]
+    assert grade_text_answer("首都は？", correct, " 東京 ")["exact_match"]
+    assert _answer_patterns.cache_info().hits == 1
+    assert [p for p, _ in _answer_patterns(correct)] == ["東京", "とうきょう"]
@@ -0,0 +1,149 @@
+"""
+問題集ごとの文字 n-gram TF-IDF 採点のテスト
+
+- 疎ベクトルの余弦類似度が密行列で計算した TF-IDF と同じこと
+- TFIDF_GRADING_ENABLED のとき、語順を入れ替えた回答が /evaluate-text で正解になること
+- 問題集の文章が変わったとき（統計の更新では変わらない）だけモデルを作り直すこと
+"""
+import asyncio
+import math
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+backend = Path(__file__).resolve().parent.parent
+if str(backend) not in sys.path:
+    sys.path.insert(0, str(backend))
+
+from app.main import app  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import get_db  # noqa: E402
+from app.models import Question, QuestionSet  # noqa: E402
+from app.services.grading_cache import get_grading_cache  # noqa: E402
+from app.services.tfidf_grading import TfidfModel, TfidfModelCache, _analyze, get_tfidf_model_cache  # noqa: E402
+from tests.test_stats_updater import QUESTION_IDS, _seed_sessionmaker  # noqa: E402
+
+CORRECT = "勾配の逆方向にパラメータを更新する"
+DOCUMENTS = [
+    CORRECT,
+    "勾配降下法は目的関数を最小化する反復法である",
+    "学習率が大きすぎると発散する",
+    "過学習とは訓練データに過剰に適合し汎化性能が下がること",
+    "正則化は大きな重みにペナルティを与える",
+]
+REORDERED = "パラメータを勾配の逆方向へ更新する"
+
+
+def _dense_cosine(documents, a, b):
+    docs = [set(_analyze(d)) for d in documents if _analyze(d)]
+    vocab = sorted(set().union(*docs) | set(_analyze(a)) | set(_analyze(b)))
+    df = np.array([sum(t in d for d in docs) for t in vocab], dtype=float)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+
+    def vec(text):
+        counts = Counter(_analyze(text))
+        v = np.array([(1 + math.log(counts[t])) if counts[t] else 0.0 for t in vocab]) * idf
+        return v / np.linalg.norm(v)
+
+    return float(vec(a) @ vec(b))
+
+
+def test_similarity_matches_dense_tfidf():
+    model = TfidfModel.fit(DOCUMENTS, [CORRECT])
+    for answer in [REORDERED, CORRECT, "学習率を大きくする", "全く関係のない未知の語句", "ｸﾞﾗﾃﾞｨｴﾝﾄ"]:
+        assert model.similarity(answer, CORRECT) == pytest.approx(_dense_cosine(DOCUMENTS, answer, CORRECT), abs=1e-5)
+    assert model.similarity(CORRECT, f"別解/{CORRECT}") == pytest.approx(1.0, abs=1e-5)
+    assert model.similarity("", CORRECT) == 0.0
+    assert model.idf.dtype == np.float32 and model.terms.dtype.kind == "U"
+
+
+@pytest.fixture
+def env(monkeypatch):
+    SessionLocal = _seed_sessionmaker()
+    db = SessionLocal()
+    question = db.get(Question, QUESTION_IDS[0])
+    question.question_type = "text_input"
+    question.correct_answer = CORRECT
+    for qid, text in zip(QUESTION_IDS[1:], DOCUMENTS[1:]):
+        db.get(Question, qid).explanation = text
+    db.commit()
+    db.close()
+
+    def _get_db():
+        s = SessionLocal()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    monkeypatch.setattr(settings, "TFIDF_GRADING_ENABLED", True)
+    app.dependency_overrides[get_db] = _get_db
+    get_grading_cache().clear()
+    get_tfidf_model_cache().clear()
+    try:
+        yield TestClient(app), SessionLocal
+    finally:
+        app.dependency_overrides.clear()
+        get_grading_cache().clear()
+        get_tfidf_model_cache().clear()
+
+
+def test_reordered_answer_is_accepted(env, monkeypatch):
+    client, _ = env
+    body = {"question_id": QUESTION_IDS[0], "user_answer": REORDERED}
+    r = client.post("/api/v1/answers/evaluate-text", json=body)
+    assert r.status_code == 200, r.text
+    assert r.json()["is_correct"] and r.json()["tfidf_similarity"] >= settings.TFIDF_GRADING_THRESHOLD
+
+    unrelated = client.post(
+        "/api/v1/answers/evaluate-text", json={"question_id": QUESTION_IDS[0], "user_answer": "学習率を大きくする"}
+    )
+    assert not unrelated.json()["is_correct"]
+
+    monkeypatch.setattr(settings, "TFIDF_GRADING_ENABLED", False)
+    r = client.post("/api/v1/answers/evaluate-text", json=body)
+    assert not r.json()["is_correct"] and "tfidf_similarity" not in r.json()
+
+
+def test_model_is_rebuilt_only_when_set_text_changes(env):
+    _, SessionLocal = env
+    cache = TfidfModelCache()
+    db = SessionLocal()
+    set_id = db.get(Question, QUESTION_IDS[0]).question_set_id
+
+    def get():
+        return asyncio.run(cache.get(db, set_id))
+
+    first = get()
+    assert get() is first
+    assert (cache.hits, cache.builds) == (1, 1)
+
+    # 回答ごとの統計の更新（updated_at も変わる）では文章を読み直さない
+    question = db.get(Question, QUESTION_IDS[1])
+    question.total_attempts, question.difficulty = 10, 0.9
+    db.commit()
+    assert get() is first
+    assert (cache.hits, cache.misses, cache.builds) == (2, 1, 1)
+
+    # 文字数が同じ編集は更新 API の invalidate で検知する
+    question.explanation = question.explanation[::-1]
+    db.commit()
+    assert get() is first
+    cache.invalidate(set_id)
+    edited = get()
+    assert edited is not first and cache.builds == 2
+    # invalidate されても文章が同じなら学習し直さない
+    cache.invalidate(set_id)
+    assert get() is edited and cache.builds == 2
+
+    db.get(QuestionSet, set_id).textbook_content = "パラメータは勾配の逆方向に動かす。学習率は小さくする。"
+    db.commit()
+    rebuilt = get()
+    assert rebuilt is not edited and cache.builds == 3
+    assert rebuilt.documents == first.documents + 2
+    assert asyncio.run(cache.get(db, "missing-set")) is None
+    db.close()